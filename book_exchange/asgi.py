@@ -0,0 +1,8 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'book_exchange.settings')
+# Route the read-heavy pages to their async views (marketplace/async_views.py)
+os.environ.setdefault('MARKETPLACE_ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
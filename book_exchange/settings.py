@@ -9,7 +9,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-your-secret-key-change-in-production-123456789'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = ['127.0.0.1', 'localhost', '.pythonanywhere.com', '.herokuapp.com', '.railway.app', '.render.com']
 
@@ -26,6 +26,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Static files are answered here, before profiling and sessions
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'marketplace.profiling.QueryProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,14 +57,72 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'book_exchange.wsgi.application'
+ASGI_APPLICATION = 'book_exchange.asgi.application'
 
-# Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database: SQLite unless DATABASE_ENGINE=postgresql. SQLite serializes
+# every write (posts, view count flushes, mark as sold) behind one lock; in
+# WAL mode (SQLITE_PRAGMAS below) readers are not blocked by it. PostgreSQL
+# is the profile for deployments with many concurrent writers.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite3')
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'uniexchange'),
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', ''),
+            'PORT': os.environ.get('POSTGRES_PORT', ''),
+            # Persistent connections, checked before each reuse. Every thread
+            # that queries (request threads, ASGI_THREADS under ASGI, the
+            # TASK_WORKERS and the view counter) holds one, so size the
+            # server's max_connections or pooler to processes x threads.
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            # PgBouncer in transaction mode cannot keep the server-side
+            # cursors used by .iterator() (exports) open between statements
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_POOLER', '') == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '5')),
+            },
+        }
+    }
+    if os.environ.get('POSTGRES_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+            'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
     }
+    # A separate read-only connection to the same file for marketplace reads
+    if os.environ.get('DB_READ_CONNECTION', 'True') == 'True':
+        DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+# Marketplace reads go to this alias when it is configured (marketplace/routers.py)
+READ_DATABASE = 'replica'
+DATABASE_ROUTERS = ['marketplace.routers.ReadReplicaRouter']
+
+# Applied to every SQLite connection (marketplace/sqlite.py)
+SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32 * 1024,  # KiB per connection
+    'busy_timeout': 5000,  # ms
+    'temp_store': 'memory',
 }
+# The journal mode is written into the database file. Deployments naming
+# their database (SQLITE_PATH) run in WAL mode; the development db.sqlite3
+# kept in git keeps its rollback journal unless asked for one.
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'wal' if 'SQLITE_PATH' in os.environ else '')
+if SQLITE_JOURNAL_MODE:
+    SQLITE_PRAGMAS['journal_mode'] = SQLITE_JOURNAL_MODE
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -92,13 +153,162 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'  # For production
 
+# With DEBUG off, collectstatic writes content-hashed copies plus .gz and .br
+# variants, and WhiteNoise serves the hashed names with immutable caching.
+# Under DEBUG (and in tests) files are served as-is without collectstatic.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+    # Photos of archived items; not served. Point it at cheaper (e.g.
+    # object) storage in production.
+    'archive': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': BASE_DIR / 'archive'},
+    },
+}
+
+# Under DEBUG, WhiteNoise finds files in STATICFILES_DIRS and rescans on
+# each request, so staticfiles/ need not exist. The test runner turns DEBUG
+# off, hence set here rather than left to WhiteNoise's defaults.
+WHITENOISE_USE_FINDERS = DEBUG
+WHITENOISE_AUTOREFRESH = DEBUG
+
 # Media files (User uploaded content)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Serve MEDIA_ROOT from Django (marketplace/media.py); turn off when the web
+# server or a CDN serves it. Browsers may reuse a photo for MEDIA_MAX_AGE
+# seconds before revalidating it.
+SERVE_MEDIA = True
+MEDIA_MAX_AGE = 30 * 24 * 60 * 60
+
+# Photo uploads stream to disk in UPLOAD_TEMP_DIR (keep it on the same
+# filesystem as MEDIA_ROOT so saving is a rename) and are refused past
+# MAX_PHOTO_UPLOAD_SIZE bytes or MAX_PHOTO_PIXELS (marketplace/uploads.py)
+FILE_UPLOAD_HANDLERS = [
+    'marketplace.uploads.PhotoUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_TEMP_DIR = BASE_DIR / 'tmp' / 'uploads'
+MAX_PHOTO_UPLOAD_SIZE = 15 * 1024 * 1024
+MAX_PHOTO_PIXELS = 50_000_000
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache (homepage statistics and other derived data)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'uniexchange',
+    },
+    # Holds the catalog generation (marketplace/caching.py), which every
+    # process must agree on: web workers, run_tasks and cron commands. Files
+    # work on one host; use Redis or Memcached when serving from several.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SHARED_CACHE_DIR', str(BASE_DIR / 'tmp' / 'shared-cache')),
+    },
+}
+
+# Seconds rendered page fragments stay cached; any Item change invalidates
+# them sooner by bumping the catalog generation
+FRAGMENT_CACHE_TIMEOUT = 300
+
+# Serve home, all_items, item_detail and search_ajax from their async
+# versions; asgi.py turns this on, WSGI keeps the sync views
+ASYNC_VIEWS = os.environ.get('MARKETPLACE_ASYNC_VIEWS', '') == '1'
+
+# Seconds browsers may reuse autocomplete suggestions before revalidating
+# them with their ETag
+AUTOCOMPLETE_MAX_AGE = 60
+
+# Milliseconds the facet count query may take before a warning is logged
+# (marketplace.facets); counts are cached, so this is paid once per search
+# and catalog change
+FACET_QUERY_BUDGET_MS = 150
+
+# Background tasks (photo renditions, recommendations; see marketplace/tasks.py).
+# By default TASK_WORKERS threads in each web process run them once the
+# request's transaction commits. Set TASKS_RUN_IN_PROCESS = False to leave
+# them to a separate ``manage.py run_tasks`` worker instead.
+TASKS_RUN_IN_PROCESS = os.environ.get('TASKS_RUN_IN_PROCESS', 'True') == 'True'
+TASK_WORKERS = 2
+# Seconds finished tasks are kept for task_stats
+TASK_RETENTION = 24 * 60 * 60
+
+# Item admin for large catalogs (marketplace/admin.py): estimated totals
+# past ADMIN_EXACT_COUNT_LIMIT rows, full-text search, cached filter choices
+# and no date drill-down. Bulk actions commit every ADMIN_ACTION_CHUNK_SIZE
+# items so the write lock is released in between.
+ADMIN_PERFORMANCE_MODE = os.environ.get('ADMIN_PERFORMANCE_MODE', 'True') == 'True'
+ADMIN_EXACT_COUNT_LIMIT = 10_000
+ADMIN_ACTION_CHUNK_SIZE = 500
+
+# ``manage.py archive_items`` moves items sold ARCHIVE_SOLD_AFTER_DAYS ago, and
+# unsold items unchanged for ARCHIVE_STALE_AFTER_DAYS, into ArchivedItem
+# (marketplace/archive.py), ARCHIVE_BATCH_SIZE per transaction
+ARCHIVE_SOLD_AFTER_DAYS = 30
+ARCHIVE_STALE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 500
+
+# Buffered view counts: flush after this many seconds or pending views
+VIEW_COUNT_FLUSH_INTERVAL = 5
+VIEW_COUNT_FLUSH_THRESHOLD = 100
+
+# Trending (marketplace/trending.py): a view counts half as much after each
+# TRENDING_HALF_LIFE_HOURS. Hourly view buckets are kept for
+# TRENDING_BUCKET_RETENTION_DAYS so ``manage.py rebuild_trending`` can
+# recompute the scores; the homepage section is cached for
+# TRENDING_CACHE_TIMEOUT seconds.
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_BUCKET_RETENTION_DAYS = 30
+TRENDING_CACHE_TIMEOUT = 60
+
+# Query profiling: over-budget requests are logged as warnings on the
+# marketplace.profiling logger; PROFILING_LOG_REQUESTS logs a JSON line for
+# every request. Server-Timing headers carry the same numbers.
+QUERY_PROFILING = True
+PROFILING_LOG_REQUESTS = os.environ.get('PROFILING_LOG_REQUESTS', 'False') == 'True'
+PROFILING_SERVER_TIMING = DEBUG
+
+# Most queries each view may issue with a cold cache, keyed by URL name.
+# Enforced by the test suite and "python manage.py check_query_budgets";
+# exceeding one at runtime logs a warning.
+QUERY_BUDGETS = {
+    'home': 6,
+    'all_items': 5,
+    'items_api': 3,
+    'item_detail': 3,
+    'search_ajax': 1,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'marketplace.profiling': {
+            'handlers': ['console'],
+            'level': 'DEBUG' if PROFILING_LOG_REQUESTS else 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 # Message tags for Bootstrap compatibility
 from django.contrib.messages import constants as messages
 MESSAGE_TAGS = {
@@ -1,23 +1,83 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db import models, transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Item
+from .models import ArchivedItem, Course, Item, Seller
+from .forms import ItemImportForm, PhotoField
+from .caching import bump_catalog_generation, cached_value
+from .pagination import EstimatedCountPaginator
+from .recommendations import items_changed
+from .search import has_search_index, search_items
+from . import dimensions, listings
+from .transfer import export_lines, guess_format, import_items, read_rows, text_stream
+
+# Courses offered by the item list's course filter
+COURSE_FILTER_CHOICES = 50
+FILTER_CHOICES_TIMEOUT = 10 * 60
+
+
+def performance_mode():
+    return getattr(settings, 'ADMIN_PERFORMANCE_MODE', False)
+
+
+class CourseFilter(admin.SimpleListFilter):
+    """The most popular courses, cached under the catalog generation"""
+    title = 'Course'
+    parameter_name = 'course_key'
+
+    def lookups(self, request, model_admin):
+        def compute():
+            courses = Course.objects.filter(active_count__gt=0).order_by('-active_count')
+            return sorted(courses.values_list('key', 'code')[:COURSE_FILTER_CHOICES], key=lambda course: course[1])
+        return cached_value('admin-course-choices', [], compute, FILTER_CHOICES_TIMEOUT)
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(course_key=self.value())
+        return queryset
+
+
+class ExportActions:
+    """CSV and JSONL export actions, for live and archived items alike"""
+
+    def export_as_csv(self, request, queryset):
+        return self.export_response(queryset, 'csv', 'text/csv')
+    export_as_csv.short_description = "Export selected items as CSV"
+
+    def export_as_jsonl(self, request, queryset):
+        return self.export_response(queryset, 'jsonl', 'application/x-ndjson')
+    export_as_jsonl.short_description = "Export selected items as JSONL"
+
+    def export_response(self, queryset, file_format, content_type):
+        response = StreamingHttpResponse(export_lines(queryset, file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="items.{file_format}"'
+        return response
 
 @admin.register(Item)
-class ItemAdmin(admin.ModelAdmin):
+class ItemAdmin(ExportActions, admin.ModelAdmin):
     list_display = [
         'item_name', 'item_type', 'price', 'condition',
         'seller_name', 'course', 'date_posted', 'is_sold', 'view_count'
     ]
     list_filter = [
-        'item_type', 'condition', 'is_sold', 'date_posted'
+        'item_type', 'condition', 'is_sold', CourseFilter, 'date_posted'
     ]
     search_fields = [
         'item_name', 'author', 'course', 'seller_name', 'description'
     ]
 
     list_editable = ['is_sold']
-    readonly_fields = ['date_posted', 'view_count']
-    date_hierarchy = 'date_posted'
+    readonly_fields = ['date_posted', 'updated_at', 'view_count']
+    # Header-only checks for photos, as on the post page
+    formfield_overrides = {
+        models.ImageField: {'form_class': PhotoField},
+    }
     ordering = ['-date_posted']
     
     fieldsets = (
@@ -28,26 +88,132 @@ class ItemAdmin(admin.ModelAdmin):
             'fields': ('seller_name', 'contact_info')
         }),
         ('Status', {
-            'fields': ('is_sold', 'date_posted', 'view_count'),
+            'fields': ('is_sold', 'date_posted', 'updated_at', 'view_count'),
         }),
     )
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related()
+    @property
+    def date_hierarchy(self):
+        # Its drill-down links come from a DISTINCT over the date of every
+        # matching row; the date_posted filter offers fixed ranges instead
+        return None if performance_mode() else 'date_posted'
+
+    @property
+    def show_full_result_count(self):
+        # "N results (M total)" would count the whole table on every search
+        return not performance_mode()
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        paginator = EstimatedCountPaginator if performance_mode() else self.paginator
+        return paginator(queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields would LIKE-scan all five columns of every row; the
+        # full-text index covers the same ones
+        if performance_mode() and search_term.strip() and has_search_index(queryset.db):
+            return search_items(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
     
-    actions = ['mark_as_sold', 'mark_as_available']
+    actions = ['mark_as_sold', 'mark_as_available', 'export_as_csv', 'export_as_jsonl']
+    change_list_template = 'admin/marketplace/item/change_list.html'
     
     def mark_as_sold(self, request, queryset):
-        updated = queryset.update(is_sold=True)
+        updated = self.set_sold(queryset, True)
         self.message_user(request, f'{updated} items marked as sold.')
     mark_as_sold.short_description = "Mark selected items as sold"
     
     def mark_as_available(self, request, queryset):
-        updated = queryset.update(is_sold=False)
+        updated = self.set_sold(queryset, False)
         self.message_user(request, f'{updated} items marked as available.')
     mark_as_available.short_description = "Mark selected items as available"
 
+    def set_sold(self, queryset, is_sold):
+        """Update is_sold and everything derived from it, one transaction per
+        ADMIN_ACTION_CHUNK_SIZE items, so a large selection does not hold the
+        write lock for the whole action; returns how many were updated"""
+        item_ids = list(queryset.values_list('pk', flat=True))
+        size = getattr(settings, 'ADMIN_ACTION_CHUNK_SIZE', 500)
+        updated = 0
+        for start in range(0, len(item_ids), size):
+            chunk = item_ids[start:start + size]
+            with transaction.atomic():
+                updated += Item.objects.filter(pk__in=chunk).update(is_sold=is_sold, updated_at=timezone.now())
+                dimensions.items_changed(chunk)
+                listings.refresh(chunk)
+                items_changed(chunk)
+        bump_catalog_generation()
+        return updated
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='marketplace_item_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        """Bulk import listings from an uploaded CSV or JSONL file"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = ItemImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            file_format = form.cleaned_data['format'] or guess_format(upload.name)
+            result = import_items(
+                read_rows(text_stream(upload), file_format),
+                dry_run=form.cleaned_data['dry_run'],
+                refresh_recommendations=form.cleaned_data['refresh_recommendations'],
+            )
+            for line, error in result.errors[:10]:
+                self.message_user(request, f'Line {line}: {error}', messages.WARNING)
+            verb = 'validated' if form.cleaned_data['dry_run'] else 'imported'
+            self.message_user(request, f'{result.created} items {verb}, {result.failed} rows rejected.')
+            return redirect('admin:marketplace_item_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import items',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/marketplace/item/import_items.html', context)
+
+@admin.register(ArchivedItem)
+class ArchivedItemAdmin(ExportActions, admin.ModelAdmin):
+    """Read-only view of archived listings (see archive.py), for reports"""
+    list_display = [
+        'item_name', 'item_type', 'price', 'course',
+        'seller_name', 'date_posted', 'reason', 'archived_at'
+    ]
+    list_filter = ['reason', 'item_type', 'condition', 'archived_at']
+    search_fields = ['item_name', 'course', 'seller_name']
+    ordering = ['-archived_at']
+    actions = ['export_as_csv', 'export_as_jsonl']
+    # The archive only grows
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Deleting rows would orphan their photos in cold storage
+        return False
+
+@admin.register(Course, Seller)
+class DimensionAdmin(admin.ModelAdmin):
+    """Read-only view of the normalized courses and sellers"""
+    list_display = ['__str__', 'key', 'active_count']
+    search_fields = ['key']
+    ordering = ['-active_count']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # Customize admin site
 admin.site.site_header = "UniExchange Admin"
 admin.site.site_title = "UniExchange Admin Portal"
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 class MarketplaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'marketplace'
-    verbose_name = 'Student Marketplace'
\ No newline at end of file
+    verbose_name = 'Student Marketplace'
+
+    def ready(self):
+        # Signal receivers and background task handlers
+        from . import images, recommendations, signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""Archival of sold and stale listings into a cold table.
+
+Items sold more than ARCHIVE_SOLD_AFTER_DAYS ago, and unsold items nobody
+has edited for ARCHIVE_STALE_AFTER_DAYS, are moved into ArchivedItem in
+transactions of ARCHIVE_BATCH_SIZE items. They keep their pk, so
+item_detail still finds them. No listing query touches that table, so the
+hot Item table and its indexes only hold listings people still browse.
+
+Photos are copied to STORAGES['archive'] before a batch's transaction
+starts. Once it commits, the originals and their renditions are deleted
+from MEDIA_ROOT. Run ``manage.py archive_items`` daily, e.g. from cron.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_FIELDS = [
+    'item_name', 'description', 'price', 'seller_name', 'contact_info', 'item_type', 'author',
+    'course', 'condition', 'date_posted', 'is_sold', 'view_count', 'updated_at',
+]
+
+
+def due_for_archival(now=None):
+    """Q for the Items that should be archived"""
+    now = now or timezone.now()
+    sold_before = now - timedelta(days=getattr(settings, 'ARCHIVE_SOLD_AFTER_DAYS', 30))
+    stale_before = now - timedelta(days=getattr(settings, 'ARCHIVE_STALE_AFTER_DAYS', 365))
+    return Q(is_sold=True, updated_at__lt=sold_before) | Q(is_sold=False, updated_at__lt=stale_before)
+
+
+def archive_due(batch_size=None, limit=None, now=None):
+    """Archive every item due (at most ``limit``); returns {reason: count}"""
+    from .models import Item
+
+    batch_size = batch_size or getattr(settings, 'ARCHIVE_BATCH_SIZE', 500)
+    condition = due_for_archival(now)
+    item_ids = list(Item.objects.filter(condition).order_by('pk').values_list('pk', flat=True)[:limit])
+    totals = Counter()
+    for start in range(0, len(item_ids), batch_size):
+        totals.update(archive_batch(item_ids[start:start + batch_size], condition))
+    return dict(totals)
+
+
+def archive_batch(item_ids, condition):
+    """Move the given items that still match ``condition``; returns {reason: count}"""
+    from .models import ArchivedItem, Item, ItemRendition, RelatedItem, archive_storage
+    from .recommendations import items_changed
+    from .signals import batched_item_changes
+
+    # Copy photos first, so the transaction does no file I/O
+    with_photos = Item.objects.filter(condition, pk__in=item_ids).exclude(image='').exclude(image=None)
+    copies = {item.pk: archive_photo(item) for item in with_photos.only('pk', 'image')}
+    try:
+        with transaction.atomic():
+            # Re-read in the transaction: an item may have been edited or
+            # re-listed since it was selected
+            items = list(Item.objects.filter(condition, pk__in=item_ids))
+            pks = [item.pk for item in items]
+            ArchivedItem.objects.bulk_create([
+                ArchivedItem(
+                    id=item.pk, image=copies.get(item.pk),
+                    course_key=item.course_key_id, seller_key=item.seller_key_id,
+                    reason='sold' if item.is_sold else 'stale',
+                    **{name: getattr(item, name) for name in ARCHIVED_FIELDS},
+                )
+                for item in items
+            ])
+            media = [item.image.name for item in items if item.image]
+            media += ItemRendition.objects.filter(item__in=pks).values_list('file', flat=True)
+            # Similar-items lists that showed these items need re-ranking
+            affected = RelatedItem.objects.filter(related__in=pks).exclude(item__in=pks)
+            items_changed(sorted(set(affected.values_list('item', flat=True))))
+            # One recount and generation bump for the batch, not one per item
+            with batched_item_changes():
+                Item.objects.filter(pk__in=pks).delete()
+            transaction.on_commit(lambda: delete_files(default_storage, media))
+    except Exception:
+        delete_files(archive_storage(), [name for name in copies.values() if name])
+        raise
+    # Copies of items that were no longer due
+    delete_files(archive_storage(), [name for pk, name in copies.items() if name and pk not in pks])
+    return Counter('sold' if item.is_sold else 'stale' for item in items)
+
+
+def archive_photo(item):
+    """Copy ``item``'s photo to cold storage; returns its name there, or None if the file is gone"""
+    from .models import archive_storage
+
+    try:
+        with item.image.open('rb') as source:
+            return archive_storage().save(item.image.name, source)
+    except FileNotFoundError:
+        logger.warning('Photo %s of item %s is missing; archiving the item without it', item.image.name, item.pk)
+        return None
+
+
+def delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('Could not delete %s', name, exc_info=True)
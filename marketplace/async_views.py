@@ -0,0 +1,95 @@
+"""Async versions of the read-heavy views, routed when ASYNC_VIEWS is set.
+
+Under ASGI these run on the event loop, so a worker holds many slow
+connections without a thread each. Page content inside a ``{% catalogcache %}``
+block is usually cached; the views check that first and only run the
+block's queries (through the async ORM) on a miss. Anything that has to
+block — writes, stale autocomplete rebuilds, the POST path — runs in a
+worker thread via sync_to_async, and view counts are flushed by the
+counter's own thread.
+
+Note that Django's async ORM still executes each query in a thread; the
+gain is in not tying a thread to every open connection.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db.models import prefetch_related_objects
+from django.shortcuts import render
+
+from . import views
+from .autocomplete import autocomplete_index
+from .caching import is_cached
+from .conditional import conditional, count_revalidated_view, detail_validators, listing_validators
+from .models import Item
+from .stats import get_home_stats
+
+
+async def call_async(func, *args, **kwargs):
+    """Run ``func`` on the event loop, or in a thread if it needs the database.
+
+    For side-effect-free code that is normally served from memory but may
+    occasionally query: a cached fragment expiring between the check and the
+    render, the first search probing for the FTS table, a session load.
+    """
+    try:
+        return func(*args, **kwargs)
+    except SynchronousOnlyOperation:
+        return await sync_to_async(func)(*args, **kwargs)
+
+
+async def render_async(request, template_name, context):
+    return await call_async(render, request, template_name, context)
+
+
+async def home(request):
+    """Homepage showing latest items and statistics"""
+    context = views.home_context()
+    if not is_cached('fragment:home'):
+        stats, popular_courses = await sync_to_async(get_home_stats)()
+        context.update(
+            latest_items=[item async for item in context['latest_items']],
+            stats=stats,
+            popular_courses=popular_courses,
+        )
+    if not is_cached('fragment:home_trending'):
+        context.update(
+            trending_items=[item async for item in context['trending_items']],
+            trending_courses=[course async for course in context['trending_courses']],
+        )
+    return await render_async(request, 'home.html', context)
+
+
+@conditional(listing_validators)
+async def all_items(request):
+    """GET and view all items with filtering and search"""
+    context = await call_async(views.listing_context, request)
+    if not is_cached('fragment:all_items', context['fragment_key']):
+        context = await sync_to_async(views.listing_context)(request, evaluate=True)
+    return await render_async(request, 'all_items.html', context)
+
+
+@conditional(detail_validators, on_not_modified=count_revalidated_view)
+async def item_detail(request, pk):
+    """Details page for each item"""
+    if request.method == 'POST':
+        return await sync_to_async(views.item_detail)(request, pk)
+    try:
+        item = getattr(request, 'detail_item', None) or await Item.objects.aget(pk=pk)
+    except Item.DoesNotExist:
+        return await sync_to_async(views.archived_detail)(request, pk)
+    if item.image:
+        # The photo's <picture> reads item.renditions, which cannot lazy-load here
+        await sync_to_async(prefetch_related_objects)([item], 'renditions')
+    item.increment_views(defer=True)
+
+    context = views.detail_context(item)
+    if not is_cached('fragment:related_items', item.pk):
+        context['related_items'] = [related async for related in context['related_items']]
+    return await render_async(request, 'item_detail.html', context)
+
+
+async def search_ajax(request):
+    """AJAX search for autocomplete (validated by the sync view)"""
+    if autocomplete_index.is_current():
+        return views.search_ajax(request)
+    return await sync_to_async(views.search_ajax)(request)
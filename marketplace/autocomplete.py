@@ -0,0 +1,186 @@
+"""In-memory prefix index for search-as-you-type suggestions.
+
+Every unsold item contributes its title words, author words and course code
+(both "math 101" and "math101" forms) as terms in a sorted array. A query is
+split into tokens; each token selects the items having a term that starts
+with it (a bisect range), and the suggestions are the items matching every
+token, ranked by whether the title starts with the query and then by
+popularity.
+
+The index is built lazily from one query, then kept current by the Item
+signal handlers. It remembers the catalog generation it reflects; when
+another process (or a bulk update that bypasses signals) bumps it, the index
+is rebuilt on the next lookup. Warm lookups never touch the database.
+"""
+import bisect
+import heapq
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+from django.urls import reverse
+
+from .caching import catalog_generation
+
+TOKEN_RE = re.compile(r'\w+')
+RESULT_CACHE_SIZE = 2048
+
+
+def item_terms(name, course, author):
+    terms = set(TOKEN_RE.findall((name or '').lower()))
+    terms.update(TOKEN_RE.findall((author or '').lower()))
+    course_words = TOKEN_RE.findall((course or '').lower())
+    terms.update(course_words)
+    if len(course_words) > 1:
+        terms.add(''.join(course_words))
+    return {sys.intern(term) for term in terms}
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._terms = []     # sorted terms
+        self._term_pks = []  # item pk for each entry in _terms
+        self._items = {}     # pk -> (suggestion dict, rank key, terms)
+        self._results = OrderedDict()
+        self._url_pattern = None
+        self.generation = None
+
+    # Building and maintenance
+
+    def rebuild(self):
+        from .models import Item
+
+        rows = Item.objects.filter(is_sold=False).values_list(
+            'pk', 'item_name', 'course', 'author', 'price', 'view_count',
+        )
+        with self._lock:
+            generation = catalog_generation()
+            entries = []
+            items = {}
+            for pk, name, course, author, price, views in rows.iterator(chunk_size=5000):
+                terms = item_terms(name, course, author)
+                items[pk] = self._entry(pk, name, course, price, views, terms)
+                entries.extend((term, pk) for term in terms)
+            entries.sort()
+            self._terms = [term for term, _ in entries]
+            self._term_pks = [pk for _, pk in entries]
+            self._items = items
+            self._results.clear()
+            self.generation = generation
+
+    def _entry(self, pk, name, course, price, views, terms):
+        suggestion = {
+            'id': pk,
+            'name': name,
+            'course': course or '',
+            'price': str(price),
+            'url': self.url_pattern().format(pk),
+        }
+        return suggestion, (-(views or 0), -pk), terms
+
+    def url_pattern(self):
+        # One reverse() per process instead of one per item
+        if self._url_pattern is None:
+            self._url_pattern = reverse('item_detail', kwargs={'pk': 987654321}).replace('987654321', '{}')
+        return self._url_pattern
+
+    def add(self, item):
+        with self._lock:
+            self._remove(item.pk)
+            terms = item_terms(item.item_name, item.course, item.author)
+            self._items[item.pk] = self._entry(
+                item.pk, item.item_name, item.course, item.price, item.view_count, terms,
+            )
+            for term in terms:
+                position = bisect.bisect_left(self._terms, term)
+                self._terms.insert(position, term)
+                self._term_pks.insert(position, item.pk)
+            self._results.clear()
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+            self._results.clear()
+
+    def _remove(self, pk):
+        entry = self._items.pop(pk, None)
+        if entry is None:
+            return
+        for term in entry[2]:
+            start = bisect.bisect_left(self._terms, term)
+            end = bisect.bisect_right(self._terms, term, start)
+            for position in range(start, end):
+                if self._term_pks[position] == pk:
+                    del self._terms[position]
+                    del self._term_pks[position]
+                    break
+
+    def item_changed(self, item, previous, generation, deleted=False):
+        """Apply one Item save/delete if the index is already built.
+
+        The save bumped the catalog generation from ``previous`` to
+        ``generation``. The index only moves to the new one if it was current
+        before; changes it missed (bulk updates, other processes) leave it
+        stale, so it is rebuilt on the next lookup.
+        """
+        if self.generation is None:
+            return
+        with self._lock:
+            if deleted or item.is_sold:
+                self.remove(item.pk)
+            else:
+                self.add(item)
+            if self.generation == previous:
+                self.generation = generation
+
+    def follow(self, previous, generation):
+        """Adopt a generation bump that changed nothing indexed here"""
+        with self._lock:
+            if self.generation == previous:
+                self.generation = generation
+
+    def is_current(self):
+        """Whether lookups can be answered without rebuilding first"""
+        return self.generation is not None and self.generation == catalog_generation()
+
+    # Lookups
+
+    def _matching(self, token):
+        start = bisect.bisect_left(self._terms, token)
+        end = bisect.bisect_left(self._terms, token + '\uffff', start)
+        return set(self._term_pks[start:end])
+
+    def suggest(self, query, limit=10):
+        """Up to ``limit`` suggestion dicts for ``query``"""
+        if not self.is_current():
+            self.rebuild()
+        query = query.lower().strip()
+        key = (query, limit)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                return cached
+            tokens = TOKEN_RE.findall(query)
+            if not tokens:
+                return []
+            pks = None
+            for token in sorted(tokens, key=len, reverse=True):
+                matches = self._matching(token)
+                pks = matches if pks is None else pks & matches
+                if not pks:
+                    break
+            ranked = heapq.nsmallest(
+                limit, (self._items[pk] for pk in pks or ()),
+                key=lambda entry: (not entry[0]['name'].lower().startswith(query), entry[1]),
+            )
+            results = [suggestion for suggestion, _, _ in ranked]
+            self._results[key] = results
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return results
+
+
+autocomplete_index = AutocompleteIndex()
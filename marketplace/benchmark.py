@@ -0,0 +1,323 @@
+"""Request-mix benchmark for the marketplace views.
+
+A mix is a list of request templates, one JSON object per line when read
+from a file::
+
+    {"endpoint": "all_items", "path": "/items/", "params": {"search": "{word}"}, "weight": 3}
+    {"endpoint": "post_item", "method": "POST", "path": "/post/", "weight": 1}
+
+``{placeholders}`` in paths and params are filled from a sample of the
+current catalog (see Sampler). Requests are replayed through the Django test
+client so timings include URL routing, middleware, queries and template
+rendering, but not a web server.
+
+``concurrent_replay`` issues the GETs of a mix with many requests in flight,
+through either the WSGI handler (a thread per in-flight request, like a
+threaded WSGI worker) or the ASGI handler (tasks on one event loop). With
+``writers`` it also runs threads that keep committing view-count style
+UPDATE transactions, to show how readers fare while the write lock is busy.
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from .diagnostics import CaptureAllQueries
+from .facets import PRICE_BUCKETS
+
+DEFAULT_MIX = [
+    {'endpoint': 'home', 'path': '/', 'weight': 15},
+    {'endpoint': 'all_items', 'path': '/items/', 'weight': 10},
+    {'endpoint': 'all_items search', 'path': '/items/', 'params': {'search': '{word}'}, 'weight': 8},
+    {'endpoint': 'all_items filter', 'path': '/items/', 'params': {'type': '{item_type}', 'course': '{course}'}, 'weight': 6},
+    {'endpoint': 'all_items condition', 'path': '/items/', 'params': {'condition': '{condition}'}, 'weight': 3},
+    {'endpoint': 'all_items price', 'path': '/items/', 'params': {'price': '{price_range}', 'type': '{item_type}'}, 'weight': 3},
+    {'endpoint': 'all_items sort', 'path': '/items/', 'params': {'sort': '{sort}'}, 'weight': 5},
+    {'endpoint': 'all_items deep page', 'path': '/items/', 'params': {'page': '{deep_page}'}, 'weight': 3},
+    {'endpoint': 'items_api', 'path': '/api/items/', 'params': {'sort': '{sort}'}, 'weight': 4},
+    {'endpoint': 'item_detail', 'path': '/item/{pk}/', 'weight': 25},
+    {'endpoint': 'search_ajax', 'path': '/search-ajax/', 'params': {'q': '{prefix}'}, 'weight': 20},
+    {'endpoint': 'post_item', 'method': 'POST', 'path': '/post/', 'weight': 1},
+]
+
+SORTS = ['-date_posted', 'price', '-price', 'item_name', '-view_count', 'trending']
+
+
+def load_mix(path):
+    """Read a JSONL request mix, skipping blank lines and # comments"""
+    mix = []
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                mix.append(json.loads(line))
+    return mix
+
+
+class Sampler:
+    """Random, catalog-derived values for mix placeholders"""
+
+    def __init__(self, rng, sample_size=500):
+        from .models import Item
+
+        self.rng = rng
+        active = Item.objects.filter(is_sold=False)
+        bounds = list(active.order_by('pk').values_list('pk', flat=True)[:1]) + \
+            list(active.order_by('-pk').values_list('pk', flat=True)[:1])
+        pks = []
+        if bounds:
+            probes = [rng.randint(bounds[0], bounds[-1]) for _ in range(sample_size)]
+            pks = list(active.filter(pk__in=probes).values_list('pk', flat=True))
+        rows = list(active.filter(pk__in=pks).values_list('item_name', 'course'))
+        self.pks = pks or [0]
+        self.words = sorted({word for name, _ in rows for word in name.split() if len(word) > 3}) or ['book']
+        self.courses = sorted({course for _, course in rows if course}) or ['']
+        self.pages = max(active.count() // 12, 1)
+
+    def __getitem__(self, key):
+        rng = self.rng
+        if key == 'pk':
+            return rng.choice(self.pks)
+        if key == 'word':
+            return rng.choice(self.words).lower()
+        if key == 'prefix':
+            word = rng.choice(self.words).lower()
+            return word[:rng.randint(2, min(5, len(word)))]
+        if key == 'course':
+            return rng.choice(self.courses)
+        if key == 'item_type':
+            return rng.choice(['book', 'notes'])
+        if key == 'condition':
+            return rng.choice(['excellent', 'good', 'fair', 'poor'])
+        if key == 'sort':
+            return rng.choice(SORTS)
+        if key == 'price_range':
+            return rng.choice(list(PRICE_BUCKETS))
+        if key == 'deep_page':
+            return rng.randint(max(self.pages // 2, 1), self.pages)
+        raise KeyError(key)
+
+    def post_data(self):
+        return {
+            'item_name': f'Benchmark {self["word"].title()}',
+            'item_type': self['item_type'],
+            'author': 'Benchmark Author',
+            'course': self['course'],
+            'price': '19.99',
+            'condition': self['condition'],
+            'description': 'Posted by the benchmark harness.',
+            'seller_name': 'Benchmark',
+            'contact_info': 'bench@university.edu',
+        }
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def fill(template, sampler):
+    if isinstance(template, str):
+        return template.format_map(sampler)
+    return {key: fill(value, sampler) for key, value in template.items()}
+
+
+def replay(mix, count, seed=0, warmup=0, client=None, progress=None):
+    """Run ``count`` requests drawn from ``mix``; returns per-endpoint results.
+
+    POSTs run inside a rolled-back transaction so the catalog is unchanged
+    afterwards.
+    """
+    rng = random.Random(seed)
+    sampler = Sampler(rng)
+    client = client or Client(HTTP_HOST='localhost')
+    weights = [entry.get('weight', 1) for entry in mix]
+    timings = defaultdict(list)
+    queries = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+
+    started = time.perf_counter()
+    for number in range(warmup + count):
+        entry = rng.choices(mix, weights)[0]
+        method = entry.get('method', 'GET').upper()
+        path = fill(entry['path'], sampler)
+        params = fill(entry.get('params', {}), sampler)
+        if method == 'POST' and not params:
+            params = sampler.post_data()
+
+        with CaptureAllQueries() as captured:
+            begin = time.perf_counter()
+            if method == 'POST':
+                with transaction.atomic():
+                    response = client.post(path, params)
+                    transaction.set_rollback(True)
+            else:
+                response = client.get(path, params)
+            elapsed = time.perf_counter() - begin
+
+        if number < warmup:
+            started = time.perf_counter()
+            continue
+        name = entry.get('endpoint', path)
+        timings[name].append(elapsed)
+        queries[name].append(len(captured))
+        statuses[name][response.status_code] += 1
+        if progress:
+            progress(number - warmup + 1, count)
+    wall = time.perf_counter() - started
+
+    results = {}
+    for name, values in timings.items():
+        results[name] = {
+            'requests': len(values),
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'mean_queries': sum(queries[name]) / len(queries[name]),
+            'max_queries': max(queries[name]),
+            'throughput_rps': len(values) / sum(values) if sum(values) else 0.0,
+            'statuses': dict(statuses[name]),
+        }
+    total = sum(len(values) for values in timings.values())
+    return {
+        'endpoints': results,
+        'total_requests': total,
+        'throughput_rps': total / wall if wall else 0.0,
+    }
+
+
+def plan_requests(mix, count, seed=0):
+    """``count`` (endpoint, path, params) GETs drawn from ``mix``"""
+    rng = random.Random(seed)
+    sampler = Sampler(rng)
+    gets = [entry for entry in mix if entry.get('method', 'GET').upper() == 'GET']
+    weights = [entry.get('weight', 1) for entry in gets]
+    planned = []
+    for entry in rng.choices(gets, weights, k=count):
+        path = fill(entry['path'], sampler)
+        planned.append((entry.get('endpoint', path), path, fill(entry.get('params', {}), sampler)))
+    return planned
+
+
+def _run_wsgi(planned, concurrency):
+    local = threading.local()
+
+    def send(request):
+        _, path, params = request
+        if not hasattr(local, 'client'):
+            local.client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+        begin = time.perf_counter()
+        response = local.client.get(path, params)
+        return time.perf_counter() - begin, response.status_code
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(send, planned))
+
+
+async def _run_asgi(planned, concurrency):
+    client = AsyncClient(raise_request_exception=False)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(request):
+        _, path, params = request
+        async with slots:
+            begin = time.perf_counter()
+            response = await client.get(path, params)
+            return time.perf_counter() - begin, response.status_code
+
+    return await asyncio.gather(*(send(request) for request in planned))
+
+
+def _write_views(pks, stop, interval, seed):
+    """Writer thread: commit view-count UPDATEs until ``stop`` is set.
+
+    Each transaction adds and removes a view on a few items, so it takes the
+    write lock and commits like a counter flush but leaves the data as it was.
+    Returns (transactions committed, transactions that failed).
+    """
+    from .models import Item, ItemListing
+
+    rng = random.Random(seed)
+    committed = failed = 0
+    try:
+        while not stop.is_set():
+            batch = rng.sample(pks, min(len(pks), 20))
+            try:
+                with transaction.atomic():
+                    for amount in (1, -1):
+                        Item.objects.filter(pk__in=batch).update(view_count=F('view_count') + amount)
+                        ItemListing.objects.filter(pk__in=batch).update(view_count=F('view_count') + amount)
+                committed += 1
+            except DatabaseError:
+                failed += 1
+            if interval:
+                stop.wait(interval)
+    finally:
+        connections.close_all()
+    return committed, failed
+
+
+def concurrent_replay(mix, count, concurrency, seed=0, handler='wsgi', warmup=50, writers=0, write_interval=0.0):
+    """Latency and throughput for ``count`` GETs with ``concurrency`` in flight,
+    while ``writers`` threads commit a write every ``write_interval`` seconds"""
+    planned = plan_requests(mix, warmup + count, seed)
+    warm, planned = planned[:warmup], planned[warmup:]
+    run = _run_wsgi if handler == 'wsgi' else lambda *args: asyncio.run(_run_asgi(*args))
+    pks = Sampler(random.Random(seed)).pks
+    stop = threading.Event()
+    # Every level starts from the same cold cache
+    cache.clear()
+    # AsyncClient always sends "Host: testserver"
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+            ThreadPoolExecutor(max(writers, 1), thread_name_prefix='bench-writer') as writer_pool:
+        run(warm, concurrency)
+        started = time.perf_counter()
+        writes = [writer_pool.submit(_write_views, pks, stop, write_interval, seed + n) for n in range(writers)]
+        results = run(planned, concurrency)
+        wall = time.perf_counter() - started
+        stop.set()
+        writes = [future.result() for future in writes]
+    timings = [elapsed for elapsed, _ in results]
+    statuses = defaultdict(int)
+    for _, status in results:
+        statuses[status] += 1
+    return {
+        'handler': handler,
+        'concurrency': concurrency,
+        'writers': writers,
+        'requests': len(results),
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'throughput_rps': len(results) / wall if wall else 0.0,
+        'statuses': dict(statuses),
+        'writes_per_s': sum(committed for committed, _ in writes) / wall if wall else 0.0,
+        'write_errors': sum(failed for _, failed in writes),
+    }
+
+
+def compare(results, baseline, metrics=('p50_ms', 'p95_ms', 'p99_ms', 'mean_queries')):
+    """[(endpoint, metric, baseline, current, change)] for endpoints in both runs"""
+    rows = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        for metric in metrics:
+            before, after = previous[metric], current[metric]
+            change = (after - before) / before if before else 0.0
+            rows.append((name, metric, before, after, change))
+    return rows
@@ -0,0 +1,98 @@
+"""Catalog-versioned caching for rendered fragments and derived data.
+
+Every cache entry that depends on the set of listings embeds the current
+catalog generation in its key. Item saves and deletes (via signals) and bulk
+admin updates call bump_catalog_generation(), which makes all such entries
+unreachable at once; they then age out of the cache on their own, so there
+is no need to track which keys a change affects.
+
+The generation itself lives in the 'shared' cache, which all processes
+read, so a change made by any of them (another web worker, the task worker,
+an import or archival run) reaches the others. Fragments and counts can
+stay in each process's own default cache, as their keys carry it.
+
+Hits and misses are counted per fragment name so the cache can be sized;
+see ``manage.py cache_stats``.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+GENERATION_KEY = 'marketplace:catalog-generation'
+METRICS_KEY = 'marketplace:metrics:{name}:{outcome}'
+METRICS_NAMES_KEY = 'marketplace:metrics:names'
+
+
+def catalog_generation():
+    """Current catalog generation, initialised on first use"""
+    shared = caches['shared']
+    generation = shared.get(GENERATION_KEY)
+    if generation is None:
+        # A time-based value never repeats one handed out before an eviction
+        generation = time.time_ns()
+        shared.add(GENERATION_KEY, generation, None)
+        generation = shared.get(GENERATION_KEY, generation)
+    return generation
+
+
+def bump_catalog_generation():
+    """Invalidate every catalog-versioned cache entry; returns the new generation"""
+    generation = time.time_ns()
+    caches['shared'].set(GENERATION_KEY, generation, None)
+    return generation
+
+
+def versioned_key(name, *parts):
+    """Cache key for ``name`` under the current catalog generation"""
+    digest = hashlib.md5(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f'marketplace:{name}:{catalog_generation()}:{digest}'
+
+
+def is_cached(name, *parts):
+    """Whether ``cached_value(name, parts, ...)`` would currently be a hit"""
+    return cache.has_key(versioned_key(name, *parts))
+
+
+def record_access(name, hit):
+    outcome = 'hits' if hit else 'misses'
+    key = METRICS_KEY.format(name=name, outcome=outcome)
+    if cache.add(key, 1, None):
+        names = cache.get(METRICS_NAMES_KEY, set())
+        if name not in names:
+            cache.set(METRICS_NAMES_KEY, names | {name}, None)
+    else:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def cache_metrics():
+    """{name: {'hits': n, 'misses': n, 'hit_rate': 0..1}} for every fragment seen"""
+    metrics = {}
+    for name in sorted(cache.get(METRICS_NAMES_KEY, set())):
+        hits = cache.get(METRICS_KEY.format(name=name, outcome='hits'), 0)
+        misses = cache.get(METRICS_KEY.format(name=name, outcome='misses'), 0)
+        total = hits + misses
+        metrics[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+    return metrics
+
+
+def cached_value(name, parts, compute, timeout=None):
+    """Return the catalog-versioned cached value, computing it on a miss"""
+    key = versioned_key(name, *parts)
+    value = cache.get(key)
+    record_access(name, value is not None)
+    if value is None:
+        value = compute()
+        if timeout is None:
+            timeout = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 300)
+        cache.set(key, value, timeout)
+    return value
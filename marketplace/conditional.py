@@ -0,0 +1,159 @@
+"""Conditional GET (ETag / Last-Modified) for the listing, detail and autocomplete pages.
+
+Listing and autocomplete validators come from the catalog generation
+(caching.py), a nanosecond timestamp bumped on every item save, delete, bulk
+update and new photo rendition, and shared by all processes. Reading it is a
+cache lookup, so a repeat request carrying If-None-Match or If-Modified-Since
+is answered with a 304 before any page query runs.
+
+A detail page only shows a handful of items, so its validators come from
+those: the item, its related items and the seller's other items, read in one
+query that also loads the item for the view. Edits elsewhere in the catalog
+leave its ETag alone.
+
+View counts are written with queryset updates that bump neither the
+generation nor ``Item.updated_at``, so viewing a page never changes its
+validators; a revalidated detail view is still counted. Only listings
+sorted by views or trending score, whose order follows the flushed counts,
+also change every VIEW_COUNT_FLUSH_INTERVAL.
+
+Pages with flash messages waiting are served in full and not validated, as
+the message must be shown.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db.models import OuterRef, Q, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .caching import catalog_generation
+from .pagination import VIEW_ORDERED_SORTS
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest())
+
+
+def has_pending_messages(request):
+    # len() does not mark the messages as used
+    return len(get_messages(request)) > 0
+
+
+def catalog_validators(request, *parts):
+    """(etag, last modified timestamp) for a page that only depends on the catalog"""
+    generation = catalog_generation()
+    return make_etag(generation, *parts), generation // 10**9
+
+
+def listing_validators(request):
+    if has_pending_messages(request):
+        return None
+    etag, last_modified = catalog_validators(request, sorted(request.GET.lists()))
+    if request.GET.get('sort') in VIEW_ORDERED_SORTS:
+        # The order follows the view counts, which move with each flush
+        flushes = int(time.time() // settings.VIEW_COUNT_FLUSH_INTERVAL)
+        etag, last_modified = make_etag(etag, flushes), None
+    return etag, last_modified
+
+
+def page_items(pk):
+    """The item and the related and other items its detail page lists (see views.detail_context).
+
+    Each is annotated with its newest rendition, whose id changes when a
+    photo is processed.
+    """
+    from .models import Item, ItemRendition, RelatedItem
+
+    related = RelatedItem.objects.filter(item=pk, related__is_sold=False).order_by('-score').values('related')[:3]
+    seller = Item.objects.filter(pk=pk).values('seller_key')
+    others = Item.objects.filter(seller_key=Subquery(seller), is_sold=False).exclude(pk=pk).values('pk')[:3]
+    renditions = ItemRendition.objects.filter(item=OuterRef('pk')).order_by('-pk').values('pk')[:1]
+    return Item.objects.filter(Q(pk=pk) | Q(pk__in=related) | Q(pk__in=others)).annotate(
+        newest_rendition=Subquery(renditions),
+    ).order_by()
+
+
+def detail_validators(request, pk):
+    """Validators from the items the page shows; keeps the item as ``request.detail_item``"""
+    if has_pending_messages(request):
+        return None
+    items = sorted(page_items(pk), key=lambda item: item.pk)
+    item = next((item for item in items if item.pk == pk), None)
+    if item is None:
+        return None  # archived or missing
+    request.detail_item = item
+    stamps = [(other.pk, other.updated_at, other.newest_rendition) for other in items]
+    return make_etag('item', stamps), int(max(other.updated_at for other in items).timestamp())
+
+
+def search_validators(request):
+    return catalog_validators(request, 'search', request.GET.get('q', '').strip().lower())
+
+
+def count_revalidated_view(request, pk):
+    from .counters import view_counter
+    view_counter.increment(pk, defer=True)
+
+
+def conditional(validators, on_not_modified=None, **cache_control):
+    """Answer GET/HEAD with 304 when ``validators(request, *args, **kwargs)`` match.
+
+    ``validators`` returns (etag, last_modified) or None to skip validation.
+    Matching responses and 304s carry the validators and ``cache_control``
+    (default ``no-cache``: caches may store the page but must revalidate).
+    Works for sync and async views; ``on_not_modified`` runs for each 304.
+    """
+    cache_control = cache_control or {'no_cache': True}
+
+    def not_modified(request, found, args, kwargs):
+        if found is None:
+            return None
+        etag, last_modified = found
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None and on_not_modified:
+            on_not_modified(request, *args, **kwargs)
+        return response
+
+    def finish(response, found):
+        if found is not None and response.status_code in (200, 304):
+            etag, last_modified = found
+            response.headers.setdefault('ETag', etag)
+            if last_modified is not None:
+                response.headers.setdefault('Last-Modified', http_date(last_modified))
+            patch_cache_control(response, **cache_control)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                found = None
+                if request.method in ('GET', 'HEAD'):
+                    try:
+                        found = validators(request, *args, **kwargs)
+                    except SynchronousOnlyOperation:
+                        # Messages kept in the session
+                        found = await sync_to_async(validators)(request, *args, **kwargs)
+                    response = not_modified(request, found, args, kwargs)
+                    if response is not None:
+                        return finish(response, found)
+                return finish(await view(request, *args, **kwargs), found)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                found = None
+                if request.method in ('GET', 'HEAD'):
+                    found = validators(request, *args, **kwargs)
+                    response = not_modified(request, found, args, kwargs)
+                    if response is not None:
+                        return finish(response, found)
+                return finish(view(request, *args, **kwargs), found)
+        return wrapper
+    return decorator
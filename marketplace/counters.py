@@ -0,0 +1,134 @@
+"""Buffered view counting.
+
+Detail page hits used to run an UPDATE each, taking SQLite's write lock on
+the read path. Increments are now collected in memory and written in batches
+of ``view_count = view_count + n`` once VIEW_COUNT_FLUSH_THRESHOLD views are
+pending or VIEW_COUNT_FLUSH_INTERVAL seconds have passed, whichever is first.
+A background thread enforces the interval when traffic is idle and an atexit
+hook flushes whatever is left on a clean shutdown. Each flush also feeds the
+hourly view buckets and trending scores (see trending.py).
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    def __init__(self):
+        self._pending = Counter()
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 5)
+
+    @property
+    def flush_threshold(self):
+        return getattr(settings, 'VIEW_COUNT_FLUSH_THRESHOLD', 100)
+
+    def increment(self, pk, amount=1, defer=False):
+        """Record ``amount`` views of item ``pk``.
+
+        With ``defer`` a due flush is handed to the background thread instead
+        of running here, for callers that must not block (async views).
+        """
+        with self._lock:
+            self._pending[pk] += amount
+            self._pending_total += amount
+            due = (
+                self._pending_total >= self.flush_threshold
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if not due:
+            self._ensure_thread()
+        elif defer and self._ensure_thread():
+            self._wakeup.set()
+        else:
+            self.flush()
+
+    def pending(self, pk):
+        """Views of ``pk`` recorded but not yet written"""
+        with self._lock:
+            return self._pending.get(pk, 0)
+
+    def flush(self):
+        """Write all pending increments, returning how many views were saved"""
+        with self._lock:
+            batch = self._pending
+            self._pending = Counter()
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+        if not batch:
+            return 0
+
+        from .models import Item, ItemListing
+        from .trending import add_to_score, log_weight, record_views
+
+        now = timezone.now()
+        by_amount = defaultdict(list)
+        for pk, amount in batch.items():
+            by_amount[amount].append(pk)
+        try:
+            with transaction.atomic():
+                for amount, pks in by_amount.items():
+                    trending_score = add_to_score(log_weight(amount, now))
+                    Item.objects.filter(pk__in=pks).update(
+                        view_count=F('view_count') + amount, trending_score=trending_score,
+                    )
+                    ItemListing.objects.filter(pk__in=pks).update(
+                        view_count=F('view_count') + amount, trending_score=trending_score,
+                    )
+                record_views(batch, now)
+        except Exception:
+            # Keep the views for the next attempt rather than dropping them
+            with self._lock:
+                self._pending.update(batch)
+                self._pending_total += sum(batch.values())
+            raise
+        return sum(batch.values())
+
+    def _ensure_thread(self):
+        """Start the flush thread if needed; False when interval flushing is off"""
+        if not self.flush_interval:
+            return False
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+                    self._thread.start()
+        return True
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush view counts')
+            finally:
+                connections.close_all()
+
+
+view_counter = ViewCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        logger.exception('Failed to flush view counts on shutdown')
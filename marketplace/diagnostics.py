@@ -0,0 +1,143 @@
+"""Helpers for checking the SQL that marketplace pages issue.
+
+Checks run the real views through the test client against a throwaway test
+database seeded with a small catalog, so they see exactly the queries a
+browser request would trigger.
+"""
+import re
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+    setup_databases, teardown_databases,
+)
+
+# "SCAN marketplace_item" without an index is a full table scan; index scans
+# ("USING INDEX", "USING COVERING INDEX") and FTS lookups are fine.
+FULL_SCAN_RE = re.compile(r"\bSCAN (marketplace_\w+)\b(?! USING| VIRTUAL TABLE)")
+
+COURSES = ['MATH 101', 'CS 201', 'PHYS 110', 'CHEM 120', 'ECON 101']
+SELLERS = ['Ann', 'Bob', 'Chen', 'Dana']
+
+
+@contextmanager
+def scratch_database():
+    """Create the test database(s) for the duration of the block.
+
+    Background tasks are not started in threads there; seed_catalog() runs
+    the ones it queues.
+    """
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(TASKS_RUN_IN_PROCESS=False):
+            yield
+    finally:
+        from .counters import view_counter
+
+        # Write views counted by the checks here, not into the real database at exit
+        view_counter.flush()
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def seed_catalog(count=60):
+    """Insert a small, varied catalog and return the items"""
+    from .models import Item
+    from .tasks import run_pending
+
+    items = []
+    for i in range(count):
+        items.append(Item.objects.create(
+            item_name=f'Calculus Volume {i}' if i % 2 else f'Algorithms Edition {i}',
+            description='Lightly used, a few highlights.',
+            price=Decimal(5 + i),
+            seller_name=SELLERS[i % len(SELLERS)],
+            contact_info='seller@university.edu',
+            item_type='book' if i % 3 else 'notes',
+            author='James Stewart' if i % 2 else 'Thomas Cormen',
+            course=COURSES[i % len(COURSES)],
+            condition=['excellent', 'good', 'fair', 'poor'][i % 4],
+            is_sold=(i % 10 == 0),
+        ))
+    run_pending()
+    return items
+
+
+def sample_pages(item):
+    """(label, url) pairs covering the query shapes each view can produce"""
+    return [
+        ('home', '/'),
+        ('all_items', '/items/'),
+        ('all_items type', '/items/?type=book'),
+        ('all_items course', '/items/?course=MATH+101'),
+        ('all_items condition', '/items/?condition=good'),
+        ('all_items price', '/items/?price=10-25&type=book'),
+        ('all_items search', '/items/?search=calc'),
+        ('all_items sort price', '/items/?sort=price'),
+        ('all_items sort -price', '/items/?sort=-price'),
+        ('all_items sort name', '/items/?sort=item_name'),
+        ('all_items sort views', '/items/?sort=-view_count'),
+        ('all_items sort trending', '/items/?sort=trending'),
+        ('all_items page 2', '/items/?page=2'),
+        ('all_items cursor', '/items/?cursor=&sort=price'),
+        ('items_api', '/api/items/?sort=-view_count&total=1'),
+        ('item_detail', f'/item/{item.pk}/'),
+        ('search_ajax', '/search-ajax/?q=calc'),
+    ]
+
+
+class CaptureAllQueries:
+    """CaptureQueriesContext over every configured database (reads may use the replica alias)"""
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases or list(connections)
+
+    def __enter__(self):
+        self.contexts = [CaptureQueriesContext(connections[alias]) for alias in self.aliases]
+        for context in self.contexts:
+            context.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for context in reversed(self.contexts):
+            context.__exit__(*exc_info)
+
+    def __len__(self):
+        return sum(len(context) for context in self.contexts)
+
+    @property
+    def captured_queries(self):
+        return [query for context in self.contexts for query in context.captured_queries]
+
+
+def capture_page_queries(url, client=None, aliases=None):
+    """Fetch ``url`` with a cold cache and return the queries captured on ``aliases`` (default: all)"""
+    cache.clear()
+    client = client or Client()
+    with CaptureAllQueries(aliases) as context:
+        client.get(url)
+    return context.captured_queries
+
+
+def explain(sql):
+    """EXPLAIN QUERY PLAN rows (detail column only) for a captured query"""
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql):
+    """Tables that ``sql`` reads with a full table scan"""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return []
+    found = []
+    for detail in explain(sql):
+        match = FULL_SCAN_RE.search(detail)
+        if match:
+            found.append(match.group(1))
+    return found
@@ -0,0 +1,105 @@
+"""Course and Seller dimension tables.
+
+Items keep the course code and seller name exactly as typed, plus foreign
+keys to a Course and a Seller row whose primary key is the normalized form
+("MATH 101", "math101" and "Math-101" are all course "math101"). Each row
+carries ``active_count``, the number of unsold items pointing at it, so the
+course dropdown, popular courses and seller counts are small indexed reads
+instead of DISTINCT/GROUP BY scans over Item.
+
+Counts are recomputed (not incremented) for just the keys a change touches,
+which keeps them exact even when saves race.
+"""
+import re
+
+from django.db.models import Count
+
+RECOUNT_ALL_THRESHOLD = 500
+
+
+def course_key(code):
+    """Normalized course key, or None for a blank code"""
+    return re.sub(r'[^a-z0-9]', '', (code or '').lower()) or None
+
+
+def seller_key(name):
+    """Normalized seller key, or None for a blank name"""
+    return ' '.join((name or '').lower().split()) or None
+
+
+def assign_keys(items):
+    """Set course/seller keys on unsaved or edited items, creating missing rows.
+
+    Two INSERT OR IGNORE statements however many items are passed, so bulk
+    inserts can call it once per batch.
+    """
+    from .models import Course, Seller
+
+    courses, sellers = {}, {}
+    for item in items:
+        item.course_key_id = course_key(item.course)
+        item.seller_key_id = seller_key(item.seller_name)
+        if item.course_key_id:
+            courses.setdefault(item.course_key_id, ' '.join(item.course.split()))
+        if item.seller_key_id:
+            sellers.setdefault(item.seller_key_id, ' '.join(item.seller_name.split()))
+    if courses:
+        Course.objects.bulk_create(
+            [Course(key=key, code=code) for key, code in courses.items()], ignore_conflicts=True,
+        )
+    if sellers:
+        Seller.objects.bulk_create(
+            [Seller(key=key, name=name) for key, name in sellers.items()], ignore_conflicts=True,
+        )
+
+
+def _recount(model, field, keys):
+    from .models import Item
+
+    active = Item.objects.filter(is_sold=False)
+    rows = model.objects.all()
+    if keys is not None:
+        keys = {key for key in keys if key}
+        if not keys:
+            return
+        active = active.filter(**{f'{field}__in': keys})
+        rows = rows.filter(pk__in=keys)
+    counts = dict(active.order_by().values_list(field).annotate(count=Count('pk')))
+    changed = []
+    for row in rows.only('pk', 'active_count'):
+        count = counts.get(row.pk, 0)
+        if row.active_count != count:
+            row.active_count = count
+            changed.append(row)
+    model.objects.bulk_update(changed, ['active_count'], batch_size=500)
+
+
+def recount(course_keys=None, seller_keys=None):
+    """Recompute active_count for the given keys (None means every row)"""
+    from .models import Course, Seller
+
+    if course_keys is not None and len(course_keys) > RECOUNT_ALL_THRESHOLD:
+        course_keys = None
+    if seller_keys is not None and len(seller_keys) > RECOUNT_ALL_THRESHOLD:
+        seller_keys = None
+    _recount(Course, 'course_key', course_keys)
+    _recount(Seller, 'seller_key', seller_keys)
+
+
+def changed_keys(item, created=False, deleted=False):
+    """(course keys, seller keys) whose counts a save or delete of ``item`` changed"""
+    previous = getattr(item, '_saved_keys', (None, None, None))
+    current = (item.course_key_id, item.seller_key_id, item.is_sold)
+    if deleted and previous[2] and current[2]:
+        return set(), set()  # sold items are not counted (e.g. archival deletes them in bulk)
+    if created or deleted or previous != current:
+        return {previous[0], current[0]} - {None}, {previous[1], current[1]} - {None}
+    return set(), set()
+
+
+def items_changed(item_ids):
+    """Re-sync counts after a bulk update of the given items"""
+    from .models import Item
+
+    keys = list(Item.objects.filter(pk__in=item_ids).values_list('course_key', 'seller_key'))
+    recount({course for course, _ in keys}, {seller for _, seller in keys})
@@ -0,0 +1,138 @@
+"""Facet counts for the listing filters.
+
+One GROUP BY over the unsold items matching the current search, walking
+listing_facet_idx in order, yields per (type, condition, course) the number of
+items in each price bucket. Counts for every facet are rolled up from those
+rows in Python, disjunctively: each facet ignores its own selection, so
+choosing "Books" still shows how many notes there are. The grouped rows are
+cached per search and the counts per normalized filter set, both under the
+catalog generation.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db.models import Count, F, Q, Value
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+
+from .caching import cached_value
+from .search import search_items
+
+logger = logging.getLogger(__name__)
+
+FACET_CACHE_TIMEOUT = 5 * 60
+
+# key -> (label, lower bound, upper bound) in whole dollars; bounds are
+# inclusive/exclusive
+PRICE_BUCKETS = {
+    '0-10': ('Under $10', None, 10),
+    '10-25': ('$10 - $25', 10, 25),
+    '25-50': ('$25 - $50', 25, 50),
+    '50-100': ('$50 - $100', 50, 100),
+    '100-': ('$100 and up', 100, None),
+}
+
+# Listing filters with counts
+FACETS = ['type', 'condition', 'course', 'price']
+
+
+def price_range(key):
+    """Q for the price bucket ``key``, or None if it is not a bucket"""
+    if key not in PRICE_BUCKETS:
+        return None
+    _, low, high = PRICE_BUCKETS[key]
+    condition = Q()
+    if low is not None:
+        condition &= Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def _bucket_condition(key):
+    # Like price_range(), but with integer literals rather than Decimal
+    # parameters, which SQLite would convert from text on every row
+    _, low, high = PRICE_BUCKETS[key]
+    condition = Q()
+    if low is not None:
+        condition &= Q(GreaterThanOrEqual(F('price'), Value(low)))
+    if high is not None:
+        condition &= Q(LessThan(F('price'), Value(high)))
+    return condition
+
+
+def grouped_rows(search):
+    """[(item_type, condition, course_key, count per price bucket...)] for a search"""
+    from .models import ItemListing
+
+    def compute():
+        items = ItemListing.objects.all()
+        if search:
+            items = search_items(items, search)
+        # Conditional counts keep the grouping on the index's column order;
+        # grouping by a computed bucket would need a temporary B-tree
+        buckets = {f'bucket_{index}': Count('pk', filter=_bucket_condition(key)) for index, key in enumerate(PRICE_BUCKETS)}
+        rows = items.order_by().values_list('item_type', 'condition', 'course_key').annotate(**buckets)
+        begin = time.perf_counter()
+        rows = [tuple(row) for row in rows]
+        elapsed = (time.perf_counter() - begin) * 1000
+        budget = getattr(settings, 'FACET_QUERY_BUDGET_MS', 150)
+        if elapsed > budget:
+            logger.warning('Facet counts for search %r took %.0f ms (budget %d ms)', search, elapsed, budget)
+        return rows
+
+    return cached_value('facet-rows', [search], compute, FACET_CACHE_TIMEOUT)
+
+
+def rollup(rows, selected):
+    """{facet: {value: count}} from grouped rows and the selected filters"""
+    counts = {facet: {} for facet in FACETS}
+    price_keys = list(PRICE_BUCKETS)
+    price_index = price_keys.index(selected['price']) if selected.get('price') else None
+    for item_type, condition, course, *by_price in rows:
+        values = {'type': item_type, 'condition': condition, 'course': course}
+        misses = [facet for facet, value in values.items() if selected.get(facet) and selected[facet] != value]
+        # A row counts towards a facet when it matches every other selection
+        if len(misses) > 1:
+            continue
+        matching = by_price[price_index] if price_index is not None else sum(by_price)
+        if misses:
+            facet = misses[0]
+            counts[facet][values[facet]] = counts[facet].get(values[facet], 0) + matching
+            continue
+        for facet, value in values.items():
+            if value is not None:
+                counts[facet][value] = counts[facet].get(value, 0) + matching
+        for key, count in zip(price_keys, by_price):
+            counts['price'][key] = counts['price'].get(key, 0) + count
+    return counts
+
+
+def facet_counts(filters):
+    """Counts per facet value for the normalized listing ``filters``"""
+    selected = {facet: filters.get(facet) or '' for facet in FACETS}
+    parts = [filters.get('search', '')] + sorted(selected.items())
+    return cached_value(
+        'facet-counts', parts,
+        lambda: rollup(grouped_rows(filters.get('search', '')), selected),
+        FACET_CACHE_TIMEOUT,
+    )
+
+
+def facet_options(filters, courses):
+    """(value, label, count) choices per facet for the listing filter form.
+
+    Courses are limited to those with matching items (and the selected one).
+    """
+    from .models import Item
+
+    counts = facet_counts(filters)
+    return {
+        'type': [(value, label, counts['type'].get(value, 0)) for value, label in Item.ITEM_TYPES],
+        'condition': [(value, label, counts['condition'].get(value, 0)) for value, label in Item.CONDITIONS],
+        'price': [(key, label, counts['price'].get(key, 0)) for key, (label, _, _) in PRICE_BUCKETS.items()],
+        'course': [
+            (course.key, course.code, counts['course'].get(course.key, 0)) for course in courses
+            if course.key in counts['course'] or course.key == filters.get('course')
+        ],
+    }
@@ -1,5 +1,64 @@
 from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
 from .models import Item
+from .uploads import OversizedUpload
+
+# Pillow format names accepted for item photos
+PHOTO_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+
+
+class PhotoField(forms.FileField):
+    """Image upload field that reads only the file header.
+
+    forms.ImageField copies small uploads into memory and runs Pillow's
+    verify() over the whole file. Here Image.open() parses the format and
+    dimensions from the first few KB of the file (on disk for streamed
+    uploads), and the pixels are decoded once, downscaled, when the
+    renditions are made.
+    """
+    default_error_messages = {
+        'invalid_image': 'Upload a valid image. The file you uploaded was either not an image or a corrupted image.',
+        'format': 'Upload a JPEG, PNG, WebP or GIF photo.',
+        'too_big': 'Photos can be at most %(max)s.',
+        'too_many_pixels': 'Photos can be at most %(max)s megapixels.',
+    }
+
+    def to_python(self, data):
+        if isinstance(data, OversizedUpload):
+            raise forms.ValidationError(
+                self.error_messages['too_big'], code='too_big',
+                params={'max': filesizeformat(settings.MAX_PHOTO_UPLOAD_SIZE)},
+            )
+        f = super().to_python(data)
+        if f is None:
+            return None
+        source = f.temporary_file_path() if hasattr(f, 'temporary_file_path') else f
+        try:
+            with Image.open(source) as image:
+                image_format, size = image.format, image.size
+        except Exception as exc:
+            raise forms.ValidationError(self.error_messages['invalid_image'], code='invalid_image') from exc
+        if image_format not in PHOTO_FORMATS:
+            raise forms.ValidationError(self.error_messages['format'], code='format')
+        if size[0] * size[1] > settings.MAX_PHOTO_PIXELS:
+            raise forms.ValidationError(
+                self.error_messages['too_many_pixels'], code='too_many_pixels',
+                params={'max': settings.MAX_PHOTO_PIXELS // 1_000_000},
+            )
+        f.content_type = Image.MIME.get(image_format)
+        f.image_size = size
+        f.seek(0)
+        return f
+
+    def widget_attrs(self, widget):
+        attrs = super().widget_attrs(widget)
+        if isinstance(widget, forms.FileInput) and 'accept' not in widget.attrs:
+            attrs.setdefault('accept', 'image/*')
+        return attrs
+
 
 class ItemForm(forms.ModelForm):
     class Meta:
@@ -9,6 +68,7 @@ class ItemForm(forms.ModelForm):
             'price', 'condition', 'description', 
             'seller_name', 'contact_info', 'image'
         ]
+        field_classes = {'image': PhotoField}
         widgets = {
             'item_name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -68,4 +128,16 @@ class SearchForm(forms.Form):
             'class': 'form-control',
             'placeholder': 'Filter by course...'
         })
+    )
+
+class ItemImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV with a header row, or JSONL (one listing per line).')
+    format = forms.ChoiceField(
+        choices=[('', 'From file extension'), ('csv', 'CSV'), ('jsonl', 'JSONL')],
+        required=False,
+    )
+    dry_run = forms.BooleanField(required=False, help_text='Validate the file without importing anything.')
+    refresh_recommendations = forms.BooleanField(
+        required=False, initial=True,
+        help_text='Rank similar items for the new listings now (slower for large files).',
     )
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""Off-request image processing for item photos.
+
+Saving an Item with a new photo queues a "renditions" task (tasks.py) that
+runs once the transaction commits. The task decodes the upload once and
+writes every rendition (card thumbnail and detail size, as JPEG plus WebP,
+and AVIF when a Pillow plugin provides it) to MEDIA_ROOT, recording paths and
+dimensions in ItemRendition. Templates build srcsets from those rows and fall
+back to the original upload until they exist.
+
+JPEG uploads are decoded with Image.draft(), which lets libjpeg scale by
+1/2, 1/4 or 1/8 while decoding: a 12 megapixel phone photo is decoded at a
+few megapixels, which is still DRAFT_GAP times the largest rendition.
+"""
+import hashlib
+import io
+import math
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import ExifTags, Image, ImageOps
+
+from .autocomplete import autocomplete_index
+from .caching import bump_catalog_generation, catalog_generation
+from .listings import refresh as refresh_listings
+from .tasks import enqueue_many, task
+
+# kind -> (max width, max height, crop to fill)
+RENDITION_SIZES = {
+    'card': (480, 360, True),
+    'detail': (800, 800, False),
+}
+
+SAVE_OPTIONS = {
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+
+MAX_ATTEMPTS = 3
+
+# Decode at least this many times the size of the largest rendition, so
+# LANCZOS resampling still has detail to work with
+DRAFT_GAP = 2.0
+
+# EXIF orientations that rotate the image by 90 degrees
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+}
+
+# Renditions offered in each context's srcset, smallest first
+PICTURE_KINDS = {
+    'card': ['card', 'detail'],
+    'detail': ['detail'],
+}
+
+def output_formats():
+    """Formats to encode; AVIF only when a Pillow plugin registers it"""
+    formats = ['jpeg', 'webp']
+    if '.avif' in Image.registered_extensions():
+        formats.append('avif')
+    return formats
+
+
+def enqueue_image_job(item):
+    """Queue rendition work for ``item``'s photo"""
+    enqueue_image_jobs([item])
+
+
+def enqueue_image_jobs(items, start=True):
+    """Queue rendition work for many items at once (bulk imports).
+
+    With ``start`` it runs in this process after the current transaction;
+    otherwise it waits for ``manage.py run_tasks``.
+    """
+    enqueue_many(
+        'renditions', [{'item': item.pk} for item in items],
+        key=lambda payload: f'item:{payload["item"]}', start=start,
+    )
+
+
+@task('renditions', max_attempts=MAX_ATTEMPTS)
+def run_image_jobs(payloads):
+    """Task handler: render the current photo of each item that still has one"""
+    from .models import Item
+
+    for item in Item.objects.filter(pk__in=[payload['item'] for payload in payloads]):
+        if item.image:
+            generate_renditions(item)
+
+
+def needed_size(size):
+    """Smallest decoded (width, height) of an upright image of ``size`` that
+    still gives every rendition DRAFT_GAP times its pixels"""
+    width, height = size
+    scale = 0
+    for max_width, max_height, crop in RENDITION_SIZES.values():
+        if crop:
+            scale = max(scale, max_width / width, max_height / height)
+        else:
+            scale = max(scale, min(max_width / width, max_height / height, 1))
+    scale = min(scale * DRAFT_GAP, 1)
+    return math.ceil(width * scale), math.ceil(height * scale)
+
+
+def decode_for_renditions(source):
+    """Upright RGB image from an open photo file, decoded no larger than needed"""
+    image = Image.open(source)
+    transposed = image.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS
+    width, height = needed_size(image.size[::-1] if transposed else image.size)
+    # Only JPEG can decode at a reduced scale; other formats ignore this
+    image.draft('RGB', (height, width) if transposed else (width, height))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def render(image, kind):
+    """Resize an RGB image for one rendition kind"""
+    width, height, crop = RENDITION_SIZES[kind]
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return resized
+
+
+def generate_renditions(item):
+    """Write every rendition of ``item.image`` and replace its ItemRendition rows"""
+    from .models import ItemRendition
+
+    with item.image.open('rb') as source:
+        image = decode_for_renditions(source)
+
+    # Names carry a digest of the source so a replaced photo gets new URLs
+    # and never collides with cached copies of the old renditions.
+    digest = hashlib.md5(item.image.name.encode()).hexdigest()[:8]
+    renditions = []
+    for kind in RENDITION_SIZES:
+        resized = render(image, kind)
+        for image_format in output_formats():
+            buffer = io.BytesIO()
+            resized.save(buffer, **SAVE_OPTIONS[image_format])
+            name = f'item_images/renditions/{item.pk}-{digest}-{kind}.{image_format}'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            renditions.append(ItemRendition(
+                item=item, kind=kind, image_format=image_format,
+                file=name, width=resized.width, height=resized.height,
+            ))
+
+    new_files = {rendition.file for rendition in renditions}
+    with transaction.atomic():
+        stale = ItemRendition.objects.filter(item=item)
+        stale_files = [name for name in stale.values_list('file', flat=True) if name not in new_files]
+        stale.delete()
+        ItemRendition.objects.bulk_create(renditions)
+    for name in stale_files:
+        default_storage.delete(name)
+    refresh_listings([item.pk])
+    # Cached listing fragments still point at the original upload; the
+    # autocomplete index has no image data, so it need not be rebuilt
+    previous = catalog_generation()
+    autocomplete_index.follow(previous, bump_catalog_generation())
+
+
+def picture_data(item, kind='card'):
+    """Sources, srcset and fallback src of the <picture> for an item photo.
+
+    Uses prefetched ``item.renditions`` when available; until the image job
+    has run it falls back to the original upload.
+    """
+    renditions = [r for r in item.renditions.all() if r.kind in PICTURE_KINDS[kind]]
+    renditions.sort(key=lambda r: r.width)
+    sources = []
+    for image_format, mime_type in MIME_TYPES.items():
+        matching = [r for r in renditions if r.image_format == image_format]
+        if matching:
+            sources.append({
+                'type': mime_type,
+                'srcset': ', '.join(f'{r.url} {r.width}w' for r in matching),
+            })
+    fallback = [r for r in renditions if r.image_format == 'jpeg']
+    primary = item.rendition(kind)
+    return {
+        'sources': sources,
+        'srcset': ', '.join(f'{r.url} {r.width}w' for r in fallback),
+        'src': primary.url if primary else item.image.url,
+        'width': primary.width if primary else None,
+        'height': primary.height if primary else None,
+    }
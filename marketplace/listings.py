@@ -0,0 +1,86 @@
+"""Read-optimized projection of active listings for the card grids.
+
+ItemListing holds one narrow row per unsold item: the columns the homepage
+and listing cards show or filter on, plus the detail URL, a 15-word summary
+of the description and the card <picture> data precomputed. Listing pages
+read it instead of full Item rows, so a page of cards never loads
+descriptions or rendition rows and renders without reverse() calls.
+
+Rows are written from the Item side: refresh() shortly after every save
+(the 'item_changes' task queued by signals), after bulk updates and imports, and when an item's renditions are ready.
+Sold items have no row. View counts and trending scores are copied by the
+view counter's flush. ``manage.py rebuild_listings`` rebuilds the table from scratch, e.g.
+after changing the URL configuration or the card's picture markup.
+"""
+from django.db import transaction
+from django.urls import reverse
+from django.utils.text import Truncator
+
+LISTING_FIELDS = [
+    'item_name', 'author', 'course', 'course_key', 'item_type', 'condition', 'price', 'date_posted', 'view_count',
+    'trending_score',
+]
+# Kept current by the view counter's flush (Item.COUNTER_FIELDS). Upserts
+# leave them alone: the Item they project may have been loaded before a flush.
+COUNTER_FIELDS = ['view_count', 'trending_score']
+SUMMARY_WORDS = 15
+REFRESH_BATCH_SIZE = 1000
+
+
+def project(item):
+    """Unsaved ItemListing for an Item (renditions should be prefetched)"""
+    from .images import picture_data
+    from .models import ItemListing
+
+    listing = ItemListing(item_id=item.pk, **{name: getattr(item, name) for name in LISTING_FIELDS if name != 'course_key'})
+    listing.course_key = item.course_key_id
+    listing.summary = Truncator(item.description).words(SUMMARY_WORDS)
+    listing.url = reverse('item_detail', kwargs={'pk': item.pk})
+    listing.picture = picture_data(item, 'card') if item.image else None
+    return listing
+
+
+def refresh(item_ids):
+    """Bring the listing rows of the given items in line with the Item table"""
+    from .models import Item, ItemListing
+
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), REFRESH_BATCH_SIZE):
+        batch = item_ids[start:start + REFRESH_BATCH_SIZE]
+        items = Item.objects.filter(pk__in=batch, is_sold=False).prefetch_related('renditions')
+        listings = [project(item) for item in items]
+        upsert(listings)
+        # Sold or deleted since
+        active = {listing.item_id for listing in listings}
+        ItemListing.objects.filter(pk__in=[pk for pk in batch if pk not in active]).delete()
+
+
+def upsert(listings):
+    """Insert or update listing rows, keeping the counters of existing ones"""
+    from .models import ItemListing
+
+    ItemListing.objects.bulk_create(
+        listings, update_conflicts=True, unique_fields=['item'],
+        update_fields=[*(name for name in LISTING_FIELDS if name not in COUNTER_FIELDS), 'summary', 'url', 'picture'],
+    )
+
+
+def rebuild():
+    """Recreate every row; returns how many active listings there are"""
+    from .models import Item, ItemListing
+
+    ItemListing.objects.all().delete()
+    item_ids = list(Item.objects.filter(is_sold=False).values_list('pk', flat=True))
+    refresh(item_ids)
+    return len(item_ids)
+
+
+def ensure_populated():
+    """Fill the table on first migrate when there are already listings"""
+    from .models import Item, ItemListing
+
+    # Inside a transaction reads stay on 'default' (routers.py); the read
+    # alias may not point at the database being migrated yet
+    with transaction.atomic():
+        if not ItemListing.objects.exists() and Item.objects.filter(is_sold=False).exists():
+            rebuild()
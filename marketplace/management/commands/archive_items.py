@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from marketplace.archive import archive_due, due_for_archival
+from marketplace.models import Item
+
+
+class Command(BaseCommand):
+    help = (
+        'Move items sold over ARCHIVE_SOLD_AFTER_DAYS ago, and unsold items unchanged for '
+        'ARCHIVE_STALE_AFTER_DAYS, into the archive table and their photos to cold storage'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+            help=f'Items per transaction (default: {settings.ARCHIVE_BATCH_SIZE})',
+        )
+        parser.add_argument('--limit', type=int, help='Archive at most this many items')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the items due')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            due = Item.objects.filter(due_for_archival()).aggregate(
+                sold=Count('pk', filter=Q(is_sold=True)), stale=Count('pk', filter=Q(is_sold=False)),
+            )
+            self.stdout.write(f'{due["sold"]} sold and {due["stale"]} stale items are due for archival.')
+            return
+        begin = time.perf_counter()
+        totals = archive_due(batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {totals.get("sold", 0)} sold and {totals.get("stale", 0)} stale items '
+            f'in {time.perf_counter() - begin:.1f} s.'
+        ))
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from marketplace.benchmark import DEFAULT_MIX, compare, load_mix, replay
+
+
+class Command(BaseCommand):
+    help = 'Replay a request mix against the marketplace views and report latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests (default: 500)')
+        parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests first (default: 50)')
+        parser.add_argument('--mix', help='JSONL file of request templates (default: built-in mix)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against results previously saved with --output')
+        parser.add_argument(
+            '--threshold', type=float, default=0.10,
+            help='Relative change reported as a regression or improvement (default: 0.10)',
+        )
+
+    def handle(self, *args, **options):
+        mix = load_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        results = replay(mix, options['requests'], seed=options['seed'], warmup=options['warmup'])
+
+        self.stdout.write(
+            f'{"endpoint":<22} {"reqs":>5} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"req/s":>8}'
+        )
+        for name, row in sorted(results['endpoints'].items()):
+            self.stdout.write(
+                f'{name:<22} {row["requests"]:>5} {row["p50_ms"]:>8.2f} {row["p95_ms"]:>8.2f} '
+                f'{row["p99_ms"]:>8.2f} {row["mean_queries"]:>8.1f} {row["throughput_rps"]:>8.1f}'
+            )
+        self.stdout.write(
+            f'\n{results["total_requests"]} requests, {results["throughput_rps"]:.1f} req/s overall'
+        )
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as handle:
+                baseline = json.load(handle)
+            self.stdout.write(f'\nChanges vs {options["baseline"]}:')
+            for name, metric, before, after, change in compare(results, baseline):
+                if abs(change) < options['threshold']:
+                    continue
+                style = self.style.ERROR if change > 0 else self.style.SUCCESS
+                self.stdout.write(style(f'  {name:<22} {metric:<13} {before:>9.2f} -> {after:>9.2f} ({change:+.0%})'))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
@@ -0,0 +1,49 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from marketplace.autocomplete import autocomplete_index
+from marketplace.benchmark import Sampler, percentile, replay
+
+AUTOCOMPLETE_MIX = [{'endpoint': 'search_ajax', 'path': '/search-ajax/', 'params': {'q': '{prefix}'}}]
+
+
+class Command(BaseCommand):
+    help = 'Time the autocomplete index build, direct lookups and warm /search-ajax/ requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=5000, help='Direct index lookups (default: 5000)')
+        parser.add_argument('--requests', type=int, default=500, help='Measured HTTP requests (default: 500)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        begin = time.perf_counter()
+        autocomplete_index.rebuild()
+        build = time.perf_counter() - begin
+        self.stdout.write(
+            f'Index build: {build * 1000:.1f} ms for {len(autocomplete_index._items)} items, '
+            f'{len(autocomplete_index._terms)} terms'
+        )
+
+        sampler = Sampler(random.Random(options['seed']))
+        prefixes = [sampler['prefix'] for _ in range(options['lookups'])]
+        timings = []
+        for prefix in prefixes:
+            begin = time.perf_counter()
+            autocomplete_index.suggest(prefix)
+            timings.append(time.perf_counter() - begin)
+        self.stdout.write(
+            f'Direct lookups: p50 {percentile(timings, 0.5) * 1e6:.1f} us, '
+            f'p95 {percentile(timings, 0.95) * 1e6:.1f} us, p99 {percentile(timings, 0.99) * 1e6:.1f} us'
+        )
+
+        results = replay(AUTOCOMPLETE_MIX, options['requests'], seed=options['seed'], warmup=50)
+        row = results['endpoints']['search_ajax']
+        self.stdout.write(
+            f'/search-ajax/: p50 {row["p50_ms"]:.2f} ms, p95 {row["p95_ms"]:.2f} ms, '
+            f'{row["mean_queries"]:.2f} queries per request (max {row["max_queries"]})'
+        )
+        style = self.style.SUCCESS if row['max_queries'] == 0 else self.style.WARNING
+        self.stdout.write(style('Warm requests did not touch the database.' if row['max_queries'] == 0
+                                else 'Warm requests still issued queries.'))
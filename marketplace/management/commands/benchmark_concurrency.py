@@ -0,0 +1,107 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from marketplace.benchmark import DEFAULT_MIX, concurrent_replay, load_mix
+from marketplace.sqlite import current_pragmas
+
+HANDLERS = ['wsgi', 'asgi']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput and latency of the WSGI and ASGI paths with many requests in flight, '
+        'optionally while writer threads keep committing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--handler', choices=HANDLERS + ['both'], default='both')
+        parser.add_argument(
+            '--concurrency', default='1,8,32',
+            help='Comma-separated numbers of requests in flight (default: 1,8,32)',
+        )
+        parser.add_argument('--requests', type=int, default=300, help='Measured requests per level (default: 300)')
+        parser.add_argument(
+            '--writers', default='0',
+            help='Comma-separated numbers of concurrent writer threads to run each level with (default: 0)',
+        )
+        parser.add_argument(
+            '--write-interval', type=float, default=0.0, metavar='MS',
+            help='Pause between each writer\'s transactions (default: 0, back to back)',
+        )
+        parser.add_argument('--mix', help='JSONL file of request templates (default: built-in mix, GETs only)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+            writer_levels = [int(level) for level in options['writers'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency and --writers take comma-separated numbers.')
+
+        if options['handler'] == 'both':
+            # Each handler runs in its own process so it gets its own URLconf
+            # (async views for ASGI, sync views for WSGI), as in deployment
+            results = []
+            for handler in HANDLERS:
+                results += self.run_in_subprocess(handler, options)
+        else:
+            mix = load_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+            results = [
+                concurrent_replay(
+                    mix, options['requests'], level, seed=options['seed'], handler=options['handler'],
+                    writers=writers, write_interval=options['write_interval'] / 1000,
+                )
+                for writers in writer_levels
+                for level in levels
+            ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        if connection.vendor == 'sqlite':
+            pragmas = current_pragmas()
+            self.stdout.write(
+                f'SQLite journal_mode={pragmas["journal_mode"]}, synchronous={pragmas["synchronous"]}'
+            )
+        self.stdout.write(
+            f'{"handler":<8} {"in flight":>9} {"writers":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+            f'{"req/s":>8} {"writes/s":>9} {"w err":>6}  statuses'
+        )
+        for row in results:
+            self.stdout.write(
+                f'{row["handler"]:<8} {row["concurrency"]:>9} {row["writers"]:>7} {row["p50_ms"]:>8.2f} '
+                f'{row["p95_ms"]:>8.2f} {row["p99_ms"]:>8.2f} {row["throughput_rps"]:>8.1f} '
+                f'{row["writes_per_s"]:>9.1f} {row["write_errors"]:>6}  {row["statuses"]}'
+            )
+
+    def run_in_subprocess(self, handler, options):
+        command = [
+            sys.executable, '-m', 'django', 'benchmark_concurrency', '--json',
+            '--handler', handler,
+            '--concurrency', options['concurrency'],
+            '--requests', str(options['requests']),
+            '--writers', options['writers'],
+            '--write-interval', str(options['write_interval']),
+            '--seed', str(options['seed']),
+        ]
+        if options['mix']:
+            command += ['--mix', os.path.abspath(options['mix'])]
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE,
+            MARKETPLACE_ASYNC_VIEWS='1' if handler == 'asgi' else '0',
+        )
+        completed = subprocess.run(
+            command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if completed.returncode:
+            raise CommandError(f'{handler} run failed:\n{completed.stderr}')
+        # The last line is the JSON; anything before it is app output
+        return json.loads(completed.stdout.strip().splitlines()[-1])
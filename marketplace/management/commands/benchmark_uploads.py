@@ -0,0 +1,153 @@
+import io
+import json
+import os
+import resource
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.forms import ImageField
+from django.test import RequestFactory
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings
+from PIL import Image, ImageOps
+
+from marketplace.benchmark import percentile
+from marketplace.forms import PhotoField
+from marketplace.images import RENDITION_SIZES, SAVE_OPTIONS, decode_for_renditions, output_formats, render
+
+DJANGO_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+
+def synthetic_photo(megapixels):
+    """JPEG bytes of a 4:3 photo-like image (gradients plus sensor noise)"""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    noise = Image.effect_noise((width, height), 48)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', [gradient, noise, gradient.transpose(Image.Transpose.ROTATE_180)])
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue(), (width, height)
+
+
+def in_child(func, runs):
+    """Run ``func`` ``runs`` times in a forked process.
+
+    Returns (timings in seconds, peak RSS growth in KiB, result of the last
+    run); a fresh process keeps one stage's peak from hiding another's.
+    """
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        try:
+            baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            timings = []
+            for _ in range(runs):
+                begin = time.perf_counter()
+                result = func()
+                timings.append(time.perf_counter() - begin)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            output = {'timings': timings, 'rss_kib': peak - baseline, 'result': result}
+        except Exception as exc:
+            output = {'error': repr(exc)}
+        with os.fdopen(write_end, 'w') as pipe:
+            json.dump(output, pipe)
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        output = json.load(pipe)
+    os.waitpid(pid, 0)
+    if 'error' in output:
+        raise CommandError(output['error'])
+    return output['timings'], output['rss_kib'], output['result']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare latency and peak memory of photo upload validation and rendition decoding, '
+        'Django defaults against the streaming, header-only and draft() path'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, default=12, help='Size of the test photo (default: 12)')
+        parser.add_argument('--runs', type=int, default=5, help='Measured runs per stage (default: 5)')
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork'):
+            raise CommandError('benchmark_uploads measures each stage in a forked process and needs os.fork().')
+        photo, size = synthetic_photo(options['megapixels'])
+        self.stdout.write(
+            f'Test photo: {size[0]}x{size[1]} JPEG, {len(photo) / 1024 / 1024:.1f} MiB, '
+            f'{options["runs"]} runs per stage'
+        )
+        body = encode_multipart(BOUNDARY, {'image': _named(photo, 'photo.jpg')})
+        factory = RequestFactory()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            def upload(handlers, field):
+                def run():
+                    request = factory.generic('POST', '/post/', body, content_type=MULTIPART_CONTENT)
+                    with override_settings(FILE_UPLOAD_HANDLERS=handlers, FILE_UPLOAD_TEMP_DIR=temp_dir,
+                                           UPLOAD_TEMP_DIR=temp_dir):
+                        upload = request.FILES['image']
+                        field.clean(upload)
+                        upload.close()
+                return run
+
+            def renditions(decode):
+                def run():
+                    with open(path, 'rb') as source:
+                        image = decode(source)
+                    decoded = image.size
+                    sizes = []
+                    for kind in RENDITION_SIZES:
+                        resized = render(image, kind)
+                        for image_format in output_formats():
+                            resized.save(io.BytesIO(), **SAVE_OPTIONS[image_format])
+                        sizes.append(resized.size)
+                    return {'decoded': decoded, 'sizes': sizes}
+                return run
+
+            path = os.path.join(temp_dir, 'photo.jpg')
+            with open(path, 'wb') as source:
+                source.write(photo)
+
+            stages = [
+                ('upload + ImageField', upload(DJANGO_HANDLERS, ImageField())),
+                ('upload + PhotoField', upload(['marketplace.uploads.PhotoUploadHandler', *DJANGO_HANDLERS],
+                                               PhotoField())),
+                ('renditions, full decode', renditions(full_decode)),
+                ('renditions, draft()', renditions(decode_for_renditions)),
+            ]
+            results = {}
+            self.stdout.write(f'{"stage":<26} {"p50 ms":>9} {"max ms":>9} {"peak RSS +MiB":>14}  decoded at')
+            for label, func in stages:
+                timings, rss_kib, result = in_child(func, options['runs'])
+                results[label] = result
+                decoded = 'x'.join(map(str, result['decoded'])) if result else ''
+                self.stdout.write(
+                    f'{label:<26} {percentile(timings, 0.5) * 1000:>9.1f} {max(timings) * 1000:>9.1f} '
+                    f'{rss_kib / 1024:>14.1f}  {decoded}'
+                )
+
+        if results['renditions, full decode']['sizes'] == results['renditions, draft()']['sizes']:
+            self.stdout.write(self.style.SUCCESS('Both decodes produced renditions of the same dimensions.'))
+        else:
+            self.stdout.write(self.style.WARNING('Rendition dimensions differ between the two decodes.'))
+
+
+def full_decode(source):
+    """Decode as generate_renditions() did before draft()"""
+    image = ImageOps.exif_transpose(Image.open(source))
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+def _named(data, name):
+    file = io.BytesIO(data)
+    file.name = name
+    return file
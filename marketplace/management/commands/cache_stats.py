@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.caching import cache_metrics, catalog_generation
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counts for the catalog caches'
+
+    def handle(self, *args, **options):
+        metrics = cache_metrics()
+        self.stdout.write(f'Catalog generation: {catalog_generation()}')
+        if not metrics:
+            self.stdout.write('No cache activity recorded yet.')
+            return
+        self.stdout.write(f'{"name":<28} {"hits":>10} {"misses":>10} {"hit rate":>9}')
+        for name, counts in metrics.items():
+            self.stdout.write(
+                f'{name:<28} {counts["hits"]:>10} {counts["misses"]:>10} {counts["hit_rate"]:>9.1%}'
+            )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import resolve
+
+from marketplace.diagnostics import scratch_database, seed_catalog, sample_pages, capture_page_queries
+from marketplace.profiling import query_budget
+
+
+class Command(BaseCommand):
+    help = 'Fail if any marketplace page issues more queries than its QUERY_BUDGETS entry'
+
+    def handle(self, *args, **options):
+        failures = []
+        with scratch_database():
+            items = seed_catalog()
+            client = Client()
+            for label, url in sample_pages(items[1]):
+                view_name = resolve(url.split('?')[0]).url_name
+                budget = query_budget(view_name)
+                queries = capture_page_queries(url, client)
+                status = f'{len(queries)} queries (budget {budget})'
+                if budget is not None and len(queries) > budget:
+                    failures.append((label, url, queries, budget))
+                    self.stderr.write(f'{label}: {status}')
+                elif options['verbosity'] > 1:
+                    self.stdout.write(f'{label}: {status}')
+
+        if failures:
+            for label, url, queries, budget in failures:
+                self.stderr.write(f'\n{label} ({url}) issued {len(queries)} queries, budget {budget}:')
+                for query in queries:
+                    self.stderr.write(f'    {query["sql"][:200]}')
+            raise CommandError(f'{len(failures)} pages exceed their query budget.')
+        self.stdout.write(self.style.SUCCESS('All pages are within their query budgets.'))
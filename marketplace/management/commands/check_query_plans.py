@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from marketplace.diagnostics import (
+    scratch_database, seed_catalog, sample_pages, capture_page_queries, full_scans,
+)
+
+
+class Command(BaseCommand):
+    help = 'Fail if any query issued by the marketplace pages does a full table scan'
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            if connection.vendor != 'sqlite':
+                raise CommandError('Query plan checks use EXPLAIN QUERY PLAN and need SQLite.')
+            items = seed_catalog()
+            failures = []
+            for label, url in sample_pages(items[1]):
+                for query in capture_page_queries(url):
+                    tables = full_scans(query['sql'])
+                    if tables:
+                        failures.append((label, ', '.join(tables), query['sql']))
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'checked {label}: {url}')
+
+        if failures:
+            for label, tables, sql in failures:
+                self.stderr.write(f'{label}: full scan of {tables}\n    {sql}')
+            raise CommandError(f'{len(failures)} queries fall back to a full table scan.')
+        self.stdout.write(self.style.SUCCESS('All page queries use an index.'))
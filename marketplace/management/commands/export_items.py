@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from marketplace.models import Item
+from marketplace.transfer import FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Stream listings to CSV or JSONL with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--include-sold', action='store_true', help='Also export sold items')
+
+    def handle(self, *args, **options):
+        items = Item.objects.all() if options['include_sold'] else Item.objects.filter(is_sold=False)
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        count = -1 if options['format'] == 'csv' else 0  # the CSV header is not a row
+        try:
+            for line in export_lines(items, options['format']):
+                output.write(line)
+                count += 1
+        finally:
+            if options['output']:
+                output.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f'Exported {count} items to {options["output"]}.'))
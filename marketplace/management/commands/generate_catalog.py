@@ -0,0 +1,102 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from marketplace.caching import bump_catalog_generation
+from marketplace.dimensions import assign_keys, recount
+from marketplace.listings import refresh as refresh_listings
+from marketplace.models import Item
+from marketplace.signals import batched_item_changes
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+DEPARTMENTS = ['MATH', 'CS', 'PHYS', 'CHEM', 'BIO', 'ECON', 'HIST', 'ENG', 'PSYC', 'STAT', 'ACCT', 'MKTG']
+TITLE_WORDS = [
+    'Calculus', 'Linear', 'Algebra', 'Introduction', 'Principles', 'Organic', 'Chemistry', 'Physics',
+    'Microeconomics', 'Macroeconomics', 'Statistics', 'Data', 'Structures', 'Algorithms', 'Biology',
+    'Cell', 'Molecular', 'World', 'History', 'Modern', 'Psychology', 'Cognitive', 'Financial',
+    'Accounting', 'Marketing', 'Discrete', 'Mathematics', 'Programming', 'Systems', 'Theory',
+]
+AUTHORS = [
+    'James Stewart', 'Thomas Cormen', 'David Lay', 'Paul Tipler', 'Gregory Mankiw', 'John McMurry',
+    'Neil Campbell', 'Kenneth Rosen', 'Sheldon Ross', 'Philip Kotler', 'Jerry Weygandt', 'David Myers',
+]
+CONDITIONS = [choice for choice, _ in Item.CONDITIONS]
+
+
+def zipf_weights(count, exponent=1.1):
+    """Weights for a Zipf-like popularity skew over ``count`` ranks"""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    help = 'Insert a synthetic catalog of items with skewed course and seller popularity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('size', help='Number of items, or one of: ' + ', '.join(SIZES))
+        parser.add_argument('--courses', type=int, default=400, help='Distinct course codes (default: 400)')
+        parser.add_argument('--sold-ratio', type=float, default=0.2, help='Fraction of items marked sold')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help='Delete all existing items first')
+
+    def handle(self, *args, **options):
+        size = options['size'].lower()
+        try:
+            total = SIZES[size] if size in SIZES else int(size)
+        except ValueError:
+            raise CommandError(f'Invalid size "{options["size"]}".')
+
+        rng = random.Random(options['seed'])
+        courses = [f'{rng.choice(DEPARTMENTS)} {rng.randint(100, 499)}' for _ in range(options['courses'])]
+        course_weights = zipf_weights(len(courses))
+        sellers = [f'Student {n}' for n in range(max(total // 8, 1))]
+        seller_weights = zipf_weights(len(sellers), exponent=0.9)
+        now = timezone.now()
+
+        if options['clear']:
+            with transaction.atomic(), batched_item_changes():
+                deleted, _ = Item.objects.all().delete()
+            self.stdout.write(f'Deleted {deleted} existing rows.')
+
+        created = 0
+        while created < total:
+            count = min(options['batch_size'], total - created)
+            batch_courses = rng.choices(courses, course_weights, k=count)
+            batch_sellers = rng.choices(sellers, seller_weights, k=count)
+            items = []
+            for course, seller in zip(batch_courses, batch_sellers):
+                title = ' '.join(rng.sample(TITLE_WORDS, rng.randint(2, 4)))
+                items.append(Item(
+                    item_name=title,
+                    description=f'{title} for {course}. ' + rng.choice([
+                        'Lightly used, a few highlights.', 'Like new, no markings.',
+                        'Some notes in the margins.', 'Cover worn but pages intact.',
+                    ]),
+                    price=Decimal(rng.randint(300, 15000)) / 100,
+                    seller_name=seller,
+                    contact_info=f'{seller.lower().replace(" ", ".")}@university.edu',
+                    item_type='book' if rng.random() < 0.7 else 'notes',
+                    author=rng.choice(AUTHORS) if rng.random() < 0.8 else None,
+                    course=course if rng.random() < 0.95 else None,
+                    condition=rng.choice(CONDITIONS),
+                    date_posted=now - timedelta(minutes=rng.randint(0, 60 * 24 * 730)),
+                    is_sold=rng.random() < options['sold_ratio'],
+                    view_count=int(rng.paretovariate(1.2)) - 1,
+                ))
+            with transaction.atomic():
+                assign_keys(items)
+                Item.objects.bulk_create(items)
+                refresh_listings([item.pk for item in items])
+            created += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{created}/{total}')
+
+        recount()
+        bump_catalog_generation()
+        self.stdout.write(self.style.SUCCESS(f'Created {created} items.'))
+        self.stdout.write('Run "python manage.py rebuild_recommendations" to rank similar items for them.')
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from marketplace.transfer import FORMATS, guess_format, import_items, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import listings from a CSV or JSONL file, validated like the post form'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSONL file')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; insert nothing')
+        parser.add_argument(
+            '--no-recommendations', action='store_true',
+            help='Do not queue ranking of similar items (run rebuild_recommendations afterwards)',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['path'])
+
+        def progress(result):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{result.created} imported, {result.failed} rejected')
+
+        try:
+            handle = open(options['path'], encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(f'Cannot read "{options["path"]}": {exc}')
+        with handle:
+            # Photo and recommendation tasks are left pending for run_tasks
+            # rather than competing with the import for the database
+            result = import_items(
+                read_rows(handle, file_format),
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                start_tasks=False,
+                refresh_recommendations=not options['no_recommendations'],
+                progress=progress,
+            )
+
+        for line, message in result.errors:
+            self.stderr.write(f'Line {line}: {message}')
+        if result.failed > len(result.errors):
+            self.stderr.write(f'... and {result.failed - len(result.errors)} more rejected rows.')
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {result.created} items; {result.failed} rows rejected.'))
+        if not options['dry_run'] and result.created:
+            self.stdout.write('Run "python manage.py run_tasks --once" to render photos and rank similar items.')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.caching import bump_catalog_generation
+from marketplace.listings import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recreate the ItemListing projection rows from the Item table'
+
+    def handle(self, *args, **options):
+        total = rebuild()
+        bump_catalog_generation()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} listing rows.'))
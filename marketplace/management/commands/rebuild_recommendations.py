@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.recommendations import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed similar-items lists for every unsold item'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{done}/{total}')
+
+        total = rebuild_all(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt recommendations for {total} items.'))
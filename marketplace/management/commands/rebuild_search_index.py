@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from marketplace.search import has_search_index, ensure_search_triggers, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the Item table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not has_search_index(using):
+            raise CommandError('No search index on this database. Run "python manage.py migrate" first.')
+        if not ensure_search_triggers(using):
+            rebuild_search_index(using)
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.trending import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trending scores of items and courses from the hourly view buckets'
+
+    def handle(self, *args, **options):
+        total = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt trending scores for {total} items.'))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from marketplace.tasks import purge_finished, requeue_stalled, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (photo renditions, recommendations) as a worker process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no tasks are due instead of polling')
+        parser.add_argument('--name', action='append', dest='names', help='Only run tasks with this name (repeatable)')
+        parser.add_argument('--limit', type=int, help='With --once, run at most this many tasks')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls (default: 1)')
+        parser.add_argument(
+            '--requeue-after', type=int, default=30, metavar='MINUTES',
+            help='Requeue tasks stuck in "running" for longer than this (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stalled(options['requeue_after'])
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stalled tasks.')
+        if options['once']:
+            ran = run_pending(names=options['names'], limit=options['limit'])
+            purge_finished()
+            self.stdout.write(self.style.SUCCESS(f'Ran {ran} tasks.'))
+            return
+
+        self.stdout.write('Waiting for tasks (Ctrl+C to stop)...')
+        try:
+            while True:
+                close_old_connections()
+                ran = run_pending(names=options['names'])
+                if ran:
+                    purge_finished()
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'Ran {ran} tasks.')
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
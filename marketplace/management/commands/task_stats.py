@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.tasks import queue_stats
+
+
+def seconds(value):
+    return '-' if value is None else f'{value:.2f}'
+
+
+class Command(BaseCommand):
+    help = 'Show background task queue depth and recent wait/run times'
+
+    def handle(self, *args, **options):
+        stats = queue_stats()
+        if not stats:
+            self.stdout.write('The task queue is empty.')
+            return
+        self.stdout.write(
+            f'{"task":<18} {"pending":>8} {"running":>8} {"done":>8} {"failed":>8} {"oldest s":>9} '
+            f'{"wait p50":>9} {"wait p95":>9} {"run p50":>9} {"run p95":>9}'
+        )
+        for name, row in sorted(stats.items()):
+            self.stdout.write(
+                f'{name:<18} {row["pending"]:>8} {row["running"]:>8} {row["done"]:>8} {row["failed"]:>8} '
+                f'{seconds(row["oldest_pending"]):>9} {seconds(row["wait_p50"]):>9} {seconds(row["wait_p95"]):>9} '
+                f'{seconds(row["run_p50"]):>9} {seconds(row["run_p95"]):>9}'
+            )
@@ -0,0 +1,102 @@
+"""Serving uploaded photos and their renditions.
+
+Files under MEDIA_ROOT are sent with an ETag and Last-Modified taken from
+the file's size and mtime, and cached for MEDIA_MAX_AGE seconds. Uploads
+get unique names and renditions change name with their source photo, so a
+URL's content rarely changes and long caching is safe. Single byte ranges
+(``Range: bytes=...``) are answered with 206 Partial Content, so
+interrupted downloads of large photos can resume.
+
+For high traffic, let the web server or a CDN serve MEDIA_ROOT and set
+SERVE_MEDIA = False.
+"""
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single-range header, None to send the
+    whole file, or False if the range cannot be satisfied"""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        # Malformed or multiple ranges: send the whole file instead
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT with validators, long caching and byte ranges"""
+    try:
+        full_path = Path(safe_join(settings.MEDIA_ROOT, posixpath.normpath(path).lstrip('/')))
+    except SuspiciousFileOperation:
+        raise Http404('File not found.')
+    if not full_path.is_file():
+        raise Http404('File not found.')
+
+    stat = full_path.stat()
+    size, mtime = stat.st_size, int(stat.st_mtime)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{size:x}')
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path.name)
+        content_type = content_type or 'application/octet-stream'
+
+        byte_range = None
+        if request.headers.get('Range') and request.method == 'GET':
+            # If-Range: only honour the range when the client's copy is current
+            if_range = request.headers.get('If-Range')
+            if not if_range or if_range == etag or parse_http_date_safe(if_range) == mtime:
+                byte_range = parse_range(request.headers['Range'], size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(full_path.open('rb'), start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(full_path.open('rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS marketplace_item_fts USING fts5(
+        item_name, author, course, description, seller_name,
+        content='marketplace_item', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS marketplace_item_fts_ai AFTER INSERT ON marketplace_item BEGIN
+        INSERT INTO marketplace_item_fts(rowid, item_name, author, course, description, seller_name)
+        VALUES (new.id, new.item_name, new.author, new.course, new.description, new.seller_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS marketplace_item_fts_ad AFTER DELETE ON marketplace_item BEGIN
+        INSERT INTO marketplace_item_fts(marketplace_item_fts, rowid, item_name, author, course, description, seller_name)
+        VALUES ('delete', old.id, old.item_name, old.author, old.course, old.description, old.seller_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS marketplace_item_fts_au
+    AFTER UPDATE OF item_name, author, course, description, seller_name ON marketplace_item BEGIN
+        INSERT INTO marketplace_item_fts(marketplace_item_fts, rowid, item_name, author, course, description, seller_name)
+        VALUES ('delete', old.id, old.item_name, old.author, old.course, old.description, old.seller_name);
+        INSERT INTO marketplace_item_fts(rowid, item_name, author, course, description, seller_name)
+        VALUES (new.id, new.item_name, new.author, new.course, new.description, new.seller_name);
+    END
+    """,
+    "INSERT INTO marketplace_item_fts(marketplace_item_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS marketplace_item_fts_ai",
+    "DROP TRIGGER IF EXISTS marketplace_item_fts_ad",
+    "DROP TRIGGER IF EXISTS marketplace_item_fts_au",
+    "DROP TABLE IF EXISTS marketplace_item_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in FTS_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("marketplace", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0004_item_renditions_imagejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_sold', False)), fields=['author'], name='item_active_author_idx'),
+        ),
+        migrations.AddField(
+            model_name='relateditem',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='marketplace.item'),
+        ),
+        migrations.AddField(
+            model_name='relateditem',
+            name='related',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='marketplace.item'),
+        ),
+        migrations.AddIndex(
+            model_name='relateditem',
+            index=models.Index(fields=['item', '-score'], name='relateditem_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='relateditem',
+            constraint=models.UniqueConstraint(fields=('item', 'related'), name='unique_related_item'),
+        ),
+    ]
@@ -0,0 +1,138 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:09
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def course_key(code):
+    return re.sub(r'[^a-z0-9]', '', (code or '').lower()) or None
+
+
+def seller_key(name):
+    return ' '.join((name or '').lower().split()) or None
+
+
+def batches(Item):
+    """(pk, course, seller_name, is_sold) of every item in pk order, BATCH_SIZE
+    at a time, without holding a cursor open across the updates"""
+    last = 0
+    while True:
+        batch = list(
+            Item.objects.filter(pk__gt=last).order_by('pk')
+            .values_list('pk', 'course', 'seller_name', 'is_sold')[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        yield batch
+        last = batch[-1][0]
+
+
+def populate_dimensions(apps, schema_editor):
+    Item = apps.get_model('marketplace', 'Item')
+    Course = apps.get_model('marketplace', 'Course')
+    Seller = apps.get_model('marketplace', 'Seller')
+
+    # Keys computed in Python, one pass to create the rows (the display form
+    # is the first spelling entered) and one to point the items at them
+    courses, sellers = {}, {}
+    for batch in batches(Item):
+        for pk, course, seller_name, is_sold in batch:
+            for rows, Dimension, raw, normalize, display_field in (
+                (courses, Course, course, course_key, 'code'),
+                (sellers, Seller, seller_name, seller_key, 'name'),
+            ):
+                key = normalize(raw)
+                if not key:
+                    continue
+                if key not in rows:
+                    rows[key] = Dimension(key=key, **{display_field: ' '.join(raw.split())})
+                rows[key].active_count += not is_sold
+    Course.objects.bulk_create(courses.values(), batch_size=500)
+    Seller.objects.bulk_create(sellers.values(), batch_size=500)
+
+    # A plain UPDATE per pk: bulk_update() builds a CASE over the whole batch
+    # and spends far longer compiling it than the database spends running it
+    quote = schema_editor.quote_name
+    sql = 'UPDATE {} SET {} = %s, {} = %s WHERE {} = %s'.format(
+        quote(Item._meta.db_table), quote('course_key'), quote('seller_key'), quote(Item._meta.pk.column),
+    )
+    with schema_editor.connection.cursor() as cursor:
+        for batch in batches(Item):
+            cursor.executemany(sql, [
+                (course_key(course), seller_key(seller_name), pk) for pk, course, seller_name, is_sold in batch
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0005_related_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Course',
+            fields=[
+                ('key', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('code', models.CharField(help_text='Display form, as first entered', max_length=50)),
+                ('active_count', models.PositiveIntegerField(default=0, help_text='Unsold items for this course')),
+            ],
+            options={
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Seller',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('name', models.CharField(help_text='Display form, as first entered', max_length=100)),
+                ('active_count', models.PositiveIntegerField(default=0, help_text='Unsold items from this seller')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_course_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_seller_idx',
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='course_key',
+            field=models.ForeignKey(blank=True, db_column='course_key', editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='items', to='marketplace.course'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='seller_key',
+            field=models.ForeignKey(blank=True, db_column='seller_key', editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='items', to='marketplace.seller'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_sold', False)), fields=['course_key', '-date_posted'], name='item_active_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_sold', False)), fields=['seller_key', '-date_posted'], name='item_active_seller_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seller',
+            index=models.Index(condition=models.Q(('active_count__gt', 0)), fields=['active_count'], name='seller_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-active_count'], name='course_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('active_count__gt', 0)), fields=['code'], name='course_active_code_idx'),
+        ),
+        migrations.RunPython(populate_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# Also in marketplace/search.py, for rebuild_search_index()
+VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce({row}.item_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({row}.author, '') || ' ' || coalesce({row}.course, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}.description, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce({row}.seller_name, '')), 'D')
+"""
+
+PG_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE marketplace_item ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION marketplace_item_search_vector() RETURNS trigger AS $$
+    BEGIN
+        new.search_vector := %s;
+        RETURN new;
+    END
+    $$ LANGUAGE plpgsql
+    """ % VECTOR_SQL.format(row='new'),
+    """
+    CREATE TRIGGER marketplace_item_search_vector_tr
+    BEFORE INSERT OR UPDATE OF item_name, author, course, description, seller_name ON marketplace_item
+    FOR EACH ROW EXECUTE FUNCTION marketplace_item_search_vector()
+    """,
+    "UPDATE marketplace_item SET search_vector = %s" % VECTOR_SQL.format(row='marketplace_item'),
+    "CREATE INDEX marketplace_item_search_idx ON marketplace_item USING GIN (search_vector)",
+    # Title substring searches (related items)
+    "CREATE INDEX marketplace_item_name_trgm_idx ON marketplace_item USING GIN (item_name gin_trgm_ops) WHERE NOT is_sold",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS marketplace_item_name_trgm_idx",
+    "DROP INDEX IF EXISTS marketplace_item_search_idx",
+    "DROP TRIGGER IF EXISTS marketplace_item_search_vector_tr ON marketplace_item",
+    "DROP FUNCTION IF EXISTS marketplace_item_search_vector()",
+    "ALTER TABLE marketplace_item DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for statement in PG_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("marketplace", "0007_item_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
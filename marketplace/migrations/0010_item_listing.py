@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0009_item_facet_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemListing',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='marketplace.item')),
+                ('item_name', models.CharField(max_length=200)),
+                ('author', models.CharField(blank=True, max_length=100, null=True)),
+                ('course', models.CharField(blank=True, max_length=50, null=True)),
+                ('course_key', models.CharField(blank=True, max_length=50, null=True)),
+                ('item_type', models.CharField(choices=[('book', 'Textbook'), ('notes', 'Study Notes')], max_length=10)),
+                ('condition', models.CharField(choices=[('excellent', 'Excellent - Like New'), ('good', 'Good - Minor Wear'), ('fair', 'Fair - Some Wear'), ('poor', 'Poor - Heavy Wear')], max_length=20)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date_posted', models.DateTimeField()),
+                ('view_count', models.PositiveIntegerField(default=0)),
+                ('summary', models.TextField(help_text='First words of the description')),
+                ('url', models.CharField(help_text='Detail page URL', max_length=200)),
+                ('picture', models.JSONField(blank=True, help_text='Card <picture> sources, or null without a photo', null=True)),
+            ],
+            options={
+                'ordering': ['-date_posted'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_facet_idx',
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['-date_posted', '-item'], name='listing_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['price', 'item'], name='listing_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['item_name', 'item'], name='listing_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['-view_count', '-item'], name='listing_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['item_type', '-date_posted'], name='listing_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['condition', '-date_posted'], name='listing_cond_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['course_key', '-date_posted'], name='listing_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['item_type', 'condition', 'course_key', 'price'], name='listing_facet_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:34
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def carry_over_image_jobs(apps, schema_editor):
+    """Queue rendition tasks for image jobs that never finished"""
+    ImageJob = apps.get_model('marketplace', 'ImageJob')
+    Task = apps.get_model('marketplace', 'Task')
+
+    item_ids = ImageJob.objects.filter(status__in=['pending', 'running']).values_list('item_id', flat=True).distinct()
+    Task.objects.bulk_create(
+        [Task(name='renditions', key=f'item:{pk}', payload={'item': pk}) for pk in item_ids], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0010_item_listing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('key', models.CharField(blank=True, help_text='Only one pending task per name and key', max_length=200)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('worker', models.CharField(blank=True, help_text='Claim token of the batch running it', max_length=32)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.RunPython(carry_over_image_jobs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='ImageJob',
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'name', 'run_after'], name='task_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'finished_at'], name='task_finished_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['worker'], name='task_worker_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending'), models.Q(('key', ''), _negated=True)), fields=('name', 'key'), name='unique_pending_task_key'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:54
+
+from django.db import migrations, models
+import django.utils.timezone
+import marketplace.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0012_item_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('item_name', models.CharField(max_length=200, verbose_name='Item Name')),
+                ('description', models.TextField(verbose_name='Description')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Price ($)')),
+                ('seller_name', models.CharField(max_length=100, verbose_name='Seller')),
+                ('contact_info', models.CharField(max_length=200, verbose_name='Contact Info')),
+                ('image', models.FileField(blank=True, null=True, storage=marketplace.models.archive_storage, upload_to='item_images/', verbose_name='Photo of Item')),
+                ('item_type', models.CharField(choices=[('book', 'Textbook'), ('notes', 'Study Notes')], max_length=10, verbose_name='Type')),
+                ('author', models.CharField(blank=True, max_length=100, null=True, verbose_name='Author/Creator')),
+                ('course', models.CharField(blank=True, max_length=50, null=True, verbose_name='Course Code')),
+                ('condition', models.CharField(choices=[('excellent', 'Excellent - Like New'), ('good', 'Good - Minor Wear'), ('fair', 'Fair - Some Wear'), ('poor', 'Poor - Heavy Wear')], max_length=20, verbose_name='Condition')),
+                ('date_posted', models.DateTimeField(verbose_name='Date Posted')),
+                ('is_sold', models.BooleanField(verbose_name='Sold')),
+                ('view_count', models.PositiveIntegerField(verbose_name='Views')),
+                ('updated_at', models.DateTimeField(verbose_name='Last Updated')),
+                ('course_key', models.CharField(blank=True, max_length=50, null=True)),
+                ('seller_key', models.CharField(blank=True, max_length=100, null=True)),
+                ('reason', models.CharField(choices=[('sold', 'Sold'), ('stale', 'Expired')], max_length=10)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Archived')),
+            ],
+            options={
+                'verbose_name': 'Archived item',
+                'verbose_name_plural': 'Archived items',
+                'ordering': ['-archived_at'],
+                'indexes': [models.Index(fields=['-archived_at'], name='archived_item_date_idx')],
+            },
+        ),
+    ]
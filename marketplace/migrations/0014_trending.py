@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0013_archived_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='trending_score',
+            field=models.FloatField(default=0, help_text='log2 of the time-decayed views of its items'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Trending Score'),
+        ),
+        migrations.AddField(
+            model_name='itemlisting',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('active_count__gt', 0)), fields=['-trending_score'], name='course_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemlisting',
+            index=models.Index(fields=['-trending_score', '-item'], name='listing_trending_idx'),
+        ),
+        migrations.AddField(
+            model_name='viewbucket',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='marketplace.item'),
+        ),
+        migrations.AddIndex(
+            model_name='viewbucket',
+            index=models.Index(fields=['hour'], name='viewbucket_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='viewbucket',
+            constraint=models.UniqueConstraint(fields=('item', 'hour'), name='unique_view_bucket'),
+        ),
+    ]
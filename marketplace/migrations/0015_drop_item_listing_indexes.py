@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:22
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0014_trending'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_views_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_active_cond_idx',
+        ),
+    ]
@@ -1,8 +1,7 @@
+from django.core.files.storage import storages
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
-from PIL import Image
-import os
 
 class Item(models.Model):
     ITEM_TYPES = [
@@ -33,10 +32,30 @@ class Item(models.Model):
     date_posted = models.DateTimeField(default=timezone.now, verbose_name="Date Posted")
     is_sold = models.BooleanField(default=False, verbose_name="Sold")
     view_count = models.PositiveIntegerField(default=0, verbose_name="Views")
+    # log2 of the time-decayed view count (see trending.py)
+    trending_score = models.FloatField(default=0, editable=False, verbose_name="Trending Score")
+    # Changes with every edit of the listing itself, not with its view count
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Last Updated")
+    
+    # Normalized course and seller (see dimensions.py), set on save
+    course_key = models.ForeignKey('Course', on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='items', db_column='course_key')
+    seller_key = models.ForeignKey('Seller', on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='items', db_column='seller_key')
     class Meta:
         ordering = ['-date_posted']
         verbose_name = "Item"
         verbose_name_plural = "Items"
+        # Queries on Item only ever want unsold items, so the indexes are
+        # partial on is_sold=False and stay small as sold rows pile up. The
+        # listing sorts and filters are indexed on ItemListing instead.
+        indexes = [
+            models.Index(fields=['-date_posted'], condition=models.Q(is_sold=False), name='item_active_date_idx'),
+            models.Index(fields=['item_type', '-date_posted'], condition=models.Q(is_sold=False), name='item_active_type_idx'),
+            models.Index(fields=['course_key', '-date_posted'], condition=models.Q(is_sold=False), name='item_active_course_idx'),
+            models.Index(fields=['seller_key', '-date_posted'], condition=models.Q(is_sold=False), name='item_active_seller_idx'),
+            models.Index(fields=['author'], condition=models.Q(is_sold=False), name='item_active_author_idx'),
+            # The admin item list shows sold items too
+            models.Index(fields=['-date_posted'], name='item_date_idx'),
+        ]
     
     def __str__(self):
         return self.item_name
@@ -44,29 +63,319 @@ class Item(models.Model):
     def get_absolute_url(self):
         return reverse('item_detail', kwargs={'pk': self.pk})
     
+    # Fields whose changes post_save handlers react to (see changed_fields)
+    TRACKED_FIELDS = ['item_name', 'author', 'course', 'item_type', 'is_sold']
+    # Only written by the view counter's flush (see counters.py)
+    COUNTER_FIELDS = ['view_count', 'trending_score']
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        image = instance.__dict__.get('image')
+        instance._saved_image_name = getattr(image, 'name', image)
+        instance._saved_state = {
+            name: instance.__dict__[name] for name in cls.TRACKED_FIELDS if name in instance.__dict__
+        }
+        instance._saved_keys = (
+            instance.__dict__.get('course_key_id'),
+            instance.__dict__.get('seller_key_id'),
+            instance.__dict__.get('is_sold'),
+        )
+        return instance
+    
+    def changed_fields(self):
+        """Tracked fields that differ from the values last loaded or saved"""
+        saved = getattr(self, '_saved_state', {})
+        return {
+            name for name in self.TRACKED_FIELDS
+            if name in self.__dict__ and saved.get(name) != self.__dict__[name]
+        }
+    
     def save(self, *args, **kwargs):
+        from .dimensions import assign_keys, course_key, seller_key
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'course', 'seller_name'} & set(update_fields):
+            keys = (course_key(self.course), seller_key(self.seller_name))
+            if keys != (self.course_key_id, self.seller_key_id):
+                assign_keys([self])
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'course_key', 'seller_key'}
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # Writing back the loaded counters would undo the flushes since
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
+        
         super().save(*args, **kwargs)
+        self._saved_state = {
+            name: self.__dict__[name] for name in self.TRACKED_FIELDS if name in self.__dict__
+        }
+        self._saved_keys = (self.course_key_id, self.seller_key_id, self.is_sold)
         
-        # Optimize uploaded images
-        if self.image:
-            img_path = self.image.path
-            if os.path.exists(img_path):
-                img = Image.open(img_path)
-                # Convert to RGB if necessary
-                if img.mode in ("RGBA", "P"):
-                    img = img.convert("RGB")
-                # Resize if too large
-                if img.height > 800 or img.width > 800:
-                    img.thumbnail((800, 800), Image.Resampling.LANCZOS)
-                    img.save(img_path, optimize=True, quality=85)
-    
-    def increment_views(self):
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+        # Renditions of a new or replaced photo are generated off-request
+        if update_fields is None or 'image' in update_fields:
+            image_name = self.image.name or None
+            if image_name and image_name != getattr(self, '_saved_image_name', None):
+                from .images import enqueue_image_job
+                enqueue_image_job(self)
+            self._saved_image_name = image_name
+    
+    def rendition(self, kind, image_format='jpeg'):
+        """Processed copy of the photo, or None while it is still pending"""
+        for rendition in self.renditions.all():
+            if rendition.kind == kind and rendition.image_format == image_format:
+                return rendition
+        return None
+    
+    def increment_views(self, defer=False):
+        """Count a view; the write is batched by the shared view counter"""
+        from .counters import view_counter
+        view_counter.increment(self.pk, defer=defer)
+    
+    @property
+    def current_view_count(self):
+        """Saved views plus those waiting for the next flush, for display"""
+        from .counters import view_counter
+        return self.view_count + view_counter.pending(self.pk)
     
     def get_contact_type(self):
         """Determine if contact is email or phone"""
         if '@' in self.contact_info:
             return 'email'
         else:
-            return 'phone'
\ No newline at end of file
+            return 'phone'
+
+class ItemListing(models.Model):
+    """Card-sized copy of an unsold Item for listing pages (see listings.py)"""
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, primary_key=True, related_name='listing')
+    item_name = models.CharField(max_length=200)
+    author = models.CharField(max_length=100, blank=True, null=True)
+    course = models.CharField(max_length=50, blank=True, null=True)
+    course_key = models.CharField(max_length=50, blank=True, null=True)
+    item_type = models.CharField(max_length=10, choices=Item.ITEM_TYPES)
+    condition = models.CharField(max_length=20, choices=Item.CONDITIONS)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    date_posted = models.DateTimeField()
+    view_count = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0)
+    
+    # Precomputed for the card
+    summary = models.TextField(help_text="First words of the description")
+    url = models.CharField(max_length=200, help_text="Detail page URL")
+    picture = models.JSONField(blank=True, null=True, help_text="Card <picture> sources, or null without a photo")
+    
+    class Meta:
+        ordering = ['-date_posted']
+        # Sort indexes end in the primary key to match keyset pagination
+        indexes = [
+            models.Index(fields=['-date_posted', '-item'], name='listing_date_idx'),
+            models.Index(fields=['price', 'item'], name='listing_price_idx'),
+            models.Index(fields=['item_name', 'item'], name='listing_name_idx'),
+            models.Index(fields=['-view_count', '-item'], name='listing_views_idx'),
+            models.Index(fields=['-trending_score', '-item'], name='listing_trending_idx'),
+            models.Index(fields=['item_type', '-date_posted'], name='listing_type_idx'),
+            models.Index(fields=['condition', '-date_posted'], name='listing_cond_idx'),
+            models.Index(fields=['course_key', '-date_posted'], name='listing_course_idx'),
+            # Covers the facet counts' GROUP BY (see facets.py)
+            models.Index(fields=['item_type', 'condition', 'course_key', 'price'], name='listing_facet_idx'),
+        ]
+    
+    def __str__(self):
+        return self.item_name
+
+
+class ItemRendition(models.Model):
+    """A resized, re-encoded copy of an item photo"""
+    KINDS = [
+        ('card', 'Card thumbnail'),
+        ('detail', 'Detail page'),
+    ]
+    
+    FORMATS = [
+        ('jpeg', 'JPEG'),
+        ('webp', 'WebP'),
+        ('avif', 'AVIF'),
+    ]
+    
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='renditions')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    image_format = models.CharField(max_length=10, choices=FORMATS)
+    file = models.CharField(max_length=255, help_text="Path relative to MEDIA_ROOT")
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'kind', 'image_format'], name='unique_item_rendition'),
+        ]
+    
+    def __str__(self):
+        return f'{self.item_id} {self.kind} {self.image_format} ({self.width}x{self.height})'
+    
+    @property
+    def url(self):
+        from django.core.files.storage import default_storage
+        return default_storage.url(self.file)
+
+
+class Task(models.Model):
+    """Queued background work (see tasks.py)"""
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=50)
+    key = models.CharField(max_length=200, blank=True, help_text="Only one pending task per name and key")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=32, blank=True, help_text="Claim token of the batch running it")
+    created_at = models.DateTimeField(default=timezone.now)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'name', 'run_after'], name='task_queue_idx'),
+            models.Index(fields=['status', 'finished_at'], name='task_finished_idx'),
+            models.Index(fields=['worker'], name='task_worker_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'key'], condition=models.Q(status='pending') & ~models.Q(key=''),
+                name='unique_pending_task_key',
+            ),
+        ]
+    
+    def __str__(self):
+        return f'{self.name} task {self.pk} ({self.status})'
+
+
+
+class RelatedItem(models.Model):
+    """Precomputed "similar items" entry: ``related`` ranked for ``item``"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='recommended_for')
+    score = models.FloatField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'related'], name='unique_related_item'),
+        ]
+        indexes = [
+            models.Index(fields=['item', '-score'], name='relateditem_rank_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.item_id} -> {self.related_id} ({self.score:.2f})'
+
+
+class ViewBucket(models.Model):
+    """Views of one item in one hour, for rebuilding trending scores"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='+')
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'hour'], name='unique_view_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='viewbucket_hour_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.item_id} {self.hour:%Y-%m-%d %H}:00 ({self.views})'
+
+
+def archive_storage():
+    """Cold storage for the photos of archived items (STORAGES['archive'])"""
+    return storages['archive']
+
+
+class ArchivedItem(models.Model):
+    """A sold or long-unchanged Item moved out of the hot table (see archive.py)"""
+    REASONS = [
+        ('sold', 'Sold'),
+        ('stale', 'Expired'),
+    ]
+    
+    # The pk it had as an Item, so /item/<pk>/ still resolves
+    id = models.BigIntegerField(primary_key=True)
+    item_name = models.CharField(max_length=200, verbose_name="Item Name")
+    description = models.TextField(verbose_name="Description")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Price ($)")
+    seller_name = models.CharField(max_length=100, verbose_name="Seller")
+    contact_info = models.CharField(max_length=200, verbose_name="Contact Info")
+    image = models.FileField(upload_to='item_images/', storage=archive_storage, blank=True, null=True, verbose_name="Photo of Item")
+    item_type = models.CharField(max_length=10, choices=Item.ITEM_TYPES, verbose_name="Type")
+    author = models.CharField(max_length=100, blank=True, null=True, verbose_name="Author/Creator")
+    course = models.CharField(max_length=50, blank=True, null=True, verbose_name="Course Code")
+    condition = models.CharField(max_length=20, choices=Item.CONDITIONS, verbose_name="Condition")
+    date_posted = models.DateTimeField(verbose_name="Date Posted")
+    is_sold = models.BooleanField(verbose_name="Sold")
+    view_count = models.PositiveIntegerField(verbose_name="Views")
+    updated_at = models.DateTimeField(verbose_name="Last Updated")
+    # Normalized keys as they were, for reports; the dimension rows may be gone
+    course_key = models.CharField(max_length=50, blank=True, null=True)
+    seller_key = models.CharField(max_length=100, blank=True, null=True)
+    
+    reason = models.CharField(max_length=10, choices=REASONS)
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="Archived")
+    
+    class Meta:
+        ordering = ['-archived_at']
+        verbose_name = "Archived item"
+        verbose_name_plural = "Archived items"
+        indexes = [
+            models.Index(fields=['-archived_at'], name='archived_item_date_idx'),
+        ]
+    
+    def __str__(self):
+        return self.item_name
+
+
+
+class Course(models.Model):
+    """A course code, keyed by its normalized form (e.g. "math101")"""
+    key = models.CharField(max_length=50, primary_key=True)
+    code = models.CharField(max_length=50, help_text="Display form, as first entered")
+    active_count = models.PositiveIntegerField(default=0, help_text="Unsold items for this course")
+    trending_score = models.FloatField(default=0, help_text="log2 of the time-decayed views of its items")
+    
+    class Meta:
+        ordering = ['code']
+        indexes = [
+            models.Index(fields=['-active_count'], name='course_popular_idx'),
+            models.Index(fields=['-trending_score'], condition=models.Q(active_count__gt=0), name='course_trending_idx'),
+            models.Index(fields=['code'], condition=models.Q(active_count__gt=0), name='course_active_code_idx'),
+        ]
+    
+    def __str__(self):
+        return self.code
+
+
+class Seller(models.Model):
+    """A seller, keyed by their case- and whitespace-normalized name"""
+    key = models.CharField(max_length=100, primary_key=True)
+    name = models.CharField(max_length=100, help_text="Display form, as first entered")
+    active_count = models.PositiveIntegerField(default=0, help_text="Unsold items from this seller")
+    
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['active_count'], condition=models.Q(active_count__gt=0), name='seller_active_idx'),
+        ]
+    
+    def __str__(self):
+        return self.name
@@ -0,0 +1,165 @@
+"""Pagination helpers for item listings.
+
+Keyset (cursor) pagination seeks straight to the next page with
+``WHERE (sort_key, pk) < (last_value, last_pk)`` instead of OFFSET, so page
+500 costs the same as page 1. The cursor is an opaque token encoding the
+sort key value and pk of the last row shown; pk breaks ties between rows
+with the same sort value.
+
+Total counts are cached per filter set so a listing request pays for at
+most one COUNT, and usually none. EstimatedCountPaginator (the admin item
+list) goes further and takes the size of a large unfiltered table from the
+planner statistics instead of counting it.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .caching import cached_value
+
+# sort parameter -> (model field, descending)
+KEYSET_SORTS = {
+    '-date_posted': ('date_posted', True),
+    'price': ('price', False),
+    '-price': ('price', True),
+    'item_name': ('item_name', False),
+    '-view_count': ('view_count', True),
+    'trending': ('trending_score', True),
+}
+# Sorts that follow the buffered view counts, so move with every flush
+VIEW_ORDERED_SORTS = {'-view_count', 'trending'}
+
+COUNT_CACHE_TIMEOUT = 5 * 60
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([str(value), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field):
+    """Return (value, pk) from a cursor token, converting value via ``field``"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        return field.to_python(value), int(pk)
+    except Exception as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_page(queryset, sort, cursor=None, per_page=12):
+    """Fetch one page of ``queryset`` after ``cursor`` in ``sort`` order"""
+    field_name, descending = KEYSET_SORTS.get(sort, KEYSET_SORTS['-date_posted'])
+    field = queryset.model._meta.get_field(field_name)
+    if descending:
+        queryset = queryset.order_by(f'-{field_name}', '-pk')
+    else:
+        queryset = queryset.order_by(field_name, 'pk')
+
+    if cursor:
+        value, pk = decode_cursor(cursor, field)
+        op = 'lt' if descending else 'gt'
+        # Written as "key <= v AND (key < v OR pk < last)" so SQLite can use
+        # the sort index as a range instead of evaluating an OR per row.
+        queryset = queryset.filter(
+            Q(**{f'{field_name}__{op}e': value}),
+            Q(**{f'{field_name}__{op}': value}) | Q(**{f'pk__{op}': pk}),
+        )
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field_name), last.pk)
+    return KeysetPage(rows, next_cursor)
+
+
+def cached_count(queryset, filters):
+    """COUNT(*) of ``queryset``, cached under the normalized ``filters``"""
+    normalized = sorted((k, v) for k, v in filters.items() if v)
+    return cached_value('count', normalized, queryset.count, COUNT_CACHE_TIMEOUT)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that takes its total from cached_count()"""
+
+    def __init__(self, object_list, per_page, filters, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.filters = filters
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.filters)
+
+
+def estimated_row_count(model, using='default'):
+    """Rows in ``model``'s table according to the planner statistics, or None.
+
+    PostgreSQL keeps pg_class.reltuples current through autovacuum; SQLite
+    has sqlite_stat1 only once ANALYZE (or PRAGMA optimize) has run.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            if 'sqlite_stat1' not in connection.introspection.table_names(cursor):
+                return None
+            # One row per index, starting with its row count; partial
+            # indexes count fewer rows than the table has
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+        else:
+            return None
+        counts = [int(float(str(stat).split()[0])) for stat, in cursor.fetchall()]
+    # reltuples is -1 for a table that was never analyzed
+    estimate = max(counts, default=0)
+    return estimate if estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for very large tables.
+
+    The unfiltered total comes from estimated_row_count() once the table
+    is past ADMIN_EXACT_COUNT_LIMIT rows; other counts are exact but cached
+    per query under the catalog generation.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10_000):
+                return estimate
+        try:
+            sql = str(queryset.query)
+        except EmptyResultSet:
+            return 0
+        return cached_value('admin-count', [queryset.db, sql], queryset.count, COUNT_CACHE_TIMEOUT)
@@ -0,0 +1,174 @@
+"""Per-request SQL and template profiling.
+
+``profile_requests()`` is a context manager that counts queries, total SQL
+time, the slowest statements and template render time for everything run
+inside it. QueryProfilingMiddleware wraps each request in one, logs a JSON
+line to the ``marketplace.profiling`` logger at DEBUG (shown with
+PROFILING_LOG_REQUESTS), optionally adds a ``Server-Timing`` header and
+warns when a view exceeds its entry in settings.QUERY_BUDGETS.
+
+Template time is measured by a wrapper around Template.render that the
+middleware installs when it is enabled; without it, profiles count queries
+only.
+
+The active profile lives in a context variable and every connection carries
+a wrapper that reports to it, so queries that async views run in worker
+threads (sync_to_async copies the context) are counted too.
+"""
+import contextvars
+import heapq
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import base as template_base
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_KEPT = 3
+
+_active_profile = contextvars.ContextVar('marketplace_profile', default=None)
+_original_template_render = None
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.slowest = []  # min-heap of (duration, sql)
+        self._template_depth = 0
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        entry = (duration, sql[:300])
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def slowest_statements(self):
+        return sorted(self.slowest, reverse=True)
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+            'slowest': [
+                {'ms': round(duration * 1000, 2), 'sql': sql} for duration, sql in self.slowest_statements()
+            ],
+        }
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    profile = _active_profile.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if profile is not None:
+            profile.record_query(sql, time.perf_counter() - start)
+
+
+def install_query_timer(connection):
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def _timed_template_render(self, context):
+    profile = _active_profile.get()
+    if profile is None:
+        return _original_template_render(self, context)
+    # Includes and inclusion tags render nested Templates; only time the outermost
+    profile._template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_template_render(self, context)
+    finally:
+        profile._template_depth -= 1
+        if profile._template_depth == 0:
+            profile.template_time += time.perf_counter() - start
+
+
+def install_template_timer():
+    """Wrap Template.render once so active profiles can time rendering"""
+    global _original_template_render
+    if _original_template_render is None:
+        _original_template_render = template_base.Template.render
+        template_base.Template.render = _timed_template_render
+
+
+@contextmanager
+def profile_requests():
+    """Profile queries on every database (and rendering, once timed) in the block"""
+    for connection in connections.all():
+        install_query_timer(connection)
+    profile = RequestProfile()
+    token = _active_profile.set(profile)
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.total_time = time.perf_counter() - start
+        _active_profile.reset(token)
+
+
+def query_budget(view_name):
+    """Allowed queries for ``view_name`` (a URL name), or None if unbudgeted"""
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+class QueryProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILING', True):
+            raise MiddlewareNotUsed
+        install_template_timer()
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'PROFILING_SERVER_TIMING', settings.DEBUG)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with profile_requests() as profile:
+            response = self.get_response(request)
+        return self.report(request, response, profile)
+
+    async def __acall__(self, request):
+        with profile_requests() as profile:
+            response = await self.get_response(request)
+        return self.report(request, response, profile)
+
+    def report(self, request, response, profile):
+        match = request.resolver_match
+        view_name = match.url_name if match else None
+
+        record = {'view': view_name, 'method': request.method, 'path': request.path,
+                  'status': response.status_code, **profile.as_dict()}
+        budget = query_budget(view_name)
+        if budget is not None and profile.queries > budget:
+            record['budget'] = budget
+            logger.warning(json.dumps(record))
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps(record))
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={profile.sql_time * 1000:.2f};desc="{profile.queries} queries", '
+                f'tpl;dur={profile.template_time * 1000:.2f}, '
+                f'total;dur={profile.total_time * 1000:.2f}'
+            )
+        return response
@@ -0,0 +1,190 @@
+"""Precomputed "similar items" for the detail page.
+
+Each unsold item keeps up to MAX_RELATED RelatedItem rows ranked by a
+similarity score built from course, author, title words and type. The detail
+page reads them with one indexed join instead of OR-ing course and type
+across the whole table.
+
+Lists are maintained incrementally. Posting (or re-listing) an item scores it
+against a bounded candidate set found through indexed lookups, writes its own
+list, and offers it to each candidate's list, which is then trimmed back to
+MAX_RELATED. Selling an item removes it everywhere and refreshes the lists it
+was in. Both run as "recommendations" tasks (tasks.py), batched, after the
+save has returned. ``manage.py rebuild_recommendations`` recomputes
+everything.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .dimensions import course_key
+from .search import search_items
+from .tasks import enqueue_many, task
+
+MAX_RELATED = 6
+CANDIDATES_PER_SOURCE = 40
+REFRESH_LIMIT = 50
+
+WEIGHTS = {
+    'course': 4.0,
+    'author': 2.0,
+    'title': 3.0,
+    'type': 1.0,
+}
+
+CANDIDATE_FIELDS = ['id', 'item_name', 'author', 'course', 'item_type']
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = {'a', 'an', 'and', 'for', 'in', 'of', 'on', 'the', 'to', 'with', 'vol', 'edition', 'ed'}
+
+
+def title_tokens(title):
+    return {word for word in WORD_RE.findall((title or '').lower()) if word not in STOP_WORDS}
+
+
+def similarity(a, b):
+    """Symmetric similarity score between two items (0 means unrelated)"""
+    score = 0.0
+    if a.course and course_key(a.course) == course_key(b.course):
+        score += WEIGHTS['course']
+    if a.author and b.author and a.author.strip().lower() == b.author.strip().lower():
+        score += WEIGHTS['author']
+    tokens_a, tokens_b = title_tokens(a.item_name), title_tokens(b.item_name)
+    if tokens_a and tokens_b:
+        score += WEIGHTS['title'] * len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+    if score and a.item_type == b.item_type:
+        score += WEIGHTS['type']
+    return score
+
+
+def candidates(item):
+    """Unsold items likely to be similar, gathered through indexed lookups"""
+    from .models import Item
+
+    active = Item.objects.filter(is_sold=False).exclude(pk=item.pk).only(*CANDIDATE_FIELDS)
+    found = {}
+    sources = []
+    if course_key(item.course):
+        sources.append(active.filter(course_key=course_key(item.course)))
+    if item.author:
+        sources.append(active.filter(author=item.author))
+    words = title_tokens(item.item_name)
+    if words:
+        for word in words:
+            sources.append(search_items(active, word, fields=['item_name']))
+    for queryset in sources:
+        for candidate in queryset.order_by('-date_posted')[:CANDIDATES_PER_SOURCE]:
+            found[candidate.pk] = candidate
+    return list(found.values())
+
+
+def rank(item, pool):
+    """[(score, candidate)] best first, at most MAX_RELATED"""
+    scored = [(similarity(item, candidate), candidate) for candidate in pool]
+    scored = [pair for pair in scored if pair[0] > 0]
+    scored.sort(key=lambda pair: (-pair[0], -pair[1].pk))
+    return scored
+
+
+def trim(item_ids):
+    """Drop entries beyond MAX_RELATED from the given items' lists"""
+    from .models import RelatedItem
+
+    excess = RelatedItem.objects.filter(item_id__in=item_ids).annotate(
+        position=Window(RowNumber(), partition_by=F('item_id'), order_by=[F('score').desc(), F('pk').asc()]),
+    ).filter(position__gt=MAX_RELATED).values_list('pk', flat=True)
+    excess = list(excess)
+    if excess:
+        RelatedItem.objects.filter(pk__in=excess).delete()
+
+
+def refresh_item(item):
+    """Recompute ``item``'s own list and offer ``item`` to its neighbours' lists"""
+    from .models import RelatedItem
+
+    scored = rank(item, candidates(item))
+    with transaction.atomic():
+        RelatedItem.objects.filter(Q(item=item) | Q(related=item)).delete()
+        if item.is_sold:
+            return
+        rows = [RelatedItem(item=item, related=candidate, score=score) for score, candidate in scored[:MAX_RELATED]]
+        rows += [RelatedItem(item=candidate, related=item, score=score) for score, candidate in scored]
+        RelatedItem.objects.bulk_create(rows, ignore_conflicts=True)
+        trim([candidate.pk for _, candidate in scored])
+
+
+def recompute_list(item):
+    """Rebuild only ``item``'s own list"""
+    from .models import RelatedItem
+
+    scored = rank(item, candidates(item))
+    with transaction.atomic():
+        RelatedItem.objects.filter(item=item).delete()
+        RelatedItem.objects.bulk_create(
+            [RelatedItem(item=item, related=candidate, score=score) for score, candidate in scored[:MAX_RELATED]]
+        )
+
+
+def item_sold(item):
+    """Remove a sold item from every list and refill the lists it was in"""
+    from .models import Item, RelatedItem
+
+    with transaction.atomic():
+        affected = list(RelatedItem.objects.filter(related=item).values_list('item_id', flat=True)[:REFRESH_LIMIT])
+        RelatedItem.objects.filter(Q(item=item) | Q(related=item)).delete()
+    for neighbour in Item.objects.filter(pk__in=affected, is_sold=False).only(*CANDIDATE_FIELDS, 'is_sold'):
+        recompute_list(neighbour)
+
+
+def needs_rerank(item, created=False, changed=()):
+    """Whether a save of ``item`` changed anything the lists depend on"""
+    if not created and not changed:
+        return False
+    return not item.is_sold or created or 'is_sold' in changed
+
+
+def items_changed(item_ids, start=True):
+    """Queue a re-rank of a batch of items (bulk updates, imports)"""
+    enqueue_many(
+        'recommendations', [{'item': pk} for pk in item_ids],
+        key=lambda payload: f'item:{payload["item"]}', start=start,
+    )
+
+
+@task('recommendations', batch_size=50)
+def refresh_items(payloads):
+    """Task handler: bring the lists in line with each item's current state"""
+    from .models import Item
+
+    item_ids = {payload['item'] for payload in payloads}
+    for item in Item.objects.filter(pk__in=item_ids).only(*CANDIDATE_FIELDS, 'is_sold'):
+        if item.is_sold:
+            item_sold(item)
+        else:
+            refresh_item(item)
+
+
+def related_items(item, limit=3):
+    """Unsold recommendations for ``item`` in rank order (one indexed query)"""
+    from .models import Item
+
+    return Item.objects.filter(
+        recommended_for__item=item, is_sold=False,
+    ).order_by('-recommended_for__score')[:limit]
+
+
+def rebuild_all(batch_size=500, progress=None):
+    """Recompute every unsold item's list from scratch"""
+    from .models import Item, RelatedItem
+
+    RelatedItem.objects.all().delete()
+    ids = list(Item.objects.filter(is_sold=False).values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        batch = Item.objects.filter(pk__in=ids[start:start + batch_size]).only(*CANDIDATE_FIELDS, 'is_sold')
+        for item in batch:
+            recompute_list(item)
+        if progress:
+            progress(min(start + batch_size, len(ids)), len(ids))
+    return len(ids)
@@ -0,0 +1,50 @@
+"""Read/write split for the marketplace tables.
+
+When settings.DATABASES has a settings.READ_DATABASE alias, queries that
+only read marketplace models go through it and all writes go to 'default'.
+Under SQLite the read alias opens the same file read-only (query_only), so
+each thread reads on its own WAL snapshot connection while another of its
+connections may be writing. Under PostgreSQL it can point at a streaming
+replica (POSTGRES_REPLICA_HOST).
+
+Reads stay on 'default' while a transaction is open there, so code that
+writes and then reads in one atomic() block sees its own changes. Models in
+PRIMARY_ONLY (the task queue, whose workers read rows they just claimed) are
+never read from the replica.
+"""
+from django.conf import settings
+from django.db import connections
+
+APP_LABELS = {'marketplace'}
+PRIMARY_ONLY = {'task'}
+
+
+class ReadReplicaRouter:
+    def read_alias(self):
+        alias = getattr(settings, 'READ_DATABASE', None)
+        return alias if alias in settings.DATABASES else None
+
+    def db_for_read(self, model, **hints):
+        alias = self.read_alias()
+        if alias is None or model._meta.app_label not in APP_LABELS or model._meta.model_name in PRIMARY_ONLY:
+            return None
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in APP_LABELS:
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        aliases = {'default', self.read_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == self.read_alias():
+            return False
+        return None
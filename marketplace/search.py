@@ -0,0 +1,197 @@
+"""Full-text search for marketplace items.
+
+On SQLite the ``marketplace_item_fts`` FTS5 table (created in migration 0002)
+indexes the searchable Item columns and is kept in sync by triggers. On
+PostgreSQL a weighted ``search_vector`` tsvector column with a GIN index
+(migration 0008) plays the same part, and a pg_trgm index serves the
+title-only ``icontains`` searches. Queries are tokenized into prefix terms
+so "calc stew" matches "Calculus" by "Stewart", and results carry a
+``search_rank`` (lower is better) for ordering. Databases without either
+index fall back to ``icontains`` lookups.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q, Value, FloatField
+
+FTS_TABLE = 'marketplace_item_fts'
+ITEM_TABLE = 'marketplace_item'
+PG_VECTOR_COLUMN = 'search_vector'
+
+SEARCH_FIELDS = ['item_name', 'author', 'course', 'description', 'seller_name']
+AUTOCOMPLETE_FIELDS = ['item_name', 'course', 'author']
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Trigger definitions also live in migration 0002; they are repeated here so
+# ensure_search_triggers() can restore them after SQLite table rebuilds.
+TRIGGERS = {
+    'marketplace_item_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS marketplace_item_fts_ai AFTER INSERT ON marketplace_item BEGIN
+            INSERT INTO marketplace_item_fts(rowid, item_name, author, course, description, seller_name)
+            VALUES (new.id, new.item_name, new.author, new.course, new.description, new.seller_name);
+        END
+    """,
+    'marketplace_item_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS marketplace_item_fts_ad AFTER DELETE ON marketplace_item BEGIN
+            INSERT INTO marketplace_item_fts(marketplace_item_fts, rowid, item_name, author, course, description, seller_name)
+            VALUES ('delete', old.id, old.item_name, old.author, old.course, old.description, old.seller_name);
+        END
+    """,
+    'marketplace_item_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS marketplace_item_fts_au
+        AFTER UPDATE OF item_name, author, course, description, seller_name ON marketplace_item BEGIN
+            INSERT INTO marketplace_item_fts(marketplace_item_fts, rowid, item_name, author, course, description, seller_name)
+            VALUES ('delete', old.id, old.item_name, old.author, old.course, old.description, old.seller_name);
+            INSERT INTO marketplace_item_fts(rowid, item_name, author, course, description, seller_name)
+            VALUES (new.id, new.item_name, new.author, new.course, new.description, new.seller_name);
+        END
+    """,
+}
+
+
+def build_match_query(query, fields=None):
+    """Turn free text into an FTS5 MATCH expression of prefix terms"""
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return ''
+    expression = ' '.join(f'"{token}"*' for token in tokens)
+    if fields:
+        expression = '{%s} : (%s)' % (' '.join(fields), expression)
+    return expression
+
+
+# The PostgreSQL counterpart of the FTS5 table: the expression a trigger
+# from migration 0008 (which repeats it) stores in search_vector. Item names
+# weigh most, then author and course.
+PG_VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce({row}.item_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({row}.author, '') || ' ' || coalesce({row}.course, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}.description, '')), 'C') ||
+    setweight(to_tsvector('simple', coalesce({row}.seller_name, '')), 'D')
+"""
+
+
+def build_tsquery(query):
+    """Turn free text into a to_tsquery() expression of prefix terms"""
+    return ' & '.join(f"'{token}':*" for token in TOKEN_RE.findall(query.lower()))
+
+
+_index_present = {}
+
+
+def search_backend(using='default'):
+    """'fts5', 'postgres' or None (no index) for the given database, checked once"""
+    connection = connections[using]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return None
+    key = (using, str(connection.settings_dict['NAME']))
+    if key not in _index_present:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                present = FTS_TABLE in connection.introspection.table_names(cursor)
+            else:
+                columns = connection.introspection.get_table_description(cursor, 'marketplace_item')
+                present = any(column.name == PG_VECTOR_COLUMN for column in columns)
+        _index_present[key] = present
+    if not _index_present[key]:
+        return None
+    return 'fts5' if connection.vendor == 'sqlite' else 'postgres'
+
+
+def has_search_index(using='default'):
+    """True when the database has a full-text index for items"""
+    return search_backend(using) is not None
+
+
+def search_items(queryset, query, fields=None):
+    """Filter an Item (or ItemListing) queryset down to matches for ``query``.
+
+    The result is annotated with ``search_rank`` so callers can
+    ``order_by('search_rank')`` for best matches first.
+    """
+    from .models import Item
+
+    fields = fields or SEARCH_FIELDS
+    backend = search_backend(queryset.db)
+    if backend == 'postgres' and fields == SEARCH_FIELDS:
+        return _postgres_search(queryset, query)
+    if backend != 'fts5':
+        # On PostgreSQL item_name lookups use the trigram index
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': query})
+        if queryset.model is not Item:
+            # Projections are keyed by item and lack some searched columns
+            condition = Q(pk__in=Item.objects.filter(condition).values('pk'))
+        return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    match = build_match_query(query, fields if fields != SEARCH_FIELDS else None)
+    if not match:
+        return _no_results(queryset)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {_item_id_column(queryset)}', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+        select={'search_rank': f'{FTS_TABLE}.rank'},
+    )
+
+
+def _no_results(queryset):
+    # Queries without a single word (e.g. '"' or '+') match nothing, but
+    # callers may still order by the rank
+    return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _item_id_column(queryset):
+    meta = queryset.model._meta
+    return f'{meta.db_table}.{meta.pk.column}'
+
+
+def _postgres_search(queryset, query):
+    tsquery = build_tsquery(query)
+    if not tsquery:
+        return _no_results(queryset)
+    tables, where = [], []
+    if queryset.model._meta.db_table != ITEM_TABLE:
+        tables.append(ITEM_TABLE)
+        where.append(f'{ITEM_TABLE}.id = {_item_id_column(queryset)}')
+    return queryset.extra(
+        tables=tables,
+        where=[*where, f"{ITEM_TABLE}.{PG_VECTOR_COLUMN} @@ to_tsquery('simple', %s)"],
+        params=[tsquery],
+        select={'search_rank': f"-ts_rank({ITEM_TABLE}.{PG_VECTOR_COLUMN}, to_tsquery('simple', %s))"},
+        select_params=[tsquery],
+    )
+
+
+def ensure_search_triggers(using='default'):
+    """Recreate missing sync triggers, rebuilding the index if any were lost.
+
+    SQLite's schema editor rebuilds ``marketplace_item`` for some ALTERs,
+    which silently drops its triggers. Returns True when a repair was needed.
+    """
+    _index_present.clear()
+    if search_backend(using) != 'fts5':
+        return False
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'marketplace_item'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        if missing:
+            rebuild_search_index(using)
+    return bool(missing)
+
+
+def rebuild_search_index(using='default'):
+    """Re-read every Item row into the full-text index"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if search_backend(using) == 'postgres':
+            cursor.execute(f"UPDATE marketplace_item SET {PG_VECTOR_COLUMN} = {PG_VECTOR_SQL.format(row='marketplace_item')}")
+            return
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
@@ -0,0 +1,120 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Item
+from .search import ensure_search_triggers
+from .caching import bump_catalog_generation, catalog_generation
+from .profiling import install_query_timer
+from .sqlite import configure_connection
+from .autocomplete import autocomplete_index
+from .tasks import enqueue, task
+from . import dimensions, listings, recommendations
+
+# Payloads of the Item changes made inside batched_item_changes()
+_batch = ContextVar('item_change_batch', default=None)
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, using, **kwargs):
+    """Restore FTS triggers dropped when a migration rebuilt the Item table"""
+    if sender.name == 'marketplace':
+        ensure_search_triggers(using)
+
+
+@receiver(post_migrate)
+def populate_listings(sender, using, **kwargs):
+    """Fill the listing projection the first time it is migrated in"""
+    if sender.name == 'marketplace':
+        listings.ensure_populated()
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    """Let request profiles see queries on connections opened in any thread"""
+    install_query_timer(connection)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Pragmas and lock retries for SQLite connections"""
+    configure_connection(connection)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def item_changed(sender, instance, signal, raw=False, created=False, **kwargs):
+    """Invalidate cached pages when a listing is added, edited or removed, and
+    queue the work that brings the derived tables in line"""
+    deleted = signal is post_delete
+    batch = _batch.get()
+    if batch is None:
+        previous = catalog_generation()
+        generation = bump_catalog_generation()
+        autocomplete_index.item_changed(instance, previous, generation, deleted=deleted)
+    if raw:
+        return
+    courses, sellers = dimensions.changed_keys(instance, created=created, deleted=deleted)
+    payload = {
+        'item': instance.pk,
+        'courses': sorted(courses),
+        'sellers': sorted(sellers),
+        'rerank': not deleted and recommendations.needs_rerank(instance, created, instance.changed_fields()),
+    }
+    if batch is None:
+        enqueue('item_changes', payload)
+    else:
+        batch.append(payload)
+
+
+@contextmanager
+def batched_item_changes():
+    """Handle the Item saves and deletes made in the block all at once, at its end.
+
+    For bulk jobs such as archival, which delete items one batch at a time:
+    instead of a generation bump and a queued task per row, the touched
+    counts and listing rows are brought in line in one pass, in the caller's
+    transaction, and the generation is bumped once.
+    """
+    batch = []
+    token = _batch.set(batch)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    if batch:
+        update_derived_tables(batch)
+        bump_catalog_generation()
+
+
+@task('item_changes', batch_size=50)
+def apply_item_changes(payloads):
+    """Task handler: dimension counts, listing rows and similar items after saves and deletes"""
+    update_derived_tables(payloads)
+    # Cached pages rendered before this ran show the old rows and counts;
+    # the autocomplete index already has the change
+    previous = catalog_generation()
+    autocomplete_index.follow(previous, bump_catalog_generation())
+
+
+def update_derived_tables(payloads):
+    """Recount, re-project and queue re-ranking for the changes in ``payloads``.
+
+    Every save records its own payload, so their union covers each course
+    and seller an item moved between. A deleted item's listing row goes with
+    it (cascade); refresh() drops the rows of items sold since.
+    """
+    courses, sellers, rerank = set(), set(), set()
+    for payload in payloads:
+        courses.update(payload['courses'])
+        sellers.update(payload['sellers'])
+        if payload['rerank']:
+            rerank.add(payload['item'])
+    if courses or sellers:
+        dimensions.recount(courses, sellers)
+    listings.refresh({payload['item'] for payload in payloads})
+    if rerank:
+        recommendations.items_changed(sorted(rerank))
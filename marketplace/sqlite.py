@@ -0,0 +1,71 @@
+"""SQLite performance profile, applied to every new connection.
+
+settings.SQLITE_PRAGMAS are set on each SQLite connection as it opens
+(connection_created):
+
+- journal_mode=WAL lets readers keep reading the last committed snapshot
+  while a write is in progress. Without it, every view count flush, post and
+  admin update blocks the homepage and listing queries. The mode is stored in
+  the database file, so the first connection switches it; settings leave it
+  out for the development db.sqlite3 tracked in git.
+- synchronous=NORMAL skips the fsync on each commit in WAL mode. A power
+  loss can lose the last transactions but cannot corrupt the file.
+- mmap_size and cache_size keep hot pages in memory per connection.
+- busy_timeout makes a writer wait for the lock instead of failing at once.
+
+Statements outside a transaction are also retried with backoff when SQLite
+still reports "database is locked". Inside atomic() the error is raised,
+since re-running one statement could mix two snapshots in a transaction.
+Connections for settings.READ_DATABASE (see routers.py) are opened
+``query_only``, so a write routed there fails rather than slipping through.
+"""
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+
+# Seconds before each retry of a statement that found the database locked
+LOCK_RETRY_DELAYS = [0.05, 0.2, 1.0]
+
+
+def is_locked_error(exc):
+    return 'is locked' in str(exc)
+
+
+def _retry_when_locked(execute, sql, params, many, context):
+    connection = context['connection']
+    for delay in [*LOCK_RETRY_DELAYS, None]:
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as exc:
+            if delay is None or not is_locked_error(exc) or connection.in_atomic_block:
+                raise
+            time.sleep(delay)
+
+
+def configure_connection(connection):
+    """Apply SQLITE_PRAGMAS (and query_only on the read alias) to a new connection"""
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if connection.alias == getattr(settings, 'READ_DATABASE', None):
+        pragmas['query_only'] = 1
+    # On the DB-API connection, so the pragmas do not count as request queries
+    for name, value in pragmas.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+    if _retry_when_locked not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _retry_when_locked)
+
+
+def current_pragmas(using='default'):
+    """{pragma: value} as reported by the connection, for diagnostics"""
+    from django.db import connections
+
+    connection = connections[using]
+    names = ['journal_mode', *getattr(settings, 'SQLITE_PRAGMAS', {}), 'query_only']
+    with connection.cursor() as cursor:
+        values = {}
+        for name in dict.fromkeys(names):
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
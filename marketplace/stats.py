@@ -0,0 +1,35 @@
+"""Homepage statistics, computed in one aggregate query and cached.
+
+The cache entry is versioned by the catalog generation (see caching.py), so
+posting, marking sold or available and deleting items all invalidate it.
+"""
+from django.db.models import Count, F, Q
+
+from .caching import cached_value
+
+HOME_STATS_TIMEOUT = 5 * 60  # bounds staleness across worker processes
+POPULAR_COURSES_LIMIT = 5
+
+
+def compute_home_stats():
+    """Return (stats, popular_courses) straight from the database"""
+    from .models import Course, Item, Seller
+
+    active = Item.objects.filter(is_sold=False)
+    stats = active.aggregate(
+        total_items=Count('pk'),
+        total_books=Count('pk', filter=Q(item_type='book')),
+        total_notes=Count('pk', filter=Q(item_type='notes')),
+    )
+    # Seller and course figures come from the dimension tables' counters
+    stats['total_sellers'] = Seller.objects.filter(active_count__gt=0).count()
+    popular_courses = list(
+        Course.objects.filter(active_count__gt=0).order_by('-active_count')
+        .values(course=F('code'), count=F('active_count'))[:POPULAR_COURSES_LIMIT]
+    )
+    return stats, popular_courses
+
+
+def get_home_stats():
+    """Cached (stats, popular_courses) for the homepage"""
+    return cached_value('home-stats', [], compute_home_stats, HOME_STATS_TIMEOUT)
@@ -0,0 +1,251 @@
+"""Database-backed queue for work that should not hold up a request.
+
+Code enqueues a named Task row with a JSON payload; the handler registered
+for that name with ``@task`` runs it later, outside the request:
+
+- In the web process a small thread pool (TASK_WORKERS) drains the queue
+  once the enqueuing transaction commits. With TASKS_RUN_IN_PROCESS = False
+  tasks wait for ``manage.py run_tasks``, a separate worker process.
+- A task with a ``key`` is idempotent: enqueuing the same name and key while
+  one is still pending adds nothing, so a burst of saves of one item leaves
+  a single task. Handlers read the current rows rather than trusting the
+  payload to be recent.
+- Workers claim up to the handler's ``batch_size`` pending tasks of one name
+  and pass all their payloads to a single call.
+- A failing batch is retried after RETRY_DELAYS, up to ``max_attempts`` runs
+  in total, and then kept as failed with its error.
+- queue_stats() (``manage.py task_stats``) reports the queue depth and the
+  wait and run times of recently finished tasks.
+
+Finished tasks are deleted TASK_RETENTION seconds after they ran.
+"""
+import logging
+import threading
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the first, second and later retries of a failed batch
+RETRY_DELAYS = [10, 60, 300]
+STATS_WINDOW = 60 * 60
+STATS_SAMPLE = 1000
+
+Handler = namedtuple('Handler', 'func batch_size max_attempts')
+
+HANDLERS = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+_scheduled = 0
+
+
+def task(name, batch_size=1, max_attempts=3):
+    """Register ``func(payloads)`` as the handler for tasks called ``name``"""
+    def decorator(func):
+        HANDLERS[name] = Handler(func, batch_size, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, key='', start=True):
+    """Queue one task; see enqueue_many()"""
+    enqueue_many(name, [payload or {}], key=(lambda payload: key) if key else None, start=start)
+
+
+def enqueue_many(name, payloads, key=None, start=True):
+    """Queue a task per payload; ``key(payload)`` gives its idempotency key.
+
+    Tasks whose key is already pending are skipped. With ``start`` they run
+    in this process after the current transaction commits (unless
+    TASKS_RUN_IN_PROCESS is off); otherwise they wait for ``run_tasks``.
+    """
+    from .models import Task
+
+    tasks = [Task(name=name, payload=payload, key=key(payload) if key else '') for payload in payloads]
+    if not tasks:
+        return
+    Task.objects.bulk_create(tasks, ignore_conflicts=True, batch_size=500)
+    if start and getattr(settings, 'TASKS_RUN_IN_PROCESS', True):
+        transaction.on_commit(kick)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'TASK_WORKERS', 2),
+            thread_name_prefix='task-worker',
+        )
+    return _executor
+
+
+def kick():
+    """Have the in-process pool drain the queue, unless enough passes are already waiting"""
+    global _scheduled
+    with _executor_lock:
+        if _scheduled >= getattr(settings, 'TASK_WORKERS', 2):
+            return
+        _scheduled += 1
+        executor = get_executor()
+    executor.submit(_drain)
+
+
+def _drain():
+    global _scheduled
+    # Count the pass as started first, so tasks queued while it runs get another
+    with _executor_lock:
+        _scheduled -= 1
+    try:
+        run_pending()
+        purge_finished()
+    except Exception:
+        logger.exception('Background task pass failed')
+    finally:
+        connections.close_all()
+
+
+def claim(name, limit, now):
+    """Mark up to ``limit`` due tasks of ``name`` as running and return them"""
+    from .models import Task
+
+    token = uuid.uuid4().hex
+    due = Task.objects.filter(status='pending', name=name, run_after__lte=now).order_by('run_after')
+    ids = list(due.values_list('pk', flat=True)[:limit])
+    # Another worker may claim some of the same rows first; the token tells
+    # which ones this one got
+    Task.objects.filter(pk__in=ids, status='pending').update(
+        status='running', worker=token, started_at=now, attempts=F('attempts') + 1,
+    )
+    return list(Task.objects.filter(worker=token))
+
+
+def run_batch(name, tasks):
+    """Call the handler for claimed tasks and record the outcome"""
+    from .models import Task
+
+    handler = HANDLERS.get(name)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for "{name}" tasks')
+        handler.func([task.payload for task in tasks])
+    except Exception as exc:
+        logger.exception('%s tasks %s failed', name, [task.pk for task in tasks])
+        max_attempts = handler.max_attempts if handler else 1
+        for task in tasks:
+            retry_or_fail(task, max_attempts, exc)
+    else:
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            status='done', error='', finished_at=timezone.now(),
+        )
+
+
+def retry_or_fail(task, max_attempts, exc):
+    from .models import Task
+
+    now = timezone.now()
+    if task.attempts >= max_attempts:
+        Task.objects.filter(pk=task.pk).update(status='failed', error=str(exc), finished_at=now)
+        return
+    delay = RETRY_DELAYS[min(task.attempts, len(RETRY_DELAYS)) - 1]
+    if not requeue(task.pk, error=str(exc), run_after=now + timedelta(seconds=delay)):
+        return
+    if getattr(settings, 'TASKS_RUN_IN_PROCESS', True):
+        timer = threading.Timer(delay, kick)
+        timer.daemon = True
+        timer.start()
+
+
+def requeue(pk, **fields):
+    """Put a claimed task back in the queue; False if a newer one with its key is already waiting"""
+    from .models import Task
+
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=pk).update(status='pending', worker='', **fields)
+    except IntegrityError:
+        # The pending duplicate covers this one
+        Task.objects.filter(pk=pk).delete()
+        return False
+    return True
+
+
+def run_pending(names=None, limit=None):
+    """Run due tasks in this thread until none are left; returns how many ran"""
+    from .models import Task
+
+    ran = 0
+    while limit is None or ran < limit:
+        now = timezone.now()
+        due = Task.objects.filter(status='pending', run_after__lte=now)
+        if names:
+            due = due.filter(name__in=names)
+        name = due.order_by('run_after').values_list('name', flat=True).first()
+        if name is None:
+            break
+        handler = HANDLERS.get(name)
+        size = handler.batch_size if handler else 1
+        if limit is not None:
+            size = min(size, limit - ran)
+        tasks = claim(name, size, now)
+        if tasks:
+            run_batch(name, tasks)
+            ran += len(tasks)
+    return ran
+
+
+def requeue_stalled(minutes):
+    """Return tasks left running by a crashed worker to the queue; returns how many"""
+    from .models import Task
+
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    stalled = list(Task.objects.filter(status='running', started_at__lt=cutoff).values_list('pk', flat=True))
+    return sum(requeue(pk) for pk in stalled)
+
+
+def purge_finished():
+    """Delete tasks that finished more than TASK_RETENTION seconds ago"""
+    from .models import Task
+
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'TASK_RETENTION', 24 * 60 * 60))
+    Task.objects.filter(status='done', finished_at__lt=cutoff).delete()
+
+
+def queue_stats():
+    """{name: counts per status, age of the oldest pending task and recent
+    wait/run time percentiles in seconds}"""
+    from .benchmark import percentile
+    from .models import Task
+
+    now = timezone.now()
+    stats = defaultdict(lambda: {
+        'pending': 0, 'running': 0, 'done': 0, 'failed': 0,
+        'oldest_pending': None, 'wait_p50': None, 'wait_p95': None, 'run_p50': None, 'run_p95': None,
+    })
+    rows = Task.objects.order_by().values('name', 'status').annotate(count=Count('pk'), oldest=Min('created_at'))
+    for row in rows:
+        stats[row['name']][row['status']] = row['count']
+        if row['status'] == 'pending':
+            stats[row['name']]['oldest_pending'] = (now - row['oldest']).total_seconds()
+
+    finished = Task.objects.filter(
+        status='done', finished_at__gte=now - timedelta(seconds=STATS_WINDOW),
+    ).order_by('-finished_at').values_list('name', 'created_at', 'started_at', 'finished_at')[:STATS_SAMPLE]
+    timings = defaultdict(lambda: ([], []))
+    for name, created_at, started_at, finished_at in finished:
+        waits, runs = timings[name]
+        waits.append((started_at - created_at).total_seconds())
+        runs.append((finished_at - started_at).total_seconds())
+    for name, (waits, runs) in timings.items():
+        stats[name].update(
+            wait_p50=percentile(waits, 0.5), wait_p95=percentile(waits, 0.95),
+            run_p50=percentile(runs, 0.5), run_p95=percentile(runs, 0.95),
+        )
+    return dict(stats)
@@ -0,0 +1,68 @@
+from django import template
+
+from ..caching import cached_value
+from ..images import picture_data
+from ..models import ItemListing
+
+register = template.Library()
+
+
+@register.inclusion_tag('item_picture.html')
+def item_picture(item, kind='card', css_class='', sizes='100vw'):
+    """Responsive <picture> for an item photo.
+
+    ``item`` is an Item, or an ItemListing whose card picture is precomputed.
+    """
+    picture = item.picture if isinstance(item, ItemListing) else picture_data(item, kind)
+    return {
+        'item': item,
+        'lazy': kind == 'card',
+        'css_class': css_class,
+        'sizes': sizes,
+        **picture,
+    }
+
+
+class CatalogCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on, timeout):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.timeout = timeout
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        timeout = self.timeout.resolve(context) if self.timeout else None
+        return cached_value(
+            f'fragment:{name}', vary_on, lambda: self.nodelist.render(context), timeout,
+        )
+
+
+@register.tag
+def catalogcache(parser, token):
+    """Cache a template fragment until the catalog changes.
+
+    Usage::
+
+        {% catalogcache 'name' [vary_on ...] [timeout=seconds] %}
+            ...
+        {% endcatalogcache %}
+
+    Like ``{% cache %}``, but keys include the catalog generation so item
+    changes invalidate the fragment, and hits/misses are recorded.
+    """
+    nodelist = parser.parse(('endcatalogcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()[1:]
+    if not bits:
+        raise template.TemplateSyntaxError("'catalogcache' tag requires a fragment name.")
+    timeout = None
+    if bits[-1].startswith('timeout='):
+        timeout = parser.compile_filter(bits.pop()[len('timeout='):])
+    return CatalogCacheNode(
+        nodelist,
+        parser.compile_filter(bits[0]),
+        [parser.compile_filter(bit) for bit in bits[1:]],
+        timeout,
+    )
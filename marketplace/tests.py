@@ -0,0 +1,1248 @@
+import csv
+import io
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Q
+from django.template import Context, Template, TemplateSyntaxError
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib import admin
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import include, path, resolve
+from django.utils import timezone
+from PIL import Image
+
+from . import async_views, dimensions, listings, signals
+from .autocomplete import autocomplete_index
+from .archive import archive_due
+from .caching import bump_catalog_generation, cache_metrics
+from .conditional import page_items
+from .counters import ViewCounter, _flush_on_exit, view_counter
+from .images import output_formats, picture_data
+from .facets import FACETS, PRICE_BUCKETS, facet_counts, price_range
+from .diagnostics import CaptureAllQueries, capture_page_queries, full_scans, sample_pages, seed_catalog
+from .models import ArchivedItem, Course, Item, ItemListing, ItemRendition, RelatedItem, Seller, Task, ViewBucket
+from .pagination import KEYSET_SORTS
+from .profiling import query_budget
+from .recommendations import MAX_RELATED, rebuild_all, related_items
+from .routers import ReadReplicaRouter
+from .search import search_backend, search_items
+from .stats import get_home_stats
+from .tasks import run_pending
+from . import trending
+from .transfer import EXPORT_FIELDS, export_lines, import_items, read_rows
+
+# Keep the catalog generation out of the shared cache other processes read
+TEST_CACHES = {
+    **settings.CACHES,
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'marketplace-tests'},
+}
+
+
+@override_settings(
+    TASKS_RUN_IN_PROCESS=False, VIEW_COUNT_FLUSH_INTERVAL=3600, CACHES=TEST_CACHES, READ_DATABASE=None,
+)
+class CatalogTestCase(TestCase):
+    """The seeded catalog of diagnostics.py (half Calculus by Stewart, half Algorithms by Cormen).
+
+    Everything goes through 'default': the read-only alias cannot see rows
+    written in the test's transaction.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.items = seed_catalog()
+
+    def setUp(self):
+        # The autocomplete index outlives each test's rollback; make it rebuild
+        bump_catalog_generation()
+
+    def tearDown(self):
+        # Write counted views inside this test's transaction, not at exit
+        view_counter.flush()
+
+    def page_queries(self, url):
+        return capture_page_queries(url, aliases=['default'])
+
+
+def photo(size=(1600, 1200), orientation=None, image_format='JPEG'):
+    """Encoded bytes of a plain test photo, optionally with an EXIF orientation"""
+    image = Image.new('RGB', size, (200, 120, 40))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class MediaTestCase(CatalogTestCase):
+    """A catalog whose photos are written to a temporary MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def add_photo(self, item, content=None, name='photo.jpg'):
+        item.image.save(name, ContentFile(content or photo()))
+        return item
+
+
+class QueryPlanTests(CatalogTestCase):
+    """The checks of ``manage.py check_query_plans``"""
+
+    def test_page_queries_use_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan checks use EXPLAIN QUERY PLAN and need SQLite.')
+        for label, url in sample_pages(self.items[1]):
+            with self.subTest(label, url=url):
+                for query in self.page_queries(url):
+                    self.assertEqual(full_scans(query['sql']), [], f'full table scan in {query["sql"]}')
+
+
+class QueryBudgetTests(CatalogTestCase):
+    """The budgets of ``manage.py check_query_budgets`` (QUERY_BUDGETS in settings)"""
+
+    def assertWithinBudget(self, url):
+        budget = query_budget(resolve(url.split('?')[0]).url_name)
+        queries = self.page_queries(url)
+        if budget is not None:
+            self.assertLessEqual(len(queries), budget, '\n'.join(query['sql'] for query in queries))
+
+    def test_pages_within_budget(self):
+        for label, url in sample_pages(self.items[1]):
+            with self.subTest(label, url=url):
+                self.assertWithinBudget(url)
+
+    def test_home_with_trending_items_within_budget(self):
+        for item in self.items[:3]:
+            view_counter.increment(item.pk)
+        view_counter.flush()
+        self.assertWithinBudget('/')
+
+    def test_mark_sold_within_budget(self):
+        url = f'/item/{self.items[1].pk}/'
+        with CaptureAllQueries(['default']) as queries:
+            response = self.client.post(url, {'mark_sold': '1'})
+        self.assertEqual(response.status_code, 302)
+        self.assertLessEqual(len(queries), query_budget('item_detail'), '\n'.join(q['sql'] for q in queries.captured_queries))
+        # The rest happens in the queued task
+        self.assertTrue(ItemListing.objects.filter(pk=self.items[1].pk).exists())
+        run_pending()
+        self.assertFalse(ItemListing.objects.filter(pk=self.items[1].pk).exists())
+
+
+class ViewCounterTests(CatalogTestCase):
+    """Buffered view counting (counters.py)"""
+
+    def views(self, item):
+        return Item.objects.get(pk=item.pk).view_count, ItemListing.objects.get(pk=item.pk).view_count
+
+    def test_detail_hits_are_buffered(self):
+        item = self.items[1]
+        url = f'/item/{item.pk}/'
+        with CaptureAllQueries(['default']) as queries:
+            self.client.get(url)
+            response = self.client.get(url)
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')])
+        self.assertEqual(response.context['item'].current_view_count, 2)
+        self.assertEqual(self.views(item), (0, 0))
+        self.assertEqual(view_counter.flush(), 2)
+        self.assertEqual(self.views(item), (2, 2))
+
+    @override_settings(VIEW_COUNT_FLUSH_THRESHOLD=5)
+    def test_flushes_at_the_threshold(self):
+        counter = ViewCounter()
+        item = self.items[1]
+        for _ in range(4):
+            counter.increment(item.pk)
+        self.assertEqual((counter.pending(item.pk), self.views(item)), (4, (0, 0)))
+        counter.increment(item.pk)
+        self.assertEqual((counter.pending(item.pk), self.views(item)), (0, (5, 5)))
+
+    def test_flushes_after_the_interval(self):
+        counter = ViewCounter()
+        counter.increment(self.items[1].pk)
+        counter._last_flush = time.monotonic() - settings.VIEW_COUNT_FLUSH_INTERVAL
+        counter.increment(self.items[1].pk)
+        self.assertEqual(self.views(self.items[1]), (2, 2))
+
+    def test_failed_flush_keeps_the_views(self):
+        counter = ViewCounter()
+        counter.increment(self.items[1].pk, 3)
+        with mock.patch('marketplace.trending.record_views', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                counter.flush()
+        self.assertEqual((counter.pending(self.items[1].pk), self.views(self.items[1])), (3, (0, 0)))
+        self.assertEqual(counter.flush(), 3)
+        self.assertEqual(self.views(self.items[1]), (3, 3))
+
+    def test_exit_hook_flushes_pending_views(self):
+        view_counter.increment(self.items[1].pk, 4)
+        _flush_on_exit()
+        self.assertEqual(view_counter.pending(self.items[1].pk), 0)
+        self.assertEqual(self.views(self.items[1]), (4, 4))
+
+
+class HomeStatsTests(CatalogTestCase):
+    """The cached homepage statistics (stats.py) and what invalidates them"""
+
+    def stats(self):
+        run_pending()
+        stats, popular_courses = get_home_stats()
+        return stats['total_items'], dict((row['course'], row['count']) for row in popular_courses)
+
+    def test_computed_once_per_generation(self):
+        with self.assertNumQueries(3):
+            stats, _ = get_home_stats()
+        active = [item for item in self.items if not item.is_sold]
+        self.assertEqual(stats, {
+            'total_items': len(active),
+            'total_books': sum(item.item_type == 'book' for item in active),
+            'total_notes': sum(item.item_type == 'notes' for item in active),
+            'total_sellers': len({item.seller_name for item in active}),
+        })
+        with self.assertNumQueries(0):
+            get_home_stats()
+
+    def test_posting_an_item(self):
+        total, courses = self.stats()
+        response = self.client.post('/post/', {
+            'item_name': 'Linear Algebra', 'item_type': 'book', 'course': 'MATH 101', 'price': '20',
+            'condition': 'good', 'description': 'Clean copy.', 'seller_name': 'Eve', 'contact_info': 'eve@university.edu',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stats(), (total + 1, {**courses, 'MATH 101': courses['MATH 101'] + 1}))
+
+    def test_marking_an_item_sold(self):
+        total, courses = self.stats()
+        item = next(item for item in self.items if not item.is_sold and item.course == 'CS 201')
+        self.client.post(f'/item/{item.pk}/', {'mark_sold': '1'})
+        self.assertEqual(self.stats(), (total - 1, {**courses, 'CS 201': courses['CS 201'] - 1}))
+
+    def test_admin_actions(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@university.edu', 'password'))
+        total, courses = self.stats()
+        selected = [item.pk for item in self.items if not item.is_sold and item.course == 'PHYS 110']
+        self.client.post('/admin/marketplace/item/', {'action': 'mark_as_sold', '_selected_action': selected})
+        self.assertEqual(self.stats(), (total - len(selected), {
+            course: count for course, count in courses.items() if course != 'PHYS 110'
+        }))
+        self.client.post('/admin/marketplace/item/', {'action': 'mark_as_available', '_selected_action': selected})
+        self.assertEqual(self.stats(), (total, courses))
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    """Cursor pages of /api/items/ and /items/?cursor= (pagination.py)"""
+
+    def setUp(self):
+        super().setUp()
+        # Ties on the sort key (most items have no views) are broken by pk
+        for item in self.items[1:20:3]:
+            view_counter.increment(item.pk, item.pk % 4 + 1)
+        view_counter.flush()
+
+    def expected(self, sort):
+        field, descending = KEYSET_SORTS[sort]
+        order = [f'-{field}', '-pk'] if descending else [field, 'pk']
+        return list(ItemListing.objects.order_by(*order).values_list('pk', flat=True))
+
+    def walk(self, sort):
+        seen, cursor = [], None
+        while True:
+            params = {'sort': sort, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get('/api/items/', params).json()
+            seen += [row['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                return seen
+
+    def test_every_sort_visits_each_listing_once_in_order(self):
+        for sort in KEYSET_SORTS:
+            with self.subTest(sort=sort):
+                self.assertEqual(self.walk(sort), self.expected(sort))
+
+    def test_listing_page_follows_the_cursor(self):
+        data = self.client.get('/api/items/', {'sort': 'price'}).json()
+        response = self.client.get('/items/', {'sort': 'price', 'cursor': data['next_cursor']})
+        self.assertTrue(response.context['cursor_mode'])
+        self.assertEqual([item.pk for item in response.context['items']], self.expected('price')[12:24])
+
+    def test_invalid_cursors(self):
+        for cursor in ['not-a-cursor', 'W10', '!!']:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/items/', {'cursor': cursor}).status_code, 400)
+                # The HTML listing starts over from the first page instead
+                response = self.client.get('/items/', {'cursor': cursor})
+                self.assertEqual([item.pk for item in response.context['items']], self.expected('-date_posted')[:12])
+
+
+class RenditionTests(MediaTestCase):
+    """Photo renditions made by the 'renditions' task (images.py)"""
+
+    def test_original_is_shown_until_renditions_exist(self):
+        item = self.add_photo(self.items[1])
+        self.assertTrue(Task.objects.filter(name='renditions', status='pending').exists())
+        picture = picture_data(Item.objects.get(pk=item.pk))
+        self.assertEqual((picture['src'], picture['sources'], picture['width']), (item.image.url, [], None))
+
+    def test_renditions_replace_the_original(self):
+        item = self.add_photo(self.items[1])
+        run_pending()
+        renditions = {(r.kind, r.image_format): (r.width, r.height) for r in ItemRendition.objects.filter(item=item)}
+        self.assertEqual(set(renditions), {(kind, f) for kind in ['card', 'detail'] for f in output_formats()})
+        self.assertEqual(renditions['card', 'jpeg'], (480, 360))
+        self.assertEqual(renditions['detail', 'webp'], (800, 600))
+        picture = ItemListing.objects.get(pk=item.pk).picture
+        self.assertIn('card.jpeg', picture['src'])
+        self.assertEqual(picture['width'], 480)
+        self.assertIn('image/webp', [source['type'] for source in picture['sources']])
+
+    def test_exif_orientation_is_applied(self):
+        item = self.add_photo(self.items[1], photo(orientation=6))
+        run_pending()
+        detail = ItemRendition.objects.get(item=item, kind='detail', image_format='jpeg')
+        self.assertEqual((detail.width, detail.height), (600, 800))
+
+    def test_new_photo_gets_new_files(self):
+        item = self.add_photo(self.items[1])
+        run_pending()
+        old = set(ItemRendition.objects.filter(item=item).values_list('file', flat=True))
+        self.add_photo(item, photo((900, 900)), name='other.jpg')
+        run_pending()
+        new = set(ItemRendition.objects.filter(item=item).values_list('file', flat=True))
+        self.assertFalse(old & new)
+        self.assertFalse([name for name in old if default_storage.exists(name)])
+
+
+class FragmentCacheTests(CatalogTestCase):
+    """The {% catalogcache %} tag and the pages that use it"""
+
+    def render(self, source, **context):
+        return Template('{% load marketplace_tags %}' + source).render(Context(context))
+
+    def test_fragment_is_kept_until_the_catalog_changes(self):
+        source = "{% catalogcache 'test' key %}{{ value }}{% endcatalogcache %}"
+        self.assertEqual(self.render(source, key=1, value='a'), 'a')
+        self.assertEqual(self.render(source, key=1, value='b'), 'a')
+        self.assertEqual(self.render(source, key=2, value='b'), 'b')
+        bump_catalog_generation()
+        self.assertEqual(self.render(source, key=1, value='c'), 'c')
+        self.assertEqual(cache_metrics()['fragment:test'], {'hits': 1, 'misses': 3, 'hit_rate': 0.25})
+
+    def test_timeout(self):
+        source = "{% catalogcache 'test' timeout=seconds %}{{ value }}{% endcatalogcache %}"
+        self.assertEqual(self.render(source, seconds=0, value='a'), 'a')
+        self.assertEqual(self.render(source, seconds=0, value='b'), 'b')
+
+    def test_name_is_required(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self.render('{% catalogcache %}{% endcatalogcache %}')
+
+    def test_pages_follow_item_edits(self):
+        # The newest listing, which is also among the similar items of another
+        item = self.items[-1]
+        neighbour = next(other for other in self.items if item in related_items(other))
+        urls = ['/', '/items/', f'/item/{neighbour.pk}/']
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), item.item_name)
+        # A new price leaves the similar-items ranking as it is
+        item.price = Decimal('987.65')
+        item.save()
+        run_pending()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), '987.65')
+
+
+class RecommendationTests(CatalogTestCase):
+    """Similar-item lists kept by the 'recommendations' task (recommendations.py)"""
+
+    def lists(self):
+        lists = {}
+        for item_id, related_id in RelatedItem.objects.order_by('item', '-score', 'related').values_list('item', 'related'):
+            lists.setdefault(item_id, []).append(related_id)
+        return lists
+
+    def test_incremental_lists_match_a_rebuild(self):
+        incremental = self.lists()
+        self.assertEqual(set(incremental), {item.pk for item in self.items if not item.is_sold})
+        rebuild_all()
+        self.assertEqual(incremental, self.lists())
+
+    def test_selling_removes_an_item_from_every_list(self):
+        item = self.items[1]
+        holders = set(RelatedItem.objects.filter(related=item).values_list('item', flat=True))
+        self.assertTrue(holders)
+        self.client.post(f'/item/{item.pk}/', {'mark_sold': '1'})
+        run_pending()
+        self.assertFalse(RelatedItem.objects.filter(Q(item=item) | Q(related=item)).exists())
+        # and the lists it was in are topped up again
+        for pk in holders:
+            self.assertEqual(RelatedItem.objects.filter(item=pk).count(), MAX_RELATED)
+        item = Item.objects.get(pk=item.pk)
+        item.is_sold = False
+        item.save()
+        run_pending()
+        self.assertEqual(RelatedItem.objects.filter(item=item).count(), MAX_RELATED)
+
+    def test_new_item_joins_its_neighbours_lists(self):
+        item = Item.objects.create(
+            item_name='Calculus Volume 1', author='James Stewart', course='MATH 101', item_type='book',
+            price=10, seller_name='Eve', contact_info='eve@university.edu',
+        )
+        run_pending()
+        top = list(related_items(item))
+        self.assertEqual(len(top), 3)
+        self.assertTrue(all(other.course == 'MATH 101' and other.author == 'James Stewart' for other in top))
+        for other in top:
+            self.assertTrue(RelatedItem.objects.filter(item=other, related=item).exists())
+
+
+class AutocompleteTests(CatalogTestCase):
+    """The in-memory suggestion index behind /search-ajax/ (autocomplete.py)"""
+
+    def suggest(self, query):
+        return [row['id'] for row in self.client.get('/search-ajax/', {'q': query}).json()['results']]
+
+    def test_suggestions(self):
+        calculus = {item.pk for item in self.items if not item.is_sold and item.item_name.startswith('Calculus')}
+        suggestions = self.suggest('calc stew')
+        self.assertEqual(len(suggestions), 10)
+        self.assertLessEqual(set(suggestions), calculus)
+        # Equally popular items rank newest first
+        self.assertEqual(suggestions, sorted(calculus, reverse=True)[:10])
+        self.assertEqual(self.suggest('c'), [])
+        self.assertEqual(self.suggest('math101'), self.suggest('MATH 101'))
+
+    def test_saves_update_the_built_index_in_place(self):
+        self.suggest('calc')
+        with mock.patch.object(autocomplete_index, 'rebuild', wraps=autocomplete_index.rebuild) as rebuild:
+            item = Item.objects.create(
+                item_name='Topology Workbook', price=10, seller_name='Eve', contact_info='eve@university.edu',
+            )
+            self.assertEqual(self.suggest('topol'), [item.pk])
+            item.item_name = 'Geometry Workbook'
+            item.save()
+            self.assertEqual((self.suggest('topol'), self.suggest('geom work')), ([], [item.pk]))
+            run_pending()
+            item.is_sold = True
+            item.save()
+            self.assertEqual(self.suggest('geom'), [])
+            other = Item.objects.get(pk=self.items[1].pk)
+            other.delete()
+            self.assertNotIn(other.pk, self.suggest('calc volume 1'))
+        rebuild.assert_not_called()
+
+    def test_missed_changes_rebuild_the_index(self):
+        self.suggest('calc')
+        # Bulk updates bypass the signals and only bump the generation
+        Item.objects.filter(pk=self.items[1].pk).update(item_name='Topology Workbook')
+        bump_catalog_generation()
+        self.assertEqual(self.suggest('topol'), [self.items[1].pk])
+
+
+# The URLconf with ASYNC_VIEWS set (as asgi.py runs), for AsyncViewTests
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', async_views.home, name='home'),
+    path('items/', async_views.all_items, name='all_items'),
+    path('item/<int:pk>/', async_views.item_detail, name='item_detail'),
+    path('search-ajax/', async_views.search_ajax, name='search_ajax'),
+    path('', include('marketplace.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTests(CatalogTestCase):
+    """The async views (async_views.py) under AsyncClient"""
+
+    async def test_pages_render(self):
+        item = self.items[1]
+        for url in ('/', '/items/', '/items/?search=calculus&sort=price', f'/item/{item.pk}/'):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(response, item.item_name)
+        self.assertEqual(response.context['item'].pk, item.pk)
+
+    async def test_cached_fragments_skip_their_queries(self):
+        await self.async_client.get('/')
+        with mock.patch.object(async_views, 'get_home_stats') as stats:
+            response = await self.async_client.get('/')
+        self.assertEqual(response.status_code, 200)
+        stats.assert_not_called()
+
+    def test_detail_within_budget(self):
+        async def get():
+            return await self.async_client.get(f'/item/{self.items[1].pk}/')
+
+        # Async ORM queries run in this thread, where they are captured
+        with CaptureAllQueries(['default']) as queries:
+            response = async_to_sync(get)()
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), query_budget('item_detail'))
+
+    async def test_detail_counts_the_view(self):
+        item = self.items[1]
+        await self.async_client.get(f'/item/{item.pk}/')
+        self.assertEqual(view_counter.pending(item.pk), 1)
+
+    async def test_mark_sold(self):
+        item = self.items[1]
+        response = await self.async_client.post(f'/item/{item.pk}/', {'mark_sold': '1'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue((await Item.objects.aget(pk=item.pk)).is_sold)
+
+    async def test_archived_items(self):
+        item = self.items[1]
+        await Item.objects.filter(pk=item.pk).aupdate(updated_at=timezone.now() - timedelta(days=400))
+        await sync_to_async(archive_due)()
+        response = await self.async_client.get(f'/item/{item.pk}/')
+        self.assertTemplateUsed(response, 'archived_item.html')
+        response = await self.async_client.get('/item/999999/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_search_ajax(self):
+        response = await self.async_client.get('/search-ajax/', {'q': 'calc stew'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 10)
+
+
+IMPORT_CSV = """item_name,item_type,author,course,price,condition,description,seller_name,contact_info,image
+Linear Algebra Done Right,book,Sheldon Axler,MATH 101,30.00,good,Clean copy,Frank,frank@university.edu,
+Free Notes,notes,,MATH 101,0,good,Week 1-6,Frank,frank@university.edu,
+Exam Notes,notes,,,12.50,fair,Week 1-6,Grace,no contact,
+Topology Workbook,book,,,10,good,Clean copy,Grace,555-0101,item_images/missing.jpg
+"""
+
+
+class TransferTests(CatalogTestCase):
+    """Bulk import and export of listings (transfer.py and the admin views)"""
+
+    def import_csv(self, text=IMPORT_CSV, **kwargs):
+        return import_items(read_rows(io.StringIO(text), 'csv'), **kwargs)
+
+    def test_csv_import_validates_each_row(self):
+        active = Course.objects.get(pk='math101').active_count
+        result = self.import_csv()
+        self.assertEqual((result.created, result.failed), (1, 3))
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5])
+        self.assertEqual(result.errors[0][1], 'price: Price must be greater than zero.')
+        self.assertEqual(result.errors[1][1], 'contact_info: Please enter a valid email address or phone number.')
+        self.assertEqual(result.errors[2][1], 'image: "item_images/missing.jpg" not found in media storage.')
+        item = Item.objects.get(item_name='Linear Algebra Done Right')
+        self.assertEqual((item.price, item.course_key_id, item.seller_name), (Decimal('30.00'), 'math101', 'Frank'))
+        self.assertTrue(ItemListing.objects.filter(pk=item.pk).exists())
+        self.assertEqual(Course.objects.get(pk='math101').active_count, active + 1)
+
+    def test_dry_run_saves_nothing(self):
+        count = Item.objects.count()
+        result = self.import_csv(dry_run=True)
+        self.assertEqual((result.created, result.failed), (1, 3))
+        self.assertEqual(Item.objects.count(), count)
+
+    def test_jsonl_import(self):
+        rows = [
+            json.dumps({'item_name': 'Graph Theory Notes', 'item_type': 'notes', 'price': '2.50', 'condition': 'excellent',
+                        'description': 'Typed up', 'seller_name': 'Heidi', 'contact_info': 'heidi@university.edu'}),
+            '{"item_name": "Broken',
+            '',
+            json.dumps(['not', 'an', 'object']),
+        ]
+        result = import_items(read_rows(io.StringIO('\n'.join(rows)), 'jsonl'))
+        self.assertEqual((result.created, result.failed), (1, 2))
+        self.assertEqual([line for line, _ in result.errors], [2, 4])
+        self.assertTrue(Item.objects.filter(item_name='Graph Theory Notes', is_sold=False).exists())
+
+    def test_export_round_trips(self):
+        queryset = Item.objects.filter(pk__in=[item.pk for item in self.items[:5]])
+        lines = list(export_lines(queryset, 'csv', chunk_size=2))
+        rows = list(csv.DictReader(io.StringIO(''.join(lines))))
+        self.assertEqual(list(rows[0]), EXPORT_FIELDS)
+        self.assertEqual([int(row['id']) for row in rows], [item.pk for item in self.items[:5]])
+        self.assertEqual(Decimal(rows[1]['price']), self.items[1].price)
+        records = [json.loads(line) for line in export_lines(queryset, 'jsonl')]
+        self.assertEqual([record['id'] for record in records], [item.pk for item in self.items[:5]])
+        self.assertEqual(records[0]['is_sold'], True)
+        # What was exported imports again
+        result = import_items(read_rows(io.StringIO(''.join(lines)), 'csv'))
+        self.assertEqual((result.created, result.failed), (5, 0))
+
+    def test_admin_import_and_export(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@university.edu', 'password'))
+        upload = SimpleUploadedFile('items.csv', IMPORT_CSV.encode())
+        response = self.client.post('/admin/marketplace/item/import/', {'file': upload, 'format': ''}, follow=True)
+        self.assertRedirects(response, '/admin/marketplace/item/')
+        messages = [str(message) for message in response.context['messages']]
+        self.assertIn('1 items imported, 3 rows rejected.', messages)
+        self.assertIn('Line 3: price: Price must be greater than zero.', messages)
+
+        response = self.client.post('/admin/marketplace/item/', {
+            'action': 'export_as_csv', '_selected_action': [self.items[1].pk, self.items[2].pk],
+        })
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="items.csv"')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([int(row['id']) for row in rows], [self.items[1].pk, self.items[2].pk])
+
+    def test_import_needs_add_permission(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get('/admin/marketplace/item/import/')
+        self.assertEqual(response.status_code, 403)
+
+
+class DimensionTests(CatalogTestCase):
+    """Course and Seller rows and their active counts (dimensions.py)"""
+
+    def create(self, **fields):
+        return Item.objects.create(**{
+            'item_name': 'Mechanics Notes', 'description': 'Typed up', 'price': 8,
+            'seller_name': 'Ivan', 'contact_info': 'ivan@university.edu', 'item_type': 'notes', **fields,
+        })
+
+    def counts(self):
+        run_pending()
+        return (
+            dict(Course.objects.filter(pk__in=['phys201', 'math101']).values_list('pk', 'active_count')),
+            dict(Seller.objects.filter(pk__in=['ivan petrov', 'ann']).values_list('pk', 'active_count')),
+        )
+
+    def assertCountsExact(self):
+        for model, field in ((Course, 'course_key'), (Seller, 'seller_key')):
+            active = Item.objects.filter(is_sold=False)
+            expected = {row.pk: active.filter(**{field: row.pk}).count() for row in model.objects.all()}
+            self.assertEqual(dict(model.objects.values_list('pk', 'active_count')), expected)
+
+    def test_keys(self):
+        self.assertEqual({dimensions.course_key(code) for code in ('MATH 101', 'math101', 'Math-101')}, {'math101'})
+        self.assertEqual(dimensions.seller_key('  Ivan   PETROV '), 'ivan petrov')
+        self.assertEqual((dimensions.course_key('  '), dimensions.seller_key(None)), (None, None))
+
+    def test_spellings_share_one_row(self):
+        first = self.create(course='Phys 201', seller_name='Ivan  Petrov')
+        second = self.create(course='PHYS-201', seller_name='ivan petrov')
+        self.assertEqual((first.course_key_id, second.course_key_id), ('phys201', 'phys201'))
+        self.assertEqual(Course.objects.get(pk='phys201').code, 'Phys 201')
+        self.assertEqual(Seller.objects.get(pk='ivan petrov').name, 'Ivan Petrov')
+        self.assertEqual(self.counts()[0]['phys201'], 2)
+        self.assertFalse(self.create(course='').course_key_id)
+
+    def test_counts_follow_saves(self):
+        courses, sellers = self.counts()
+        math, ann = courses['math101'], sellers['ann']
+        item = self.create(course='PHYS 201', seller_name='Ivan Petrov')
+        self.assertEqual(self.counts(), ({'phys201': 1, 'math101': math}, {'ivan petrov': 1, 'ann': ann}))
+        item.course = 'MATH 101'
+        item.save()
+        self.assertEqual(self.counts()[0], {'phys201': 0, 'math101': math + 1})
+        item.is_sold = True
+        item.save()
+        self.assertEqual(self.counts(), ({'phys201': 0, 'math101': math}, {'ivan petrov': 0, 'ann': ann}))
+        item.is_sold = False
+        item.seller_name = 'Ann'
+        item.save()
+        self.assertEqual(self.counts(), ({'phys201': 0, 'math101': math + 1}, {'ivan petrov': 0, 'ann': ann + 1}))
+        item.delete()
+        self.assertEqual(self.counts(), ({'phys201': 0, 'math101': math}, {'ivan petrov': 0, 'ann': ann}))
+        self.assertCountsExact()
+
+    def test_recount_repairs_bulk_updates(self):
+        pks = [item.pk for item in self.items if not item.is_sold][:7]
+        Item.objects.filter(pk__in=pks).update(is_sold=True)
+        dimensions.items_changed(pks)
+        self.assertCountsExact()
+        Course.objects.update(active_count=0)
+        dimensions.recount()
+        self.assertCountsExact()
+
+
+class ConditionalGetTests(CatalogTestCase):
+    """ETag and Last-Modified revalidation (conditional.py)"""
+
+    def revalidate(self, url, response, **params):
+        with CaptureAllQueries(['default']) as queries:
+            again = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+        return again, len(queries)
+
+    def test_listing(self):
+        response = self.client.get('/items/', {'search': 'calculus'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        again, queries = self.revalidate('/items/', response, search='calculus')
+        self.assertEqual((again.status_code, queries), (304, 0))
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertEqual(self.client.get('/items/', {'search': 'algorithms'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        item = Item.objects.get(pk=self.items[1].pk)
+        item.price = 40
+        item.save()
+        self.assertEqual(self.revalidate('/items/', response, search='calculus')[0].status_code, 200)
+
+    def test_view_ordered_listing_has_no_last_modified(self):
+        response = self.client.get('/items/', {'sort': '-view_count'})
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.revalidate('/items/', response, sort='-view_count')[0].status_code, 304)
+
+    def test_detail_follows_the_items_it_shows(self):
+        item = self.items[1]
+        url = f'/item/{item.pk}/'
+        response = self.client.get(url)
+        shown = set(page_items(item.pk).values_list('pk', flat=True)) - {item.pk}
+        self.assertTrue(shown)
+        again, queries = self.revalidate(url, response)
+        self.assertEqual((again.status_code, queries), (304, 1))
+        # A 304 still counts as a view
+        self.assertEqual(view_counter.pending(item.pk), 2)
+        # So does If-Modified-Since alone
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        elsewhere = Item.objects.exclude(pk__in={item.pk, *shown}).filter(is_sold=False).exclude(seller_name=item.seller_name)[0]
+        elsewhere.price = 40
+        elsewhere.save()
+        run_pending()
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 304)
+
+        related = Item.objects.get(pk=min(shown))
+        related.price = 41
+        related.save()
+        self.assertEqual(self.revalidate(url, response)[0].status_code, 200)
+
+    def test_pending_messages_are_shown(self):
+        response = self.client.get('/items/')
+        self.client.post(f'/item/{self.items[1].pk}/', {'mark_sold': '1'})
+        again = self.client.get('/items/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertContains(again, 'has been marked as sold')
+
+    def test_search_ajax(self):
+        response = self.client.get('/search-ajax/', {'q': 'calc'})
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn(f'max-age={settings.AUTOCOMPLETE_MAX_AGE}', response['Cache-Control'])
+        again, queries = self.revalidate('/search-ajax/', response, q='calc')
+        self.assertEqual((again.status_code, queries), (304, 0))
+        self.assertEqual(self.revalidate('/search-ajax/', response, q='algo')[0].status_code, 200)
+
+
+class MediaTests(MediaTestCase):
+    """Serving uploaded photos with validators and byte ranges (media.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.content = photo((300, 200))
+        self.url = self.add_photo(self.items[1], self.content).image.url
+
+    def get(self, range_header=None, **headers):
+        if range_header:
+            headers['HTTP_RANGE'] = range_header
+        response = self.client.get(self.url, **headers)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.content))
+        self.assertEqual((response['Content-Type'], response['Accept-Ranges']), ('image/jpeg', 'bytes'))
+        self.assertIn(f'max-age={settings.MEDIA_MAX_AGE}', response['Cache-Control'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_ranges(self):
+        size = len(self.content)
+        for header, (start, end) in [
+            ('bytes=0-99', (0, 99)), ('bytes=100-', (100, size - 1)),
+            ('bytes=-10', (size - 10, size - 1)), (f'bytes=10-{size + 50}', (10, size - 1)),
+        ]:
+            with self.subTest(header):
+                response, body = self.get(header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+                self.assertEqual(body, self.content[start:end + 1])
+
+    def test_unsatisfiable_and_unsupported_ranges(self):
+        size = len(self.content)
+        response, _ = self.get(f'bytes={size}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{size}'))
+        # Multiple or malformed ranges get the whole file
+        for header in ('bytes=0-1,5-6', 'items=0-5', 'bytes=-'):
+            with self.subTest(header):
+                response, body = self.get(header)
+                self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_if_range(self):
+        etag = self.get()[0]['ETag']
+        self.assertEqual(self.get('bytes=0-9', HTTP_IF_RANGE=etag)[0].status_code, 206)
+        # The client's copy is out of date: send the whole file
+        response, body = self.get('bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_files_outside_media_root_are_not_found(self):
+        for url in ('/media/../book_exchange/settings.py', '/media/item_images/missing.jpg', '/media/'):
+            with self.subTest(url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class FacetTests(CatalogTestCase):
+    """Facet counts for the listing filters (facets.py)"""
+
+    FIELDS = {'type': 'item_type', 'condition': 'condition', 'course': 'course_key'}
+
+    def expected(self, filters):
+        """Counts from one query per facet, each ignoring its own selection"""
+        counts = {}
+        for facet in FACETS:
+            items = ItemListing.objects.all()
+            if filters.get('search'):
+                items = search_items(items, filters['search'])
+            for other, value in filters.items():
+                if other == facet or other == 'search':
+                    continue
+                items = items.filter(price_range(value)) if other == 'price' else items.filter(**{self.FIELDS[other]: value})
+            if facet == 'price':
+                counts[facet] = {key: items.filter(price_range(key)).count() for key in PRICE_BUCKETS}
+            else:
+                values = items.values_list(self.FIELDS[facet], flat=True)
+                counts[facet] = {value: list(values).count(value) for value in set(values) if value is not None}
+        return self.nonzero(counts)
+
+    def nonzero(self, counts):
+        # Empty buckets may or may not be listed; the form shows them as 0
+        return {facet: {value: count for value, count in values.items() if count} for facet, values in counts.items()}
+
+    def counts(self, filters):
+        return self.nonzero(facet_counts(filters))
+
+    def test_counts_ignore_their_own_selection(self):
+        for filters in [
+            {}, {'type': 'book'}, {'type': 'notes', 'price': '10-25'}, {'search': 'calculus', 'condition': 'good'},
+            {'course': 'math101', 'price': '25-50'}, {'type': 'book', 'condition': 'fair', 'course': 'cs201'},
+        ]:
+            with self.subTest(filters):
+                self.assertEqual(self.counts(filters), self.expected(filters))
+
+    def test_price_bucket_bounds(self):
+        Item.objects.filter(pk=self.items[1].pk).update(price=Decimal('9.99'))
+        Item.objects.filter(pk=self.items[3].pk).update(price=Decimal('10.00'))
+        ItemListing.objects.filter(pk=self.items[1].pk).update(price=Decimal('9.99'))
+        ItemListing.objects.filter(pk=self.items[3].pk).update(price=Decimal('10.00'))
+        bump_catalog_generation()
+        self.assertEqual(self.counts({'type': '', 'price': '0-10'}), self.expected({'price': '0-10'}))
+        pks = set(ItemListing.objects.filter(price_range('0-10')).values_list('pk', flat=True))
+        self.assertIn(self.items[1].pk, pks)
+        self.assertNotIn(self.items[3].pk, pks)
+
+    def test_listing_shows_counts_and_follows_saves(self):
+        response = self.client.get('/items/', {'type': 'book'})
+        counts = {value: count for value, _, count in response.context['facets']['type']}
+        self.assertEqual(counts, {'book': self.expected({})['type']['book'], 'notes': self.expected({})['type']['notes']})
+        with CaptureAllQueries(['default']) as queries:
+            facet_counts({'type': 'book'})
+        self.assertEqual(len(queries), 0)
+        Item.objects.create(
+            item_name='Quantum Notes', description='Typed up', price=12, seller_name='Ivan',
+            contact_info='ivan@university.edu', item_type='notes', course='PHYS 110',
+        )
+        run_pending()
+        self.assertEqual(self.counts({'type': 'book'}), self.expected({'type': 'book'}))
+
+
+class PhotoUploadTests(MediaTestCase):
+    """Streamed photo uploads and their validation (uploads.py, forms.PhotoField)"""
+
+    def setUp(self):
+        super().setUp()
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        self.upload_dir = upload_dir.name
+        upload_settings = override_settings(UPLOAD_TEMP_DIR=self.upload_dir)
+        upload_settings.enable()
+        self.addCleanup(upload_settings.disable)
+
+    def post(self, content, name='photo.jpg'):
+        count = Item.objects.count()
+        response = self.client.post('/post/', {
+            'item_name': 'Organic Chemistry', 'item_type': 'book', 'price': '25', 'condition': 'good',
+            'description': 'Some notes in the margins', 'seller_name': 'Judy', 'contact_info': 'judy@university.edu',
+            'image': SimpleUploadedFile(name, content),
+        })
+        # Nothing is left behind in the temporary directory either way
+        self.assertEqual(os.listdir(self.upload_dir), [])
+        return response, Item.objects.count() - count
+
+    def assertRejected(self, content, message, name='photo.jpg'):
+        response, created = self.post(content, name)
+        self.assertEqual((response.status_code, created), (200, 0))
+        self.assertIn(message, ' '.join(response.context['form'].errors['image']))
+
+    def test_photo_is_saved(self):
+        response, created = self.post(photo((640, 480), image_format='PNG'), 'scan.png')
+        self.assertEqual((response.status_code, created), (302, 1))
+        item = Item.objects.latest('pk')
+        self.assertTrue(default_storage.exists(item.image.name))
+        with default_storage.open(item.image.name) as saved:
+            self.assertEqual(Image.open(saved).size, (640, 480))
+
+    @override_settings(MAX_PHOTO_UPLOAD_SIZE=2000)
+    def test_oversized_photos_are_rejected(self):
+        self.assertRejected(photo(), 'Photos can be at most 2.0')
+
+    @override_settings(MAX_PHOTO_PIXELS=1_000_000)
+    def test_photos_with_too_many_pixels_are_rejected(self):
+        self.assertRejected(photo((1600, 1200)), 'Photos can be at most 1 megapixels.')
+
+    def test_other_files_are_rejected(self):
+        self.assertRejected(b'%PDF-1.4 not a photo', 'Upload a valid image.', 'notes.pdf')
+        self.assertRejected(photo((64, 64), image_format='BMP'), 'Upload a JPEG, PNG, WebP or GIF photo.', 'photo.bmp')
+
+
+class AdminActionTests(CatalogTestCase):
+    """Bulk actions and the performance mode of the item changelist (admin.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@university.edu', 'password'))
+
+    def act(self, action, pks):
+        return self.client.post('/admin/marketplace/item/', {'action': action, '_selected_action': pks}, follow=True)
+
+    @override_settings(ADMIN_ACTION_CHUNK_SIZE=7)
+    def test_actions_commit_in_chunks(self):
+        pks = [item.pk for item in self.items if not item.is_sold][:20]
+        math = Course.objects.get(pk='math101').active_count
+        on_math = Item.objects.filter(pk__in=pks, course_key='math101').count()
+        with mock.patch('marketplace.admin.listings.refresh', wraps=listings.refresh) as refresh, \
+                mock.patch('marketplace.admin.bump_catalog_generation') as bump:
+            response = self.act('mark_as_sold', pks)
+        self.assertEqual([len(call.args[0]) for call in refresh.call_args_list], [7, 7, 6])
+        self.assertEqual(bump.call_count, 1)
+        self.assertIn('20 items marked as sold.', [str(message) for message in response.context['messages']])
+        self.assertEqual(Item.objects.filter(pk__in=pks, is_sold=True).count(), 20)
+        self.assertFalse(ItemListing.objects.filter(pk__in=pks).exists())
+        self.assertEqual(Course.objects.get(pk='math101').active_count, math - on_math)
+
+        self.act('mark_as_available', pks)
+        self.assertEqual(ItemListing.objects.filter(pk__in=pks).count(), 20)
+        self.assertEqual(Course.objects.get(pk='math101').active_count, math)
+
+    def test_failed_chunk_keeps_earlier_chunks(self):
+        pks = [item.pk for item in self.items if not item.is_sold][:10]
+        calls, refresh = [], listings.refresh
+
+        def refresh_once(chunk):
+            calls.append(chunk)
+            if len(calls) > 1:
+                raise RuntimeError
+            refresh(chunk)
+
+        with override_settings(ADMIN_ACTION_CHUNK_SIZE=4), \
+                mock.patch('marketplace.admin.listings.refresh', side_effect=refresh_once):
+            with self.assertRaises(RuntimeError):
+                self.act('mark_as_sold', pks)
+        sold = Item.objects.filter(pk__in=pks, is_sold=True)
+        self.assertEqual(sold.count(), 4)
+        # Those committed are consistent with their derived rows
+        self.assertFalse(ItemListing.objects.filter(pk__in=sold.values('pk')).exists())
+
+    @override_settings(ADMIN_PERFORMANCE_MODE=True)
+    def test_changelist_in_performance_mode(self):
+        response = self.client.get('/admin/marketplace/item/', {'q': 'calculus'})
+        self.assertEqual(response.status_code, 200)
+        changelist = response.context['cl']
+        self.assertIsNone(changelist.date_hierarchy)
+        self.assertEqual(changelist.result_count, sum(1 for item in self.items if 'Calculus' in item.item_name))
+
+
+@skipUnless('replica' in settings.DATABASES, 'Needs the read alias (DB_READ_CONNECTION or POSTGRES_REPLICA_HOST).')
+@override_settings(READ_DATABASE='replica')
+class RouterTests(TestCase):
+    """The read/write split of routers.py"""
+
+    router = ReadReplicaRouter()
+
+    def test_reads_outside_a_transaction_use_the_read_alias(self):
+        # The test case's own transaction is open on 'default'
+        connection.in_atomic_block, in_atomic_block = False, connection.in_atomic_block
+        try:
+            self.assertEqual(self.router.db_for_read(Item), 'replica')
+            self.assertIsNone(self.router.db_for_read(Task))
+            self.assertIsNone(self.router.db_for_read(User))
+        finally:
+            connection.in_atomic_block = in_atomic_block
+
+    def test_reads_inside_a_transaction_stay_on_default(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Item), 'default')
+
+    def test_writes_and_migrations_use_default(self):
+        self.assertEqual(self.router.db_for_write(Item), 'default')
+        self.assertIsNone(self.router.db_for_write(User))
+        self.assertFalse(self.router.allow_migrate('replica', 'marketplace'))
+        self.assertIsNone(self.router.allow_migrate('default', 'marketplace'))
+
+    @override_settings(READ_DATABASE='missing')
+    def test_unknown_read_alias_is_ignored(self):
+        self.assertIsNone(self.router.db_for_read(Item))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+class SqlitePragmaTests(SimpleTestCase):
+    """What sqlite.configure_connection sets on a database file"""
+
+    def open(self, alias='default'):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'db.sqlite3')
+        wrapper = type(connections['default'])({**connection.settings_dict, 'NAME': path}, alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={**settings.SQLITE_PRAGMAS, 'journal_mode': 'wal'})
+    def test_pragmas_are_applied(self):
+        wrapper = self.open()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(wrapper, 'query_only'), 0)
+
+    def test_journal_mode_is_left_alone_without_one(self):
+        pragmas = {name: value for name, value in settings.SQLITE_PRAGMAS.items() if name != 'journal_mode'}
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            self.assertEqual(self.pragma(self.open(), 'journal_mode'), 'delete')
+
+    @skipUnless('SQLITE_PATH' not in os.environ and 'SQLITE_JOURNAL_MODE' not in os.environ, 'Database named by the environment')
+    def test_tracked_database_keeps_its_journal_mode(self):
+        self.assertNotIn('journal_mode', settings.SQLITE_PRAGMAS)
+
+    @override_settings(READ_DATABASE='replica')
+    def test_read_alias_is_query_only(self):
+        wrapper = self.open('replica')
+        self.assertEqual(self.pragma(wrapper, 'query_only'), 1)
+        with self.assertRaises(OperationalError):
+            with wrapper.cursor() as cursor:
+                cursor.execute('CREATE TABLE written (id integer)')
+
+
+class ProfilingTests(CatalogTestCase):
+    """The per-request log lines of QueryProfilingMiddleware"""
+
+    def profile_records(self, url):
+        with self.assertLogs('marketplace.profiling', 'DEBUG') as logs:
+            self.client.get(url)
+        return [(record.levelno, json.loads(record.getMessage())) for record in logs.records]
+
+    def test_requests_are_logged_at_debug(self):
+        [(level, line)] = self.profile_records('/items/')
+        self.assertEqual(level, logging.DEBUG)
+        self.assertEqual(line['view'], 'all_items')
+        self.assertGreater(line['template_ms'], 0)
+
+    @override_settings(QUERY_BUDGETS={'all_items': 0})
+    def test_requests_over_budget_are_warnings(self):
+        [(level, line)] = self.profile_records('/items/')
+        self.assertEqual(level, logging.WARNING)
+        self.assertEqual(line['budget'], 0)
+
+
+class ListingTests(CatalogTestCase):
+    """The ItemListing projection (listings.py)"""
+
+    def test_saving_a_stale_instance_keeps_the_counters(self):
+        item = Item.objects.get(pk=self.items[1].pk)
+        view_counter.increment(item.pk, 7)
+        view_counter.flush()
+        item.price = 99
+        item.save()
+        run_pending()
+        listing = ItemListing.objects.get(pk=item.pk)
+        self.assertEqual(listing.price, 99)
+        self.assertEqual(listing.view_count, 7)
+        self.assertGreater(listing.trending_score, 0)
+        item.refresh_from_db()
+        self.assertEqual((item.view_count, item.trending_score), (listing.view_count, listing.trending_score))
+
+    def test_sold_items_have_no_row(self):
+        item = self.items[1]
+        item.is_sold = True
+        item.save()
+        run_pending()
+        self.assertFalse(ItemListing.objects.filter(pk=item.pk).exists())
+        item.is_sold = False
+        item.save()
+        run_pending()
+        self.assertTrue(ItemListing.objects.filter(pk=item.pk).exists())
+
+
+class ArchiveTests(CatalogTestCase):
+    """Moving stale and sold items to ArchivedItem (archive.py)"""
+
+    def test_batch_is_recounted_once_without_queued_tasks(self):
+        stale = [item.pk for item in self.items if not item.is_sold and item.course == 'MATH 101']
+        Item.objects.filter(pk__in=stale).update(updated_at=timezone.now() - timedelta(days=400))
+        active = Course.objects.get(pk='math101').active_count
+        with mock.patch.object(signals, 'bump_catalog_generation', wraps=signals.bump_catalog_generation) as bump:
+            self.assertEqual(archive_due(batch_size=100), {'stale': len(stale)})
+        self.assertEqual(bump.call_count, 1)
+        self.assertFalse(Task.objects.filter(name='item_changes', status='pending').exists())
+        self.assertEqual(Course.objects.get(pk='math101').active_count, active - len(stale))
+        self.assertEqual(set(ArchivedItem.objects.values_list('pk', flat=True)), set(stale))
+        self.assertFalse(ItemListing.objects.filter(pk__in=stale).exists())
+
+
+class SearchTests(CatalogTestCase):
+    """Full-text search, on whichever database the suite runs against"""
+
+    def search(self, query):
+        return set(search_items(ItemListing.objects.all(), query).values_list('pk', flat=True))
+
+    def test_prefix_terms_match_across_fields(self):
+        expected = {item.pk for item in self.items if not item.is_sold and item.item_name.startswith('Calculus')}
+        self.assertEqual(self.search('calc stew'), expected)
+        self.assertEqual(self.search('calc cormen'), set())
+
+    def test_edits_are_indexed(self):
+        item = next(item for item in self.items if not item.is_sold)
+        item.item_name = 'Organic Chemistry'
+        item.save()
+        self.assertEqual(self.search('organic chem'), {item.pk})
+
+    def test_results_can_be_ordered_by_rank(self):
+        results = search_items(ItemListing.objects.all(), 'calculus').order_by('search_rank', '-pk')
+        expected = {item.pk for item in self.items if not item.is_sold and item.item_name.startswith('Calculus')}
+        self.assertEqual({result.pk for result in results}, expected)
+
+    def test_queries_without_words_find_nothing(self):
+        for query in ['"', '+', '*:']:
+            with self.subTest(query=query):
+                results = search_items(ItemListing.objects.all(), query).order_by('search_rank', '-pk')
+                self.assertEqual(list(results), [])
+        for url in ['/items/?search="', '/api/items/?search=%2B', '/items/?search=%2B&sort=relevance']:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Set DATABASE_ENGINE=postgresql to test the PostgreSQL search path.')
+class PostgresSearchTests(CatalogTestCase):
+    """The tsvector and pg_trgm path of search.py (migration 0008)"""
+
+    def test_uses_the_search_vector(self):
+        self.assertEqual(search_backend(), 'postgres')
+        queryset = search_items(ItemListing.objects.all(), 'calc')
+        self.assertIn('search_vector @@ to_tsquery', str(queryset.query))
+
+    def test_search_vector_follows_edits(self):
+        item = next(item for item in self.items if not item.is_sold)
+        Item.objects.filter(pk=item.pk).update(description='Includes the solutions manual')
+        self.assertIn(item.pk, set(search_items(Item.objects.all(), 'solution').values_list('pk', flat=True)))
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, Item._meta.db_table)
+        self.assertIn('marketplace_item_search_idx', indexes)
+        self.assertIn('marketplace_item_name_trgm_idx', indexes)
+
+    def test_title_search_uses_icontains(self):
+        queryset = search_items(Item.objects.filter(is_sold=False), 'lculus', fields=['item_name'])
+        expected = {item.pk for item in self.items if not item.is_sold and item.item_name.startswith('Calculus')}
+        self.assertEqual(set(queryset.values_list('pk', flat=True)), expected)
+
+
+class TrendingTests(CatalogTestCase):
+    """Forward-decayed trending scores (trending.py)"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def flush(self, views, hours_ago=0):
+        """Count {item: views} as if flushed ``hours_ago`` hours before now"""
+        for item, count in views.items():
+            view_counter.increment(item.pk, count)
+        with mock.patch('django.utils.timezone.now', return_value=self.now - timedelta(hours=hours_ago)):
+            view_counter.flush()
+
+    def scores(self):
+        return (
+            dict(Item.objects.exclude(trending_score=0).values_list('pk', 'trending_score')),
+            dict(ItemListing.objects.exclude(trending_score=0).values_list('pk', 'trending_score')),
+            dict(Course.objects.exclude(trending_score=0).values_list('pk', 'trending_score')),
+        )
+
+    def assertScoresAlmostEqual(self, first, second):
+        for expected, actual in zip(first, second):
+            self.assertEqual(set(expected), set(actual))
+            for key in expected:
+                self.assertAlmostEqual(expected[key], actual[key], places=6)
+
+    def test_weights_double_every_half_life(self):
+        one = trending.log_weight(1, trending.EPOCH)
+        self.assertEqual(one, 0)
+        self.assertEqual(trending.log_weight(4, trending.EPOCH), 2)
+        self.assertAlmostEqual(trending.log_weight(1, trending.EPOCH + trending.half_life()), one + 1)
+        self.assertAlmostEqual(trending.log_sum([3, 5]), math.log2(1 + 2 ** 3 + 2 ** 5))
+        self.assertEqual(trending.log_sum([]), 0)
+
+    def test_scores_are_added_in_log_space(self):
+        course = Course.objects.get(pk='math101')
+        for score, weight in [(3, 5), (5, 3), (2000, 2001.5)]:
+            with self.subTest(score=score, weight=weight):
+                Course.objects.filter(pk=course.pk).update(trending_score=score)
+                Course.objects.filter(pk=course.pk).update(trending_score=trending.add_to_score(weight))
+                course.refresh_from_db()
+                top = max(score, weight)
+                self.assertAlmostEqual(course.trending_score, top + math.log2(2 ** (score - top) + 2 ** (weight - top)))
+
+    def test_recent_views_outrank_older_ones(self):
+        older, recent = self.items[1], self.items[2]
+        # 16 views three half-lives ago weigh as 2 views now
+        self.flush({older: 16}, hours_ago=72)
+        self.flush({recent: 3})
+        self.assertEqual([listing.pk for listing in trending.trending_items()], [recent.pk, older.pk])
+        self.assertEqual([course.pk for course in trending.trending_courses()], [recent.course_key_id, older.course_key_id])
+        self.flush({older: 2})
+        self.assertEqual([listing.pk for listing in trending.trending_items()], [older.pk, recent.pk])
+
+    def test_sold_items_and_empty_courses_are_left_out(self):
+        self.flush({self.items[1]: 5, self.items[2]: 3})
+        item = Item.objects.get(pk=self.items[1].pk)
+        item.is_sold = True
+        item.save()
+        run_pending()
+        self.assertEqual([listing.pk for listing in trending.trending_items()], [self.items[2].pk])
+        Course.objects.filter(pk=item.course_key_id).update(active_count=0)
+        self.assertNotIn(item.course_key_id, [course.pk for course in trending.trending_courses()])
+
+    def test_rebuild_matches_the_flushed_scores(self):
+        self.flush({self.items[1]: 4, self.items[2]: 1}, hours_ago=30)
+        self.flush({self.items[1]: 1, self.items[3]: 7}, hours_ago=5)
+        self.flush({self.items[2]: 2})
+        flushed = self.scores()
+        self.assertEqual(ViewBucket.objects.count(), 5)
+        self.assertEqual(trending.rebuild(), 3)
+        self.assertScoresAlmostEqual(flushed, self.scores())
+
+    def test_old_buckets_are_purged(self):
+        self.flush({self.items[1]: 2}, hours_ago=24 * (settings.TRENDING_BUCKET_RETENTION_DAYS + 1))
+        self.flush({self.items[1]: 1})
+        self.assertEqual(list(ViewBucket.objects.values_list('hour', flat=True)), [self.now])
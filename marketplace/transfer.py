@@ -0,0 +1,169 @@
+"""Bulk import and streaming export of listings as CSV or JSONL.
+
+Imports read the file row by row, validate each row with ItemForm (so the
+same price and contact rules apply as on the post page) and insert valid
+rows with bulk_create in batches. bulk_create skips Item.save(), so photo
+renditions and recommendations are queued as tasks for the whole batch, and
+course/seller counts, listing rows and caches are brought up to date once
+per batch.
+
+Exports iterate the queryset in chunks and yield encoded lines, so memory
+stays flat however many rows are written.
+"""
+import csv
+import io
+import json
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import dimensions, listings
+from .caching import bump_catalog_generation
+from .forms import ItemForm
+from .images import enqueue_image_jobs
+from .models import Item
+from .recommendations import items_changed
+
+FORMATS = ['csv', 'jsonl']
+IMPORT_FIELDS = [name for name in ItemForm.Meta.fields if name != 'image']
+EXPORT_FIELDS = [
+    'id', 'item_name', 'item_type', 'author', 'course', 'price', 'condition',
+    'description', 'seller_name', 'contact_info', 'image', 'date_posted', 'updated_at', 'is_sold', 'view_count',
+]
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportRowForm(ItemForm):
+    """ItemForm's rules without the photo field or styled widgets (cheaper per row)"""
+
+    class Meta(ItemForm.Meta):
+        fields = IMPORT_FIELDS
+        widgets = {}
+
+
+def guess_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(handle, file_format):
+    """Yield (line number, row dict) from a text file handle"""
+    if file_format == 'csv':
+        reader = csv.DictReader(handle)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(handle, start=1):
+        line = line.strip()
+        if line:
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                row = exc
+            yield number, row
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []  # first MAX_REPORTED_ERRORS (line, message) pairs
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def build_item(row):
+    """Validate one row with ItemForm; returns (item, None) or (None, error message)"""
+    if not isinstance(row, dict):
+        return None, f'Invalid row: {row}'
+    data = {name: row.get(name) or '' for name in IMPORT_FIELDS}
+    form = ImportRowForm(data)
+    if not form.is_valid():
+        messages = [f'{field}: {" ".join(errors)}' for field, errors in form.errors.items()]
+        return None, '; '.join(messages)
+    item = form.save(commit=False)
+    image = (row.get('image') or '').strip()
+    if image:
+        # Photos are referenced by their path in media storage
+        if not default_storage.exists(image):
+            return None, f'image: "{image}" not found in media storage.'
+        item.image.name = image
+    return item, None
+
+
+def import_items(rows, batch_size=1000, dry_run=False, start_tasks=True,
+                 refresh_recommendations=True, progress=None):
+    """Validate and insert (line, row) pairs in batches; returns an ImportResult"""
+    result = ImportResult()
+    batch = []
+
+    def flush():
+        if not dry_run:
+            save_batch(batch, start_tasks, refresh_recommendations)
+        result.created += len(batch)
+        batch.clear()
+        if progress:
+            progress(result)
+
+    for line, row in rows:
+        item, error = build_item(row)
+        if error:
+            result.add_error(line, error)
+            continue
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return result
+
+
+def save_batch(items, start_tasks=True, refresh_recommendations=True):
+    with transaction.atomic():
+        dimensions.assign_keys(items)
+        created = Item.objects.bulk_create(items)
+        enqueue_image_jobs([item for item in created if item.image], start=start_tasks)
+    dimensions.recount({item.course_key_id for item in created}, {item.seller_key_id for item in created})
+    listings.refresh([item.pk for item in created])
+    bump_catalog_generation()
+    if refresh_recommendations:
+        items_changed([item.pk for item in created], start=start_tasks)
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def _export_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def export_lines(queryset, file_format='csv', chunk_size=2000):
+    """Yield the rows of ``queryset`` as CSV or JSONL lines, header first"""
+    rows = queryset.order_by('pk').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow([_export_value(value) for value in row])
+    else:
+        for row in rows:
+            record = dict(zip(EXPORT_FIELDS, row))
+            for field in ('price', 'date_posted', 'updated_at'):
+                record[field] = _export_value(record[field])
+            yield json.dumps(record) + '\n'
+
+
+def text_stream(uploaded_file):
+    """Text handle over an uploaded file, decoded as it is read"""
+    uploaded_file.seek(0)
+    return io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
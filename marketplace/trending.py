@@ -0,0 +1,143 @@
+"""Trending items and courses from time-decayed view counts.
+
+Each flush of the view counter (counters.py) adds its views to:
+
+- ViewBucket, one row of views per item and hour, kept for
+  TRENDING_BUCKET_RETENTION_DAYS.
+- A forward-decayed trending score on Item, ItemListing and Course.
+
+A view at time t weighs 2 ** ((t - EPOCH) / TRENDING_HALF_LIFE_HOURS), so
+it counts twice as much as one seen a half-life earlier. Scoring every view
+against the same fixed EPOCH ranks exactly like decaying all scores as time
+passes, but nothing has to be rescanned: a flush only adds to the scores of
+the items it saw. Scores are stored as log2 of that sum, which grows by one
+per half-life instead of overflowing, and are added to with a log-sum-exp
+expression in the UPDATE itself. The default 0 stands for one view at
+EPOCH, which has long since decayed to nothing.
+
+The 'trending' listing sort and the homepage read ItemListing and Course
+through their trending_score indexes. ``manage.py rebuild_trending``
+recomputes the scores from the hourly buckets, e.g. after changing the
+half-life.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Greatest, Log, Power
+from django.utils import timezone
+
+EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+# Homepage section sizes
+TRENDING_ITEMS = 6
+TRENDING_COURSES = 5
+
+_last_purge = None
+
+
+def half_life():
+    return timedelta(hours=getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24))
+
+
+def log_weight(views, when):
+    """log2 of the forward-decayed weight of ``views`` views at ``when``"""
+    return math.log2(views) + (when - EPOCH) / half_life()
+
+
+def add_to_score(weight, field='trending_score'):
+    """Expression for log2(2 ** field + 2 ** weight), without leaving log space"""
+    score = F(field)
+    weight = Value(weight, output_field=FloatField())
+    return Greatest(score, weight) + Log(2, Value(1.0) + Power(2, -Abs(score - weight)))
+
+
+def record_views(counts, now=None):
+    """Add {item pk: views} to the hourly buckets and course scores.
+
+    Item and ItemListing scores are updated by the caller's own UPDATEs, with
+    add_to_score(). Run inside the flush transaction.
+    """
+    from .models import Course, Item, ViewBucket
+
+    now = now or timezone.now()
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    # Items archived or deleted since they were viewed are skipped
+    course_keys = dict(Item.objects.filter(pk__in=list(counts)).values_list('pk', 'course_key'))
+    ViewBucket.objects.bulk_create(
+        [ViewBucket(item_id=pk, hour=hour) for pk in course_keys], ignore_conflicts=True, batch_size=500,
+    )
+    by_views = defaultdict(list)
+    for pk in course_keys:
+        by_views[counts[pk]].append(pk)
+    for views, pks in by_views.items():
+        ViewBucket.objects.filter(item__in=pks, hour=hour).update(views=F('views') + views)
+
+    course_views = Counter()
+    for pk, course in course_keys.items():
+        if course:
+            course_views[course] += counts[pk]
+    by_views = defaultdict(list)
+    for course, views in course_views.items():
+        by_views[views].append(course)
+    for views, courses in by_views.items():
+        Course.objects.filter(pk__in=courses).update(trending_score=add_to_score(log_weight(views, now)))
+
+    global _last_purge
+    if _last_purge != hour:
+        _last_purge = hour
+        purge_buckets(now)
+
+
+def purge_buckets(now=None):
+    """Drop hourly buckets older than TRENDING_BUCKET_RETENTION_DAYS"""
+    from .models import ViewBucket
+
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=getattr(settings, 'TRENDING_BUCKET_RETENTION_DAYS', 30))
+    ViewBucket.objects.filter(hour__lt=cutoff).delete()
+
+
+def trending_items(limit=TRENDING_ITEMS):
+    """Listing rows of the unsold items with the highest trending scores"""
+    from .models import ItemListing
+
+    return ItemListing.objects.filter(trending_score__gt=0).order_by('-trending_score')[:limit]
+
+
+def trending_courses(limit=TRENDING_COURSES):
+    """Courses with unsold items, highest trending score first"""
+    from .models import Course
+
+    return Course.objects.filter(trending_score__gt=0, active_count__gt=0).order_by('-trending_score')[:limit]
+
+
+def rebuild():
+    """Recompute every score from the hourly buckets; returns how many items have one"""
+    from .models import Course, Item, ItemListing, ViewBucket
+
+    items = defaultdict(list)
+    for pk, hour, views in ViewBucket.objects.values_list('item', 'hour', 'views').iterator(chunk_size=5000):
+        items[pk].append(log_weight(views, hour))
+    courses = defaultdict(list)
+    for pk, course in Item.objects.filter(pk__in=list(items)).values_list('pk', 'course_key').iterator(chunk_size=5000):
+        if course:
+            courses[course].extend(items[pk])
+
+    with transaction.atomic():
+        for model in (Item, ItemListing, Course):
+            model.objects.exclude(trending_score=0).update(trending_score=0)
+        for model, scores in ((Item, items), (ItemListing, items), (Course, courses)):
+            rows = [model(pk=pk, trending_score=log_sum(weights)) for pk, weights in scores.items()]
+            model.objects.bulk_update(rows, ['trending_score'], batch_size=500)
+    return len(items)
+
+
+def log_sum(weights):
+    """log2(1 + sum(2 ** w)): the stored score for views with these log weights"""
+    top = max(weights, default=0.0)
+    top = max(top, 0.0)
+    return top + math.log2(2 ** -top + sum(2 ** (weight - top) for weight in weights))
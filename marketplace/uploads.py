@@ -0,0 +1,81 @@
+"""Streaming ingestion of item photo uploads.
+
+PhotoUploadHandler (first in FILE_UPLOAD_HANDLERS) writes the photo fields
+of a multipart request straight to a temporary file in UPLOAD_TEMP_DIR as
+the chunks arrive, whatever their size, and stops writing once a file
+passes MAX_PHOTO_UPLOAD_SIZE. An oversized photo comes through as an
+OversizedUpload, which PhotoField (forms.py) rejects with a message instead
+of the listing being posted without its photo. Other file fields go to
+Django's usual handlers.
+
+UPLOAD_TEMP_DIR sits next to MEDIA_ROOT, so saving the Item moves the
+temporary file into place with a rename: the upload is written to disk
+once and never held in memory.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+# Form fields whose uploads are photos
+PHOTO_FIELDS = {'image'}
+
+
+def upload_temp_dir():
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    return settings.UPLOAD_TEMP_DIR
+
+
+class PhotoUpload(TemporaryUploadedFile):
+    """TemporaryUploadedFile created in UPLOAD_TEMP_DIR"""
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + ext, dir=upload_temp_dir())
+        super(TemporaryUploadedFile, self).__init__(file, name, content_type, size, charset, content_type_extra)
+
+
+class OversizedUpload(UploadedFile):
+    """Stands in for a photo that was cut off at MAX_PHOTO_UPLOAD_SIZE"""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(None, name, content_type, size)
+
+
+class PhotoUploadHandler(FileUploadHandler):
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name in PHOTO_FIELDS
+        if self.active:
+            self.file = PhotoUpload(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+            self.oversized = False
+            raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.oversized:
+            return None
+        if start + len(raw_data) > settings.MAX_PHOTO_UPLOAD_SIZE:
+            # Drop what was written; the rest of the file is read and discarded
+            self.oversized = True
+            self.file.close()
+            return None
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        if self.oversized:
+            return OversizedUpload(self.file_name, self.content_type, file_size)
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+    def upload_interrupted(self):
+        if getattr(self, 'active', False) and not self.oversized:
+            # Closing the NamedTemporaryFile deletes it
+            self.file.close()
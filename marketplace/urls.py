@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Read-heavy pages have async versions for ASGI deployments (see asgi.py)
+pages = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', pages.home, name='home'),
     path('post/', views.post_item, name='post_item'),
-    path('items/', views.all_items, name='all_items'),
-    path('item/<int:pk>/', views.item_detail, name='item_detail'),
-    path('search-ajax/', views.search_ajax, name='search_ajax'),
-]
\ No newline at end of file
+    path('items/', pages.all_items, name='all_items'),
+    path('item/<int:pk>/', pages.item_detail, name='item_detail'),
+    path('search-ajax/', pages.search_ajax, name='search_ajax'),
+    path('api/items/', views.items_api, name='items_api'),
+]
@@ -1,36 +1,43 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.db.models import Q, Count
-from django.core.paginator import Paginator
+from django.conf import settings
 from django.http import JsonResponse
-from .models import Item
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+from .models import ArchivedItem, Course, Item, ItemListing
 from .forms import ItemForm, SearchForm
+from .search import search_items
+from .dimensions import course_key
+from .facets import facet_options, price_range
+from .autocomplete import autocomplete_index
+from .conditional import conditional, count_revalidated_view, detail_validators, listing_validators, search_validators
+from .stats import get_home_stats
+from .pagination import VIEW_ORDERED_SORTS, CachedCountPaginator, InvalidCursor, cached_count, keyset_page
+from .trending import trending_courses, trending_items
+from .recommendations import related_items as recommended_items
 
 def home(request):
     """Homepage showing latest items and statistics"""
-    # Get latest items (not sold)
-    latest_items = Item.objects.filter(is_sold=False).order_by('-date_posted')[:6]
-    
-    # Calculate statistics
+    return render(request, 'home.html', home_context())
 
-    stats = {
-        'total_items': Item.objects.filter(is_sold=False).count(),
-        'total_books': Item.objects.filter(is_sold=False, item_type='book').count(),
-        'total_notes': Item.objects.filter(is_sold=False, item_type='notes').count(),
-        'total_sellers': Item.objects.filter(is_sold=False).values('seller_name').distinct().count(),
-    }
+def home_context():
+    # Get latest items (not sold), as narrow listing rows
+    latest_items = ItemListing.objects.order_by('-date_posted')[:6]
     
-    # Popular courses
-    popular_courses = Item.objects.filter(is_sold=False, course__isnull=False).exclude(course='').values('course').annotate(
-        count=Count('course')
-    ).order_by('-count')[:5]
+    # Statistics and popular courses; lazy, so a cached page fragment
+    # skips them entirely
+    stats = SimpleLazyObject(lambda: get_home_stats()[0])
+    popular_courses = SimpleLazyObject(lambda: get_home_stats()[1])
     
-    context = {
+    return {
         'latest_items': latest_items,
         'stats': stats,
         'popular_courses': popular_courses,
+        # Cached in their own fragment, as they move with the view counts
+        'trending_items': trending_items(),
+        'trending_courses': trending_courses(),
+        'trending_timeout': settings.TRENDING_CACHE_TIMEOUT,
     }
-    return render(request, 'home.html', context)
 
 def post_item(request):
     """Form to POST a new item for sale"""
@@ -52,69 +59,164 @@ def post_item(request):
     
     return render(request, 'post_item.html', {'form': form})
 
-def all_items(request):
-    """GET and view all items with filtering and search"""
-    items = Item.objects.filter(is_sold=False)
+def filter_items(params):
+    """Apply the listing search, filters and sort from a GET QueryDict.
+
+    Returns (items, filters) where ``items`` is an ItemListing queryset (one
+    card-sized row per unsold item) and ``filters`` holds the normalized
+    values used, for templates, pagination links and count caching.
+    """
+    items = ItemListing.objects.all()
     
     # Search functionality
-    search_query = request.GET.get('search', '').strip()
+    search_query = params.get('search', '').strip()
     if search_query:
-        items = items.filter(
-            Q(item_name__icontains=search_query) |
-            Q(author__icontains=search_query) |
-            Q(course__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(seller_name__icontains=search_query)
-        )
+        items = search_items(items, search_query)
     
     # Filter by type
-    item_type = request.GET.get('type', '').strip()
+    item_type = params.get('type', '').strip()
     if item_type in ['book', 'notes']:
         items = items.filter(item_type=item_type)
     
-    # Filter by course
-    course_filter = request.GET.get('course', '').strip()
+    # Filter by course ("MATH 101" and "math101" are the same course)
+    course_filter = course_key(params.get('course', '')) or ''
     if course_filter:
-        items = items.filter(course__icontains=course_filter)
+        items = items.filter(course_key=course_filter)
 
-        # Filter by condition
-    condition_filter = request.GET.get('condition', '').strip()
+    # Filter by condition
+    condition_filter = params.get('condition', '').strip()
     if condition_filter:
         items = items.filter(condition=condition_filter)
+
+    # Filter by price bucket (see facets.PRICE_BUCKETS)
+    price_filter = params.get('price', '').strip()
+    price_condition = price_range(price_filter)
+    if price_condition is not None:
+        items = items.filter(price_condition)
+    else:
+        price_filter = ''
     
     # Sort options
-    sort_by = request.GET.get('sort', '-date_posted')
+    sort_by = params.get('sort', 'relevance' if search_query else '-date_posted')
     valid_sorts = ['-date_posted', 'price', '-price', 'item_name', '-view_count']
     if sort_by in valid_sorts:
         items = items.order_by(sort_by)
+    elif sort_by == 'trending':
+        items = items.order_by('-trending_score', '-pk')
+    elif sort_by == 'relevance' and search_query:
+        items = items.order_by('search_rank', '-date_posted')
+
+    filters = {
+        'search': search_query,
+        'type': item_type,
+        'course': course_filter,
+        'condition': condition_filter,
+        'price': price_filter,
+        'sort': sort_by,
+    }
+    return items, filters
+
+@conditional(listing_validators)
+def all_items(request):
+    """GET and view all items with filtering and search"""
+    return render(request, 'all_items.html', listing_context(request))
+
+def listing_context(request, evaluate=False):
+    """Template context for all_items.
+
+    ``items`` and ``total_results`` are lazy unless ``evaluate`` is set, for
+    callers that cannot run queries while rendering (async views).
+    """
+    items, filters = filter_items(request.GET)
     
-    # Pagination
-    paginator = Paginator(items, 12)  # Show 12 items per page
+    # Pagination: page numbers by default, or keyset when a cursor is given.
+    # Evaluated lazily so a cached listing fragment costs no queries.
+    cursor = request.GET.get('cursor')
     page_number = request.GET.get('page')
-    items_page = paginator.get_page(page_number)
+
+    def paginate():
+        if cursor is not None:
+            try:
+                return keyset_page(items, filters['sort'], cursor, per_page=12)
+            except InvalidCursor:
+                return keyset_page(items, filters['sort'], per_page=12)
+        paginator = CachedCountPaginator(items, 12, filters)  # Show 12 items per page
+        return paginator.get_page(page_number)
     
     # Get filter options
-    all_courses = Item.objects.filter(
-        is_sold=False, 
-        course__isnull=False
-    ).exclude(course='').values_list('course', flat=True).distinct().order_by('course')
+    all_courses = Course.objects.filter(active_count__gt=0).order_by('code').only('key', 'code')
+    
+    filter_query = urlencode({k: v for k, v in filters.items() if v})
+    position = f'cursor={cursor}' if cursor is not None else f'page={page_number or 1}'
+
+    # View counts are written in batches, so a listing ordered by them may
+    # only be cached as long as the counts themselves are allowed to be stale.
+    fragment_timeout = None
+    if filters['sort'] in VIEW_ORDERED_SORTS:
+        fragment_timeout = settings.VIEW_COUNT_FLUSH_INTERVAL
     
     context = {
-        'items': items_page,
-        'total_results': items.count(),
-        'search_query': search_query,
-        'current_type': item_type,
-        'current_course': course_filter,
-        'current_condition': condition_filter,
-        'current_sort': sort_by,
+        'items': SimpleLazyObject(paginate),
+        'total_results': SimpleLazyObject(lambda: cached_count(items, filters)),
+        'cursor_mode': cursor is not None,
+        'filter_query': filter_query,
+        'fragment_key': f'{filter_query}&{position}',
+        'fragment_timeout': fragment_timeout,
+        'search_query': filters['search'],
+        'current_type': filters['type'],
+        'current_course': filters['course'],
+        'current_condition': filters['condition'],
+        'current_sort': filters['sort'],
         'all_courses': all_courses,
         'conditions': Item.CONDITIONS,
+        'current_price': filters['price'],
+        'facets': SimpleLazyObject(lambda: facet_options(filters, all_courses)),
     }
-    return render(request, 'all_items.html', context)
+    if evaluate:
+        page = paginate()
+        page.object_list = list(page.object_list)
+        context.update(
+            items=page,
+            total_results=cached_count(items, filters),
+            all_courses=list(all_courses),
+        )
+        context['facets'] = facet_options(filters, context['all_courses'])
+    return context
+
+def items_api(request):
+    """JSON listing for infinite scroll, paged by cursor"""
+    items, filters = filter_items(request.GET)
+    try:
+        page = keyset_page(items, filters['sort'], request.GET.get('cursor'), per_page=12)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
 
+    results = []
+    for item in page:
+        results.append({
+            'id': item.pk,
+            'name': item.item_name,
+            'author': item.author or '',
+            'course': item.course or '',
+            'type': item.item_type,
+            'condition': item.get_condition_display(),
+            'price': str(item.price),
+            'image': item.picture['src'] if item.picture else None,
+            'url': item.url,
+        })
+    data = {'results': results, 'next_cursor': page.next_cursor}
+    if request.GET.get('total'):
+        data['total'] = cached_count(items, filters)
+    return JsonResponse(data)
+
+@conditional(detail_validators, on_not_modified=count_revalidated_view)
 def item_detail(request, pk):
     """Details page for each item"""
-    item = get_object_or_404(Item, pk=pk)
+    try:
+        # Loaded with the page's validators on GET (conditional.py)
+        item = getattr(request, 'detail_item', None) or Item.objects.get(pk=pk)
+    except Item.DoesNotExist:
+        return archived_detail(request, pk)
 
     # Increment view count
     item.increment_views()
@@ -125,45 +227,35 @@ def item_detail(request, pk):
         item.save()
         messages.success(request, f'"{item.item_name}" has been marked as sold!')
         return redirect('home')
-    
-    # Get related items (same course or type, excluding current item)
-    related_items = Item.objects.filter(
-        Q(course=item.course, course__isnull=False) | Q(item_type=item.item_type)
-    ).exclude(pk=item.pk).filter(is_sold=False)[:3]
+
+    return render(request, 'item_detail.html', detail_context(item))
+
+def archived_detail(request, pk):
+    """What is left of a listing that was sold or expired and archived"""
+    item = get_object_or_404(ArchivedItem, pk=pk)
+    return render(request, 'archived_item.html', {'item': item})
+
+def detail_context(item):
+    # Get related items (precomputed ranking by course, author, title and type)
+    related_items = recommended_items(item).prefetch_related('renditions')
     
     # Get seller's other items
     other_items = Item.objects.filter(
-        seller_name=item.seller_name,
+        seller_key=item.seller_key_id,
         is_sold=False
     ).exclude(pk=item.pk)[:3]
     
-    context = {
+    return {
         'item': item,
         'related_items': related_items,
         'other_items': other_items,
     }
-    return render(request, 'item_detail.html', context)
 
+# Suggestions only change with the catalog, so browsers may reuse them
+# briefly and revalidate cheaply afterwards
+@conditional(search_validators, private=True, max_age=settings.AUTOCOMPLETE_MAX_AGE)
 def search_ajax(request):
     """AJAX search for autocomplete"""
     query = request.GET.get('q', '').strip()
-    if len(query) >= 2:
-        items = Item.objects.filter(
-            Q(item_name__icontains=query) |
-            Q(course__icontains=query) |
-            Q(author__icontains=query),
-            is_sold=False
-        )[:10]
-        
-        results = []
-        for item in items:
-            results.append({
-                'id': item.pk,
-                'name': item.item_name,
-                'course': item.course or '',
-                'price': str(item.price),
-                'url': item.get_absolute_url()
-            })
-        return JsonResponse({'results': results})
-    
-    return JsonResponse({'results': []})
\ No newline at end of file
+    results = autocomplete_index.suggest(query) if len(query) >= 2 else []
+    return JsonResponse({'results': results})
\ No newline at end of file